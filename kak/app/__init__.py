@@ -1,9 +1,9 @@
 # Import Flask and session from flask package
 from flask import Flask, session
-# Import Firebase Admin SDK components for authentication and database
-from firebase_admin import credentials, initialize_app, firestore
 # Import os for environment variable access
 import os
+# Import the storage backend layer used by models and routes
+from app import backends
 
 # Define a function to create and configure our Flask application
 def create_app():
@@ -13,39 +13,29 @@ def create_app():
     # Set a secret key for session security
     app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     
-    # Initialize Firebase connection
-    try:
-        # Load Firebase credentials from the JSON file
-        cred = credentials.Certificate('firebase-key.json')
-        # Initialize the Firebase app with credentials and configuration
-        firebase_app = initialize_app(cred, {
-            # Set the storage bucket for Firebase Storage
-            'storageBucket': 'roeeki-a4ca2.firebasestorage.app',
-            # Set the database URL from environment variables
-            'databaseURL': os.environ.get('FIREBASE_DATABASE_URL', '')
-        })
-        
-        # Create a Firestore database client
-        db = firestore.client()
-        
-        # Reference to users collection in Firestore
-        users_ref = db.collection('users')
-        # Reference to tasks collection in Firestore
-        tasks_ref = db.collection('tasks')
-        # Reference to admins collection in Firestore
-        admins_ref = db.collection('admins')
-        
-        # Create indexes for admin lookups
-        # Note: In a production environment, this should be done through Firebase console
-        # or using a deployment configuration, not during app initialization
-        
-        # Print success message when Firebase is properly initialized
-        print("Firebase initialized successfully")
-    # Catch any errors during Firebase initialization
-    except Exception as e:
-        # Print error message with details
-        print(f"Error initializing Firebase: {e}")
-        # Continue running the app even if Firebase fails
+    # Select the storage backend (DATASTORE_BACKEND=firestore|sqlite). Firebase and the
+    # database clients are initialized lazily, per process, on first use
+    backends.init_app(app)
+    
+    # Set up the background job queue (JOB_QUEUE_DATABASE, JOB_WORKERS)
+    from app.services import jobs
+    jobs.init_app(app)
+    
+    # Stream uploads through capped in-memory spools (MAX_UPLOAD_SIZE)
+    from app.utils import uploads
+    uploads.init_app(app)
+    
+    # Serialize JSON responses with orjson when it is installed (JSON_ENCODER)
+    from app.utils import json_encoding
+    json_encoding.init_app(app)
+    
+    # Compress responses and serve precompressed static files (COMPRESS_MIN_SIZE)
+    from app.utils import compression
+    compression.init_app(app)
+    
+    # Count and time requests and datastore RPCs, served on /metrics (METRICS_ENABLED, METRICS_TOKEN)
+    from app.services import metrics
+    metrics.init_app(app)
     
     # Import blueprints for different parts of the application
     from app.routes.main import main_bp
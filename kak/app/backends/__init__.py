@@ -0,0 +1,233 @@
+"""
+Storage backend layer.
+
+Models and blueprints get their database client and storage bucket through
+get_db() / get_bucket() (or the db / bucket proxies) instead of calling
+firestore.client() and storage.bucket() directly. The backend is picked with
+the DATASTORE_BACKEND setting:
+
+    firestore  Google Cloud Firestore and Firebase Storage (default)
+    sqlite     Indexed SQLite database and a local uploads directory
+    memory     In-memory fake with configurable latency injection (benchmarks)
+
+Clients are created on first use and belong to the process that created them:
+after a fork (e.g. gunicorn --preload) each worker opens its own gRPC channel
+instead of sharing the parent's. Unless METRICS_ENABLED is off, they are wrapped
+so every RPC is counted and timed for /metrics (see instrumentation.py).
+"""
+
+import os
+
+# Names accepted by DATASTORE_BACKEND
+BACKENDS = ('firestore', 'sqlite', 'memory')
+
+# Default location of the SQLite database file
+DEFAULT_SQLITE_DATABASE = 'todoapp.sqlite3'
+
+# Default directory for blobs stored by local backends
+DEFAULT_UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'uploads')
+
+# Record RPC metrics unless METRICS_ENABLED is set to 0/false
+DEFAULT_METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+# Active configuration and lazily created clients of this process
+_config = {}
+_clients = {}
+_clients_pid = None
+
+
+def configure(backend=None, **options):
+    """
+    Select the storage backend and drop any client created for the previous one
+
+    :param backend: Backend name (see BACKENDS); defaults to $DATASTORE_BACKEND or 'firestore'
+    :param options: Backend options (sqlite_database, upload_folder, upload_url,
+                    latency and jitter in seconds for the memory backend,
+                    instrument to record RPC metrics)
+    """
+    backend = backend or os.environ.get('DATASTORE_BACKEND', 'firestore')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown DATASTORE_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    close_clients()
+    _config.clear()
+    _config.update(options)
+    _config['backend'] = backend
+
+
+def init_app(app):
+    """
+    Configure the backend from a Flask application's config
+
+    :param app: Flask application
+    """
+    app.config.setdefault('DATASTORE_BACKEND', os.environ.get('DATASTORE_BACKEND', 'firestore'))
+    app.config.setdefault('SQLITE_DATABASE', os.environ.get('SQLITE_DATABASE', DEFAULT_SQLITE_DATABASE))
+    app.config.setdefault('UPLOAD_FOLDER', os.path.join(app.static_folder, 'uploads'))
+    app.config.setdefault('UPLOAD_URL', app.static_url_path + '/uploads')
+    app.config.setdefault('MEMORY_LATENCY_MS', float(os.environ.get('MEMORY_LATENCY_MS', 0)))
+    app.config.setdefault('MEMORY_JITTER_MS', float(os.environ.get('MEMORY_JITTER_MS', 0)))
+    app.config.setdefault('FIREBASE_CREDENTIALS', os.environ.get('FIREBASE_CREDENTIALS', 'firebase-key.json'))
+    app.config.setdefault('FIREBASE_STORAGE_BUCKET', os.environ.get(
+        'FIREBASE_STORAGE_BUCKET', 'roeeki-a4ca2.firebasestorage.app'))
+    app.config.setdefault('FIREBASE_DATABASE_URL', os.environ.get('FIREBASE_DATABASE_URL', ''))
+    app.config.setdefault('METRICS_ENABLED', DEFAULT_METRICS_ENABLED)
+
+    configure(
+        app.config['DATASTORE_BACKEND'],
+        sqlite_database=app.config['SQLITE_DATABASE'],
+        upload_folder=app.config['UPLOAD_FOLDER'],
+        upload_url=app.config['UPLOAD_URL'],
+        latency=app.config['MEMORY_LATENCY_MS'] / 1000.0,
+        jitter=app.config['MEMORY_JITTER_MS'] / 1000.0,
+        firebase_credentials=app.config['FIREBASE_CREDENTIALS'],
+        firebase_storage_bucket=app.config['FIREBASE_STORAGE_BUCKET'],
+        firebase_database_url=app.config['FIREBASE_DATABASE_URL'],
+        instrument=app.config['METRICS_ENABLED']
+    )
+
+
+def get_backend_name():
+    """
+    Get the name of the active backend
+
+    :return: Backend name
+    """
+    if not _config:
+        configure()
+    return _config['backend']
+
+
+def _process_clients():
+    """Get the client cache of this process, dropping clients inherited through a fork"""
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        # The parent's channels must be neither used nor closed here
+        _clients.clear()
+        _clients_pid = os.getpid()
+    return _clients
+
+
+def _firebase_options():
+    return {
+        'credentials_path': _config.get('firebase_credentials'),
+        'storage_bucket': _config.get('firebase_storage_bucket'),
+        'database_url': _config.get('firebase_database_url')
+    }
+
+
+def get_firebase_app():
+    """
+    Get the default Firebase app (used by firebase_admin.auth), initializing it on first use
+
+    :return: firebase_admin.App
+    """
+    from .firestore_backend import get_firebase_app as firebase_app
+    if not _config:
+        configure()
+    return firebase_app(**_firebase_options())
+
+
+def get_db():
+    """
+    Get the database client for the active backend
+
+    :return: Firestore client or Firestore-compatible local client
+    """
+    clients = _process_clients()
+    client = clients.get('db')
+    if client is None:
+        backend = get_backend_name()
+        if backend == 'sqlite':
+            from .sqlite_backend import create_client
+            client = create_client(_config.get('sqlite_database')
+                                   or os.environ.get('SQLITE_DATABASE', DEFAULT_SQLITE_DATABASE))
+        elif backend == 'memory':
+            from .memory_backend import create_client
+            client = create_client(_config.get('latency', 0.0), _config.get('jitter', 0.0))
+        else:
+            from .firestore_backend import create_client
+            client = create_client(**_firebase_options())
+        if _config.get('instrument', DEFAULT_METRICS_ENABLED):
+            from .instrumentation import instrument
+            client = instrument(client, 'firestore')
+        clients['db'] = client
+    return client
+
+
+def get_bucket():
+    """
+    Get the storage bucket for the active backend
+
+    :return: Storage bucket or local replacement
+    """
+    clients = _process_clients()
+    bucket = clients.get('bucket')
+    if bucket is None:
+        backend = get_backend_name()
+        if backend == 'sqlite':
+            from .local_bucket import LocalBucket
+            bucket = LocalBucket(_config.get('upload_folder') or DEFAULT_UPLOAD_FOLDER,
+                                 _config.get('upload_url') or '/static/uploads')
+        elif backend == 'memory':
+            from .memory_backend import create_bucket
+            bucket = create_bucket(_config.get('latency', 0.0), _config.get('jitter', 0.0))
+        else:
+            from .firestore_backend import create_bucket
+            bucket = create_bucket(**_firebase_options())
+        if _config.get('instrument', DEFAULT_METRICS_ENABLED):
+            from .instrumentation import instrument
+            bucket = instrument(bucket, 'storage')
+        clients['bucket'] = bucket
+    return bucket
+
+
+def run_transaction(func):
+    """
+    Run func(transaction) in a database transaction. Reads go through
+    reference.get(transaction=transaction) and writes through transaction.set/update/delete;
+    the writes are committed atomically once func returns. Firestore retries func when
+    a document it read changed before the commit; the local backends lock the store instead.
+
+    :param func: Callable taking the transaction (may be called more than once)
+    :return: What func returned
+    """
+    transaction = get_db().transaction()
+    if get_backend_name() == 'firestore':
+        from firebase_admin import firestore
+        return firestore.transactional(func)(transaction)
+    return transaction.run(func)
+
+
+def close_clients():
+    """Close and forget the clients this process created for the active backend"""
+    clients = _process_clients()
+    client = clients.pop('db', None)
+    clients.pop('bucket', None)
+    close = getattr(client, 'close', None)
+    if close:
+        try:
+            close()
+        except Exception as e:
+            print(f"Error closing database client: {e}")
+
+
+class _ClientProxy:
+    """
+    Module-level stand-in that forwards attribute access to the current client,
+    so blueprints can keep a global `db` / `bucket` without binding to one backend at import time
+    """
+
+    def __init__(self, getter):
+        self._getter = getter
+
+    def __getattr__(self, name):
+        return getattr(self._getter(), name)
+
+
+# Proxies to the active database client and storage bucket
+db = _ClientProxy(get_db)
+bucket = _ClientProxy(get_bucket)
+
+__all__ = ['BACKENDS', 'configure', 'init_app', 'get_backend_name', 'get_firebase_app', 'get_db',
+           'get_bucket', 'run_transaction', 'close_clients', 'db', 'bucket']
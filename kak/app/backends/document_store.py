@@ -0,0 +1,682 @@
+"""
+Local document engine that mirrors the subset of the Firestore client API used
+by the models and blueprints (collections, documents, queries, batches and the
+field transforms such as Increment or SERVER_TIMESTAMP).
+
+The engine delegates persistence to a *store* object, so the same reference,
+query and snapshot classes can sit on top of SQLite or plain Python dicts.
+A store implements::
+
+    get(collection, doc_id)            -> (data, update_time) or None
+    put(collection, doc_id, data, update_time)
+    delete(collection, doc_id)
+    query(collection, filters, orders, after, limit) -> iterable of (doc_id, data, update_time)
+    atomic()                           -> context manager wrapping a group of writes
+"""
+
+import copy
+import random
+import string
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import Conflict, NotFound
+from google.cloud.firestore_v1 import transforms
+
+# Direction constants, identical to firestore.Query.ASCENDING / DESCENDING
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+# Field path of the document ID in order_by / start_after (FieldPath.document_id())
+DOCUMENT_ID = '__name__'
+
+# Characters used for auto-generated document IDs (same alphabet as Firestore)
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+
+def auto_id():
+    """
+    Generate a random 20 character document ID
+
+    :return: Document ID string
+    """
+    return ''.join(random.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+
+def utcnow():
+    """
+    Current time as a timezone-aware UTC datetime
+
+    :return: datetime instance
+    """
+    return datetime.now(timezone.utc)
+
+
+def get_field(data, field_path):
+    """
+    Read a (possibly dotted) field path from a document dictionary
+
+    :param data: Document data
+    :param field_path: Field path such as 'userId' or 'stats.count'
+    :return: (found, value) tuple
+    """
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def _set_field(data, field_path, value):
+    """Write a dotted field path into a document dictionary, creating maps as needed"""
+    parts = field_path.split('.')
+    target = data
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    target[parts[-1]] = value
+
+
+def _delete_field(data, field_path):
+    """Remove a dotted field path from a document dictionary if present"""
+    parts = field_path.split('.')
+    target = data
+    for part in parts[:-1]:
+        target = target.get(part)
+        if not isinstance(target, dict):
+            return
+    target.pop(parts[-1], None)
+
+
+def _resolve_value(current_found, current, value, now):
+    """
+    Resolve a written value against the current field value, applying
+    Firestore sentinels and transforms.
+
+    :return: (delete, new_value) tuple
+    """
+    if value is transforms.DELETE_FIELD:
+        return True, None
+    if value is transforms.SERVER_TIMESTAMP:
+        return False, now
+    if isinstance(value, transforms.Increment):
+        if current_found and isinstance(current, (int, float)) and not isinstance(current, bool):
+            return False, current + value.value
+        return False, value.value
+    if isinstance(value, transforms.Maximum):
+        if current_found and isinstance(current, (int, float)) and not isinstance(current, bool):
+            return False, max(current, value.value)
+        return False, value.value
+    if isinstance(value, transforms.Minimum):
+        if current_found and isinstance(current, (int, float)) and not isinstance(current, bool):
+            return False, min(current, value.value)
+        return False, value.value
+    if isinstance(value, transforms.ArrayUnion):
+        existing = list(current) if current_found and isinstance(current, list) else []
+        for item in value.values:
+            if item not in existing:
+                existing.append(item)
+        return False, existing
+    if isinstance(value, transforms.ArrayRemove):
+        existing = list(current) if current_found and isinstance(current, list) else []
+        return False, [item for item in existing if item not in value.values]
+    if isinstance(value, dict):
+        # Nested maps may contain sentinels too
+        nested_current = current if current_found and isinstance(current, dict) else {}
+        resolved = {}
+        for key, nested_value in value.items():
+            found = key in nested_current
+            delete, new_value = _resolve_value(found, nested_current.get(key), nested_value, now)
+            if not delete:
+                resolved[key] = new_value
+        return False, resolved
+    return False, copy.deepcopy(value)
+
+
+def _merge_maps(target, source, now):
+    """Deep-merge a set(..., merge=True) payload into existing document data"""
+    for key, value in source.items():
+        current = target.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            _merge_maps(current, value, now)
+            continue
+        delete, new_value = _resolve_value(key in target, current, value, now)
+        if delete:
+            target.pop(key, None)
+        else:
+            target[key] = new_value
+
+
+def apply_write(current, kind, data, merge=False, now=None):
+    """
+    Compute the new document data for a write
+
+    :param current: Current document data or None if the document is missing
+    :param kind: 'set', 'update' or 'create'
+    :param data: Payload passed to set/update
+    :param merge: Whether a set merges into the existing document
+    :param now: Timestamp used for SERVER_TIMESTAMP
+    :return: New document data
+    """
+    now = now or utcnow()
+
+    if kind == 'update':
+        if current is None:
+            raise NotFound('No document to update')
+        new_data = copy.deepcopy(current)
+        for field_path, value in data.items():
+            found, existing = get_field(new_data, field_path)
+            delete, new_value = _resolve_value(found, existing, value, now)
+            if delete:
+                _delete_field(new_data, field_path)
+            else:
+                _set_field(new_data, field_path, new_value)
+        return new_data
+
+    if merge and current is not None:
+        new_data = copy.deepcopy(current)
+        _merge_maps(new_data, data, now)
+        return new_data
+
+    new_data = {}
+    _merge_maps(new_data, data, now)
+    return new_data
+
+
+# Ordering rank of each value type, following Firestore's cross-type ordering
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def order_key(value):
+    """
+    Sort key that orders mixed value types the way Firestore does
+
+    :param value: Field value
+    :return: Tuple usable as a sort key
+    """
+    rank = _type_rank(value)
+    if rank == 3 and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if rank == 8:
+        return rank, tuple(order_key(item) for item in value)
+    if rank == 9:
+        return rank, tuple(sorted((str(k), order_key(v)) for k, v in value.items()))
+    return rank, value
+
+
+def matches_filter(data, field_path, op, value):
+    """
+    Check a document against a single where() clause
+
+    :param data: Document data
+    :param field_path: Field path being filtered
+    :param op: Firestore operator string
+    :param value: Operand
+    :return: True if the document matches
+    """
+    found, current = get_field(data, field_path)
+    if not found:
+        return False
+    if op == '==':
+        return current == value
+    if op == '!=':
+        return current != value
+    if op == 'in':
+        return current in value
+    if op == 'not-in':
+        return current not in value
+    if op == 'array_contains':
+        return isinstance(current, list) and value in current
+    if op == 'array_contains_any':
+        return isinstance(current, list) and any(item in current for item in value)
+    # Range operators only compare values of the same type
+    if _type_rank(current) != _type_rank(value):
+        return False
+    left, right = order_key(current), order_key(value)
+    if op == '<':
+        return left < right
+    if op == '<=':
+        return left <= right
+    if op == '>':
+        return left > right
+    if op == '>=':
+        return left >= right
+    raise ValueError(f'Unsupported filter operator: {op}')
+
+
+class DocumentSnapshot:
+    """
+    Read-only view of a document at a point in time
+    """
+
+    def __init__(self, reference, data, update_time=None):
+        """
+        Initialize a new DocumentSnapshot instance
+
+        :param reference: DocumentReference the snapshot belongs to
+        :param data: Document data or None if the document does not exist
+        :param update_time: When the document was last written
+        """
+        self.reference = reference
+        self._data = data
+        self.update_time = update_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        """
+        Get a copy of the document data
+
+        :return: Dictionary or None if the document does not exist
+        """
+        if self._data is None:
+            return None
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        """
+        Get a single field from the document
+
+        :param field_path: Field path
+        :return: Field value or None
+        """
+        if self._data is None:
+            return None
+        return get_field(self._data, field_path)[1]
+
+
+class DocumentReference:
+    """
+    Reference to a single document in a collection
+    """
+
+    def __init__(self, client, collection_id, document_id):
+        self._client = client
+        self.parent_id = collection_id
+        self.id = document_id
+
+    @property
+    def path(self):
+        return f'{self.parent_id}/{self.id}'
+
+    def get(self, field_paths=None, transaction=None):
+        """
+        Fetch the document
+
+        :param field_paths: Optional list of fields to return
+        :param transaction: Transaction the read belongs to (the store is already locked by it)
+        :return: DocumentSnapshot
+        """
+        self._client._rpc('get')
+        record = self._client._store.get(self.parent_id, self.id)
+        if record is None:
+            return DocumentSnapshot(self, None)
+        data, update_time = record
+        return DocumentSnapshot(self, _project(data, field_paths), update_time)
+
+    def set(self, document_data, merge=False):
+        """
+        Create or overwrite the document
+
+        :param document_data: Document data
+        :param merge: Merge into an existing document instead of replacing it
+        """
+        self._client._commit([('set', self, document_data, merge)])
+
+    def create(self, document_data):
+        """
+        Create the document, failing if it already exists
+
+        :param document_data: Document data
+        """
+        self._client._commit([('create', self, document_data, False)])
+
+    def update(self, field_updates):
+        """
+        Update fields on an existing document
+
+        :param field_updates: Mapping of field paths to new values
+        """
+        self._client._commit([('update', self, field_updates, False)])
+
+    def delete(self):
+        """Delete the document"""
+        self._client._commit([('delete', self, None, False)])
+
+
+def _project(data, field_paths):
+    """Apply a field projection to document data"""
+    if not field_paths:
+        return data
+    projected = {}
+    for field_path in field_paths:
+        found, value = get_field(data, field_path)
+        if found:
+            _set_field(projected, field_path, value)
+    return projected
+
+
+class Query:
+    """
+    Immutable query over a single collection
+    """
+
+    def __init__(self, client, collection_id, filters=(), orders=(), limit=None,
+                 after=None, projection=None):
+        self._client = client
+        self._collection_id = collection_id
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._after = after
+        self._projection = projection
+
+    def _copy(self, **changes):
+        state = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit': self._limit,
+            'after': self._after,
+            'projection': self._projection,
+        }
+        state.update(changes)
+        return Query(self._client, self._collection_id, **state)
+
+    def where(self, field_path, op_string, value):
+        """
+        Add a filter clause
+
+        :param field_path: Field to filter on
+        :param op_string: Operator ('==', '<', 'in', 'array_contains', ...)
+        :param value: Operand
+        :return: New Query
+        """
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        """
+        Add an ordering clause
+
+        Ordering by the document ID ('__name__') is only accepted as the last clause in
+        the direction of the previous one, which is the tie-breaker the stores always apply.
+
+        :param field_path: Field to order by
+        :param direction: ASCENDING or DESCENDING
+        :return: New Query
+        """
+        if field_path == DOCUMENT_ID:
+            last_direction = self._orders[-1][1] if self._orders else ASCENDING
+            if direction != last_direction:
+                raise ValueError('Ordering by document ID is only supported as the last '
+                                 'order_by, in the direction of the one before it')
+            return self._copy()
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        """
+        Limit the number of returned documents
+
+        :param count: Maximum number of documents
+        :return: New Query
+        """
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields):
+        """
+        Start the results after the given snapshot or field values
+
+        :param document_fields: DocumentSnapshot or dictionary of order-by field values
+                                (with the document ID under '__name__' if ordered by it)
+        :return: New Query
+        """
+        if isinstance(document_fields, DocumentSnapshot):
+            values = tuple(document_fields.get(field) for field, _ in self._orders)
+            return self._copy(after=(values, document_fields.id))
+        values = tuple(get_field(document_fields, field)[1] for field, _ in self._orders)
+        document_id = document_fields.get(DOCUMENT_ID)
+        return self._copy(after=(values, getattr(document_id, 'id', document_id)))
+
+    def select(self, field_paths):
+        """
+        Only return the given fields of each document
+
+        :param field_paths: List of field paths
+        :return: New Query
+        """
+        return self._copy(projection=tuple(field_paths))
+
+    def stream(self):
+        """
+        Iterate over the matching documents
+
+        :return: Generator of DocumentSnapshot
+        """
+        self._client._rpc('query')
+        rows = self._client._store.query(
+            self._collection_id, self._filters, self._orders, self._after, self._limit
+        )
+        for doc_id, data, update_time in rows:
+            reference = DocumentReference(self._client, self._collection_id, doc_id)
+            yield DocumentSnapshot(reference, _project(data, self._projection), update_time)
+
+    def get(self):
+        """
+        Fetch all matching documents
+
+        :return: List of DocumentSnapshot
+        """
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    """
+    Reference to a collection; also usable as a query over all of its documents
+    """
+
+    def __init__(self, client, collection_id):
+        super().__init__(client, collection_id)
+        self.id = collection_id
+
+    def document(self, document_id=None):
+        """
+        Get a reference to a document in this collection
+
+        :param document_id: Document ID; a new random ID is generated if omitted
+        :return: DocumentReference
+        """
+        return DocumentReference(self._client, self.id, document_id or auto_id())
+
+    def add(self, document_data, document_id=None):
+        """
+        Create a new document in this collection
+
+        :param document_data: Document data
+        :param document_id: Optional document ID
+        :return: (update_time, DocumentReference) tuple
+        """
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return utcnow(), reference
+
+
+class WriteBatch:
+    """
+    Group of writes committed atomically in a single round trip
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference, document_data, merge))
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data, False))
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference, field_updates, False))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference, None, False))
+
+    def commit(self):
+        """
+        Apply all queued writes
+
+        :return: List of write results (one per write)
+        """
+        writes, self._writes = self._writes, []
+        self._client._commit(writes)
+        return [None] * len(writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class Transaction(WriteBatch):
+    """
+    Reads and writes applied atomically: the store stays locked from the first read
+    to the commit, so concurrent transactions run one after the other
+    """
+
+    def run(self, func):
+        """
+        Run func(transaction) and commit the writes it queued
+
+        :param func: Callable taking this transaction
+        :return: What func returned
+        """
+        with self._client._store.atomic():
+            result = func(self)
+            self.commit()
+        return result
+
+
+class LocalClient:
+    """
+    Firestore-compatible client backed by a local store
+    """
+
+    def __init__(self, store):
+        """
+        Initialize a new LocalClient instance
+
+        :param store: Store object persisting the documents
+        """
+        self._store = store
+
+    def _rpc(self, kind):
+        """
+        Hook called once per simulated round trip
+
+        :param kind: RPC kind ('get', 'query', 'commit', 'batch_get')
+        """
+
+    def collection(self, collection_id):
+        """
+        Get a reference to a top-level collection
+
+        :param collection_id: Collection name
+        :return: CollectionReference
+        """
+        return CollectionReference(self, collection_id)
+
+    def document(self, document_path):
+        """
+        Get a reference to a document from its 'collection/id' path
+
+        :param document_path: Document path
+        :return: DocumentReference
+        """
+        collection_id, document_id = document_path.split('/', 1)
+        return DocumentReference(self, collection_id, document_id)
+
+    def batch(self):
+        """
+        Start a new write batch
+
+        :return: WriteBatch
+        """
+        return WriteBatch(self)
+
+    def transaction(self):
+        """
+        Start a new transaction (see Transaction.run)
+
+        :return: Transaction
+        """
+        return Transaction(self)
+
+    def get_all(self, references, field_paths=None):
+        """
+        Fetch several documents in one round trip
+
+        :param references: Iterable of DocumentReference
+        :param field_paths: Optional list of fields to return
+        :return: Generator of DocumentSnapshot (missing documents have exists=False)
+        """
+        references = list(references)
+        self._rpc('batch_get')
+        for reference in references:
+            record = self._store.get(reference.parent_id, reference.id)
+            if record is None:
+                yield DocumentSnapshot(reference, None)
+            else:
+                data, update_time = record
+                yield DocumentSnapshot(reference, _project(data, field_paths), update_time)
+
+    def _commit(self, writes):
+        """
+        Apply a list of (kind, reference, data, merge) writes atomically
+
+        :param writes: List of writes
+        """
+        self._rpc('commit')
+        now = utcnow()
+        with self._store.atomic():
+            for kind, reference, data, merge in writes:
+                if kind == 'delete':
+                    self._store.delete(reference.parent_id, reference.id)
+                    continue
+                record = self._store.get(reference.parent_id, reference.id)
+                current = record[0] if record else None
+                if kind == 'create' and current is not None:
+                    raise Conflict(f'Document already exists: {reference.path}')
+                new_data = apply_write(current, kind, data, merge=merge, now=now)
+                self._store.put(reference.parent_id, reference.id, new_data, now)
+
+    def close(self):
+        """Release any resources held by the store"""
+        close = getattr(self._store, 'close', None)
+        if close:
+            close()
@@ -0,0 +1,76 @@
+"""
+Google Cloud Firestore / Firebase Storage backend.
+
+The Firebase app is initialized on first use rather than at import or in
+create_app, so importing the application needs no credentials, and clients
+are created by whichever process first needs them (see get_db()). The clients
+are built here from the app's project and credentials rather than with
+firebase_admin.firestore.client() / storage.bucket(), which cache one client on
+the App: a worker forked from a parent that had used them would share the
+parent's gRPC channel.
+"""
+
+import os
+import threading
+
+import firebase_admin
+from firebase_admin import credentials
+from google.cloud import firestore, storage
+
+# Service account key and Firebase project settings
+DEFAULT_CREDENTIALS = 'firebase-key.json'
+DEFAULT_STORAGE_BUCKET = 'roeeki-a4ca2.firebasestorage.app'
+
+_app_lock = threading.Lock()
+
+
+def get_firebase_app(credentials_path=None, storage_bucket=None, database_url=None):
+    """
+    Get the default Firebase app, initializing it on first use
+
+    :param credentials_path: Service account key file (defaults to $FIREBASE_CREDENTIALS)
+    :param storage_bucket: Storage bucket name (defaults to $FIREBASE_STORAGE_BUCKET)
+    :param database_url: Realtime Database URL (defaults to $FIREBASE_DATABASE_URL)
+    :return: firebase_admin.App
+    """
+    with _app_lock:
+        try:
+            # Already initialized (by an earlier call or a migration script)
+            return firebase_admin.get_app()
+        except ValueError:
+            pass
+        cred = credentials.Certificate(
+            credentials_path or os.environ.get('FIREBASE_CREDENTIALS', DEFAULT_CREDENTIALS))
+        return firebase_admin.initialize_app(cred, {
+            'storageBucket': storage_bucket or os.environ.get('FIREBASE_STORAGE_BUCKET', DEFAULT_STORAGE_BUCKET),
+            'databaseURL': database_url or os.environ.get('FIREBASE_DATABASE_URL', '')
+        })
+
+
+def create_client(**options):
+    """
+    Create a new Firestore client for the default Firebase app (with its own channel)
+
+    :param options: Arguments of get_firebase_app
+    :return: google.cloud.firestore.Client
+    """
+    app = get_firebase_app(**options)
+    if not app.project_id:
+        raise ValueError('Project ID is required to access Firestore. Use a service account key '
+                         'or set the GOOGLE_CLOUD_PROJECT environment variable.')
+    return firestore.Client(project=app.project_id, credentials=app.credential.get_credential())
+
+
+def create_bucket(**options):
+    """
+    Get the default Firebase Storage bucket through a new Storage client
+
+    :param options: Arguments of get_firebase_app
+    :return: google.cloud.storage.Bucket
+    """
+    app = get_firebase_app(**options)
+    name = app.options.get('storageBucket')
+    if not name:
+        raise ValueError('Storage bucket name not specified. Set FIREBASE_STORAGE_BUCKET.')
+    # The project is optional for Storage, but passing it saves a lookup
+    return storage.Client(project=app.project_id, credentials=app.credential.get_credential()).bucket(name)
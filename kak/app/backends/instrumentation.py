@@ -0,0 +1,263 @@
+"""
+Metrics around the Firestore and Storage calls made through get_db()/get_bucket().
+
+The clients are wrapped in a thin proxy that forwards every attribute to the
+real object and wraps the references, queries, batches and blobs it hands out,
+so the RPC methods on them are counted, timed and attributed to the current
+endpoint (see app/services/metrics.py) without touching the models or
+blueprints. Builder calls that do not reach the server (collection(), where(),
+blob(), batch.set(), ...) are only forwarded. Document snapshots get a light
+wrapper whose .reference is wrapped too, so a read or write through
+snapshot.reference is recorded like any other. Objects are classified by class
+name, which is the same for the google-cloud clients and the local backends.
+"""
+
+import inspect
+import time
+
+from ..services import metrics
+
+# Class name -> role of the wrapped object
+_ROLES = {
+    'Client': 'client',
+    'LocalClient': 'client',
+    'MemoryClient': 'client',
+    'DocumentReference': 'document',
+    'CollectionReference': 'query',
+    'Query': 'query',
+    'CollectionGroup': 'query',
+    'WriteBatch': 'batch',
+    'Transaction': 'transaction',
+    'Blob': 'blob',
+    'LocalBlob': 'blob',
+    'MemoryBlob': 'blob',
+    'Bucket': 'bucket',
+    'LocalBucket': 'bucket',
+    'MemoryBucket': 'bucket'
+}
+
+# Methods that make a round trip, per role: method -> metric name
+_RPC_METHODS = {
+    'client': {'get_all': 'batch_get'},
+    'document': {'get': 'get', 'set': 'set', 'create': 'create', 'update': 'update', 'delete': 'delete'},
+    'query': {'get': 'query', 'stream': 'query', 'add': 'add'},
+    'batch': {'commit': 'commit'},
+    'blob': {
+        'upload_from_file': 'upload', 'upload_from_string': 'upload', 'upload_from_filename': 'upload',
+        'download_as_bytes': 'download', 'download_as_string': 'download', 'download_as_text': 'download',
+        'delete': 'delete', 'make_public': 'make_public', 'exists': 'exists', 'reload': 'reload'
+    },
+    'bucket': {'get_blob': 'get_blob', 'list_blobs': 'list_blobs'}
+}
+
+# Batch methods that queue one document write
+_BATCH_WRITES = ('set', 'create', 'update', 'delete')
+
+
+def _unwrap(value):
+    """Replace proxies (also inside lists and tuples) by the objects they wrap"""
+    if isinstance(value, Instrumented):
+        return object.__getattribute__(value, '_target')
+    if isinstance(value, InstrumentedSnapshot):
+        return value._target
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(item) for item in value)
+    return value
+
+
+def _document_count(method, result):
+    """Number of documents read or written by one Firestore call"""
+    if method in ('query', 'batch_get'):
+        return len(result) if isinstance(result, list) else None
+    return 1
+
+
+def _upload_size(args, kwargs):
+    """Bytes sent by an upload_from_* call"""
+    if kwargs.get('size') is not None:
+        return kwargs['size']
+    data = args[0] if args else kwargs.get('data')
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    return None
+
+
+class Instrumented:
+    """
+    Proxy recording the RPCs made through a client, reference, query, batch, blob or bucket
+    """
+
+    def __init__(self, target, service):
+        """
+        Initialize a new Instrumented instance
+
+        :param target: Object to wrap
+        :param service: 'firestore' or 'storage'
+        """
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, '_service', service)
+        object.__setattr__(self, '_role', _ROLES.get(type(target).__name__))
+        object.__setattr__(self, '_pending_writes', 0)
+
+    def __getattr__(self, name):
+        target = object.__getattribute__(self, '_target')
+        attribute = getattr(target, name)
+        if not inspect.isroutine(attribute) or name.startswith('_'):
+            return attribute
+
+        role = object.__getattribute__(self, '_role')
+        method = _RPC_METHODS.get(role, {}).get(name)
+        if method is not None:
+            return self._timed(attribute, method)
+
+        def call(*args, **kwargs):
+            result = attribute(*_unwrap(args), **{key: _unwrap(value) for key, value in kwargs.items()})
+            if role == 'batch' and name in _BATCH_WRITES:
+                object.__setattr__(self, '_pending_writes', object.__getattribute__(self, '_pending_writes') + 1)
+            return self._wrap(result)
+        return call
+
+    def __setattr__(self, name, value):
+        # e.g. blob.chunk_size for resumable uploads
+        setattr(object.__getattribute__(self, '_target'), name, value)
+
+    def __len__(self):
+        return len(object.__getattribute__(self, '_target'))
+
+    def __enter__(self):
+        object.__getattribute__(self, '_target').__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return object.__getattribute__(self, '_target').__exit__(exc_type, exc_value, traceback)
+        # Commit through the proxy so the batch is recorded
+        self.commit()
+        return False
+
+    def __repr__(self):
+        return f'Instrumented({object.__getattribute__(self, "_target")!r})'
+
+    def _wrap(self, result):
+        """Wrap references, queries, batches and blobs returned by a builder call"""
+        target = object.__getattribute__(self, '_target')
+        if result is target:
+            return self
+        if type(result).__name__ in _ROLES:
+            return Instrumented(result, object.__getattribute__(self, '_service'))
+        if type(result).__name__ == 'DocumentSnapshot':
+            return InstrumentedSnapshot(result, object.__getattribute__(self, '_service'))
+        if isinstance(result, tuple):
+            # CollectionReference.add returns (update_time, reference)
+            return tuple(self._wrap(item) for item in result)
+        if isinstance(result, list):
+            # Query.get() and list_blobs() results
+            return [self._wrap(item) for item in result]
+        return result
+
+    def _timed(self, function, method):
+        """Wrap an RPC method so each call is recorded"""
+        service = object.__getattribute__(self, '_service')
+
+        def call(*args, **kwargs):
+            args = _unwrap(args)
+            kwargs = {key: _unwrap(value) for key, value in kwargs.items()}
+            started = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                metrics.record_rpc(service, method, time.perf_counter() - started, failed=True)
+                raise
+
+            if method in ('query', 'batch_get', 'list_blobs') and not isinstance(result, (list, dict)):
+                # Lazy results: the round trips happen while iterating
+                return self._timed_iterator(result, method, time.perf_counter() - started)
+
+            elapsed = time.perf_counter() - started
+            if service == 'storage':
+                metrics.record_rpc(
+                    service, method, elapsed,
+                    upload_bytes=_upload_size(args, kwargs) if method == 'upload' else None,
+                    download_bytes=len(result) if method == 'download' and result is not None else None
+                )
+            else:
+                if method == 'commit':
+                    documents = object.__getattribute__(self, '_pending_writes')
+                    object.__setattr__(self, '_pending_writes', 0)
+                else:
+                    documents = _document_count(method, result)
+                metrics.record_rpc(service, method, elapsed, documents=documents)
+            return self._wrap(result)
+        return call
+
+    def _timed_iterator(self, iterator, method, elapsed):
+        """Record a streamed result once it is exhausted, counting only the time spent producing items"""
+        service = object.__getattribute__(self, '_service')
+        iterator = iter(iterator)
+        count = 0
+        failed = False
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - started
+                    break
+                except Exception:
+                    elapsed += time.perf_counter() - started
+                    failed = True
+                    raise
+                elapsed += time.perf_counter() - started
+                count += 1
+                yield self._wrap(item)
+        finally:
+            metrics.record_rpc(service, method, elapsed,
+                               documents=count if service == 'firestore' else None, failed=failed)
+
+
+class InstrumentedSnapshot:
+    """
+    Document snapshot whose reference is instrumented; everything else is read from the snapshot
+    """
+
+    __slots__ = ('_target', '_service')
+
+    def __init__(self, target, service):
+        """
+        Initialize a new InstrumentedSnapshot instance
+
+        :param target: DocumentSnapshot to wrap
+        :param service: 'firestore'
+        """
+        self._target = target
+        self._service = service
+
+    @property
+    def reference(self):
+        return Instrumented(self._target.reference, self._service)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f'InstrumentedSnapshot({self._target!r})'
+
+
+def instrument(client, service):
+    """
+    Wrap a database client or storage bucket so its RPCs are recorded
+
+    :param client: Client or bucket returned by a backend
+    :param service: 'firestore' or 'storage'
+    :return: Proxy forwarding to the client
+    """
+    return Instrumented(client, service)
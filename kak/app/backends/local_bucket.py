@@ -0,0 +1,100 @@
+"""
+Filesystem replacement for the Firebase Storage bucket used by local backends.
+Blobs are written below a directory served as Flask static files.
+"""
+
+import os
+import shutil
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+
+class LocalBlob:
+    """
+    File stored in a LocalBucket, exposing the google.cloud.storage Blob methods the app uses
+    """
+
+    def __init__(self, bucket, name, generation=None):
+        self.bucket = bucket
+        self.name = name
+        # Generation seen when the blob was fetched with get_blob (file modification time in ns)
+        self.generation = generation
+
+    @property
+    def _path(self):
+        return os.path.join(self.bucket.root, *self.name.split('/'))
+
+    @property
+    def public_url(self):
+        return f"{self.bucket.base_url.rstrip('/')}/{self.name}"
+
+    @property
+    def size(self):
+        return os.path.getsize(self._path) if self.exists() else None
+
+    def exists(self):
+        return os.path.isfile(self._path)
+
+    def upload_from_filename(self, filename, content_type=None):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        shutil.copyfile(filename, self._path)
+
+    def upload_from_file(self, file_obj, content_type=None, size=None, rewind=False):
+        if rewind:
+            file_obj.seek(0)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'wb') as target:
+            shutil.copyfileobj(file_obj, target)
+
+    def upload_from_string(self, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'wb') as target:
+            target.write(data)
+
+    def download_as_bytes(self):
+        with open(self._path, 'rb') as source:
+            return source.read()
+
+    def make_public(self):
+        # Local files are always served publicly
+        return None
+
+    def delete(self, if_generation_match=None):
+        try:
+            if if_generation_match is not None and os.stat(self._path).st_mtime_ns != if_generation_match:
+                raise PreconditionFailed(f'Generation mismatch: {self.name}')
+            os.remove(self._path)
+        except FileNotFoundError:
+            raise NotFound(f'No such object: {self.name}')
+
+
+class LocalBucket:
+    """
+    Directory-backed bucket
+    """
+
+    def __init__(self, root, base_url, name='local'):
+        """
+        Initialize a new LocalBucket instance
+
+        :param root: Directory where blobs are stored
+        :param base_url: URL prefix the directory is served under
+        :param name: Bucket name
+        """
+        self.root = root
+        self.base_url = base_url
+        self.name = name
+        os.makedirs(root, exist_ok=True)
+
+    def blob(self, blob_name):
+        return LocalBlob(self, blob_name)
+
+    def get_blob(self, blob_name):
+        blob = self.blob(blob_name)
+        try:
+            blob.generation = os.stat(blob._path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        return blob
@@ -0,0 +1,343 @@
+"""
+In-memory fake of the Firestore client and Firebase Storage bucket.
+
+Intended for benchmarking and local experiments: every simulated round trip can
+be delayed by a fixed latency plus random jitter, so route behaviour can be
+measured at e.g. 5ms vs 50ms RTT without the real service.
+"""
+
+import heapq
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import cmp_to_key
+
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from .document_store import DESCENDING, LocalClient, get_field, matches_filter, order_key
+from .sqlite_backend import INDEXED_FIELDS
+
+# Field values that can be looked up in a hash index
+_INDEXABLE_TYPES = (str, int, float, bool)
+
+
+class LatencyModel:
+    """
+    Simulated network round trip: a fixed delay plus uniform random jitter
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        """
+        Initialize a new LatencyModel instance
+
+        :param latency: Base delay per round trip in seconds
+        :param jitter: Maximum random deviation from the base delay in seconds
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, kind):
+        """
+        Record one round trip and sleep for its simulated duration
+
+        :param kind: RPC kind
+        """
+        with self._lock:
+            self.counts[kind] += 1
+        delay = self.latency
+        if self.jitter:
+            delay += random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reset(self):
+        """Clear the recorded RPC counts"""
+        with self._lock:
+            self.counts.clear()
+
+
+def _compare_rows(orders, include_id=True):
+    """Build a comparison function ordering (doc_id, data) rows by order_by clauses"""
+    def compare(left, right):
+        for field_path, direction in orders:
+            a = order_key(get_field(left[1], field_path)[1])
+            b = order_key(get_field(right[1], field_path)[1])
+            if a != b:
+                result = -1 if a < b else 1
+                return -result if direction == DESCENDING else result
+        if not include_id or left[0] == right[0]:
+            return 0
+        result = -1 if left[0] < right[0] else 1
+        last_direction = orders[-1][1] if orders else None
+        return -result if last_direction == DESCENDING else result
+    return compare
+
+
+class MemoryStore:
+    """
+    Document store keeping every document in a Python dictionary, with hash
+    indexes on the fields the app filters on (like the SQLite engine's
+    expression indexes), so equality queries do not scan the whole collection
+    """
+
+    def __init__(self):
+        self._collections = {}
+        # collection -> field -> value -> set of document IDs
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def atomic(self):
+        with self._lock:
+            yield
+
+    def get(self, collection, doc_id):
+        with self._lock:
+            return self._collections.get(collection, {}).get(doc_id)
+
+    def _index(self, collection, doc_id, data, add):
+        """Add a document's indexed values to (or remove them from) the indexes"""
+        indexes = self._indexes.setdefault(collection, {})
+        for field in INDEXED_FIELDS:
+            found, value = get_field(data, field)
+            if not found or not isinstance(value, _INDEXABLE_TYPES):
+                continue
+            ids = indexes.setdefault(field, {}).setdefault(value, set())
+            if add:
+                ids.add(doc_id)
+            else:
+                ids.discard(doc_id)
+
+    def put(self, collection, doc_id, data, update_time):
+        with self._lock:
+            documents = self._collections.setdefault(collection, {})
+            previous = documents.get(doc_id)
+            if previous is not None:
+                self._index(collection, doc_id, previous[0], add=False)
+            documents[doc_id] = (data, update_time)
+            self._index(collection, doc_id, data, add=True)
+
+    def delete(self, collection, doc_id):
+        with self._lock:
+            previous = self._collections.get(collection, {}).pop(doc_id, None)
+            if previous is not None:
+                self._index(collection, doc_id, previous[0], add=False)
+
+    def _candidates(self, collection, filters):
+        """
+        Get the documents that may match the filters, using the smallest index hit
+
+        :return: List of (doc_id, (data, update_time)) items
+        """
+        documents = self._collections.get(collection, {})
+        indexes = self._indexes.get(collection, {})
+        best = None
+        for field, op, value in filters:
+            if op != '==' or field not in INDEXED_FIELDS or not isinstance(value, _INDEXABLE_TYPES):
+                continue
+            ids = indexes.get(field, {}).get(value, ())
+            if best is None or len(ids) < len(best):
+                best = ids
+        if best is None:
+            return list(documents.items())
+        # Index hits are re-checked against every filter (e.g. True == 1 share a hash bucket)
+        return [(doc_id, documents[doc_id]) for doc_id in best if doc_id in documents]
+
+    def query(self, collection, filters, orders, after, limit):
+        with self._lock:
+            documents = self._candidates(collection, filters)
+
+        rows = []
+        for doc_id, (data, update_time) in documents:
+            if not all(matches_filter(data, field, op, value) for field, op, value in filters):
+                continue
+            # Like Firestore, documents missing an order_by field are excluded
+            if not all(get_field(data, field)[0] for field, _ in orders):
+                continue
+            rows.append((doc_id, data, update_time))
+
+        compare = _compare_rows(orders)
+
+        if after is not None:
+            values, cursor_id = after
+            cursor_data = {}
+            for (field_path, _), value in zip(orders, values):
+                cursor_data[field_path] = value
+            if cursor_id is None:
+                # Field-value cursor: skip everything that sorts equal to it as well
+                compare_fields = _compare_rows(orders, include_id=False)
+                rows = [row for row in rows if compare_fields(row, (None, cursor_data)) > 0]
+            else:
+                rows = [row for row in rows if compare(row, (cursor_id, cursor_data)) > 0]
+
+        directions = {direction for _, direction in orders}
+        if len(directions) <= 1:
+            # One direction: a plain sort key computed once per row
+            def key(row):
+                return tuple(order_key(get_field(row[1], field)[1]) for field, _ in orders), row[0]
+            reverse = DESCENDING in directions
+        else:
+            key = cmp_to_key(compare)
+            reverse = False
+
+        if limit is not None and limit < len(rows):
+            # Select the first page without sorting the whole result
+            return (heapq.nlargest if reverse else heapq.nsmallest)(limit, rows, key=key)
+        rows.sort(key=key, reverse=reverse)
+        return rows
+
+    def clear(self):
+        """Remove every document"""
+        with self._lock:
+            self._collections.clear()
+            self._indexes.clear()
+
+
+class MemoryClient(LocalClient):
+    """
+    Firestore-compatible client over a MemoryStore with latency injection
+    """
+
+    def __init__(self, store=None, latency_model=None):
+        """
+        Initialize a new MemoryClient instance
+
+        :param store: MemoryStore to use (a new one is created if omitted)
+        :param latency_model: LatencyModel applied to every round trip
+        """
+        super().__init__(store or MemoryStore())
+        self.latency_model = latency_model or LatencyModel()
+
+    def _rpc(self, kind):
+        self.latency_model(kind)
+
+
+class MemoryBlob:
+    """
+    Blob held in a MemoryBucket
+    """
+
+    def __init__(self, bucket, name, generation=None):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        # Generation seen when the blob was fetched with get_blob (None for blob())
+        self.generation = generation
+
+    @property
+    def public_url(self):
+        return f'https://storage.googleapis.com/{self.bucket.name}/{self.name}'
+
+    @property
+    def size(self):
+        data = self.bucket._blobs.get(self.name)
+        return len(data) if data is not None else None
+
+    def exists(self):
+        self.bucket._rpc('storage.get')
+        return self.name in self.bucket._blobs
+
+    def upload_from_string(self, data, content_type=None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.bucket._rpc('storage.upload')
+        self.content_type = content_type
+        with self.bucket._lock:
+            self.bucket._blobs[self.name] = bytes(data)
+            self.bucket._generation += 1
+            self.bucket._generations[self.name] = self.generation = self.bucket._generation
+
+    def upload_from_file(self, file_obj, content_type=None, size=None, rewind=False):
+        if rewind:
+            file_obj.seek(0)
+        data = file_obj.read() if size is None else file_obj.read(size)
+        self.upload_from_string(data, content_type=content_type)
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, 'rb') as source:
+            self.upload_from_string(source.read(), content_type=content_type)
+
+    def download_as_bytes(self):
+        self.bucket._rpc('storage.download')
+        try:
+            return self.bucket._blobs[self.name]
+        except KeyError:
+            raise NotFound(f'No such object: {self.bucket.name}/{self.name}')
+
+    def make_public(self):
+        self.bucket._rpc('storage.acl')
+
+    def delete(self, if_generation_match=None):
+        self.bucket._rpc('storage.delete')
+        with self.bucket._lock:
+            if self.name not in self.bucket._blobs:
+                raise NotFound(f'No such object: {self.bucket.name}/{self.name}')
+            if if_generation_match is not None and self.bucket._generations.get(self.name) != if_generation_match:
+                raise PreconditionFailed(f'Generation mismatch: {self.bucket.name}/{self.name}')
+            del self.bucket._blobs[self.name]
+            self.bucket._generations.pop(self.name, None)
+
+
+class MemoryBucket:
+    """
+    Fake of google.cloud.storage.Bucket keeping blobs in memory
+    """
+
+    def __init__(self, name='memory-bucket', latency_model=None):
+        """
+        Initialize a new MemoryBucket instance
+
+        :param name: Bucket name used in public URLs
+        :param latency_model: LatencyModel applied to every storage call
+        """
+        self.name = name
+        self.latency_model = latency_model or LatencyModel()
+        self._blobs = {}
+        # Blob name -> generation, bumped on every upload (like Cloud Storage object generations)
+        self._generations = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _rpc(self, kind):
+        self.latency_model(kind)
+
+    def blob(self, blob_name):
+        return MemoryBlob(self, blob_name)
+
+    def get_blob(self, blob_name):
+        self._rpc('storage.get')
+        with self._lock:
+            generation = self._generations.get(blob_name)
+        return MemoryBlob(self, blob_name, generation) if generation is not None else None
+
+    def list_blobs(self, prefix=None):
+        self._rpc('storage.list')
+        with self._lock:
+            names = sorted(self._blobs)
+        return [self.blob(name) for name in names if not prefix or name.startswith(prefix)]
+
+
+def create_client(latency=0.0, jitter=0.0):
+    """
+    Create an in-memory Firestore fake
+
+    :param latency: Simulated round-trip time in seconds
+    :param jitter: Maximum random deviation from the round-trip time in seconds
+    :return: MemoryClient instance
+    """
+    return MemoryClient(latency_model=LatencyModel(latency, jitter))
+
+
+def create_bucket(latency=0.0, jitter=0.0):
+    """
+    Create an in-memory storage bucket fake
+
+    :param latency: Simulated round-trip time in seconds
+    :param jitter: Maximum random deviation from the round-trip time in seconds
+    :return: MemoryBucket instance
+    """
+    return MemoryBucket(latency_model=LatencyModel(latency, jitter))
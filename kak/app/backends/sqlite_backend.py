@@ -0,0 +1,286 @@
+"""
+SQLite storage engine for the local document backend.
+
+Documents are stored as JSON in a single table keyed by (collection, id), with
+expression indexes on the fields the app filters on so that lookups such as
+"all tasks of a user" are index seeks instead of full scans.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from .document_store import DESCENDING, LocalClient
+
+# Fields that get an expression index; these cover every where() in the app
+INDEXED_FIELDS = ('userId', 'categoryId', 'category', 'status', 'dueDate', 'active')
+
+# Composite indexes for filtered + ordered queries (mirrors firestore.indexes.json)
+COMPOSITE_INDEXES = (
+    ('userId', 'createdAt'),
+)
+
+# Number of rows fetched per round of a streaming query
+PAGE_SIZE = 500
+
+# Only plain dotted identifiers are accepted as field paths in SQL
+_FIELD_PATH_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+# A rowid table on purpose: SQLite's planner skips expression indexes on WITHOUT ROWID tables
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+"""
+
+_COMPARISON_OPS = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+
+def _json_default(value):
+    """Encode values the json module does not know about"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('latin-1')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _sql_value(value):
+    """Convert a Python operand to the value json_extract() would return"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+def _field_expr(field_path):
+    """
+    SQL expression reading a field from the JSON document.
+    The text must match the index definitions exactly for SQLite to use them.
+    """
+    if not _FIELD_PATH_RE.match(field_path):
+        raise ValueError(f'Unsupported field path for SQLite backend: {field_path!r}')
+    return f"json_extract(data, '$.{field_path}')"
+
+
+class SQLiteStore:
+    """
+    Document store persisting JSON documents in an indexed SQLite table
+    """
+
+    def __init__(self, path):
+        """
+        Initialize a new SQLiteStore instance
+
+        :param path: Path of the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        for field in INDEXED_FIELDS:
+            conn.execute(
+                f'CREATE INDEX IF NOT EXISTS documents_{field} '
+                f'ON documents (collection, {_field_expr(field)})'
+            )
+        for fields in COMPOSITE_INDEXES:
+            columns = ', '.join(_field_expr(field) for field in fields)
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS documents_{'_'.join(fields)} "
+                f'ON documents (collection, {columns})'
+            )
+
+    def _connection(self):
+        """Get the connection owned by the current thread, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def atomic(self):
+        """Run a group of writes in a single transaction"""
+        conn = self._connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.depth = 0
+
+    def get(self, collection, doc_id):
+        row = self._connection().execute(
+            'SELECT data, updated_at FROM documents WHERE collection = ? AND id = ?',
+            (collection, doc_id)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), datetime.fromisoformat(row[1])
+
+    def put(self, collection, doc_id, data, update_time):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO documents (collection, id, data, updated_at) VALUES (?, ?, ?, ?)',
+            (collection, doc_id, json.dumps(data, default=_json_default),
+             (update_time or datetime.now(timezone.utc)).isoformat())
+        )
+
+    def delete(self, collection, doc_id):
+        self._connection().execute(
+            'DELETE FROM documents WHERE collection = ? AND id = ?',
+            (collection, doc_id)
+        )
+
+    def _build_query(self, collection, filters, orders):
+        """Translate where() and order_by() clauses into SQL fragments"""
+        clauses = ['collection = ?']
+        params = [collection]
+
+        for field_path, op, value in filters:
+            expr = _field_expr(field_path)
+            if op in _COMPARISON_OPS:
+                clauses.append(f'{expr} {_COMPARISON_OPS[op]} ?')
+                params.append(_sql_value(value))
+            elif op in ('in', 'not-in'):
+                placeholders = ', '.join('?' for _ in value) or 'NULL'
+                keyword = 'IN' if op == 'in' else 'NOT IN'
+                clauses.append(f'{expr} {keyword} ({placeholders})')
+                params.extend(_sql_value(item) for item in value)
+            elif op in ('array_contains', 'array_contains_any'):
+                items = [value] if op == 'array_contains' else list(value)
+                placeholders = ', '.join('?' for _ in items) or 'NULL'
+                clauses.append(
+                    f"EXISTS (SELECT 1 FROM json_each(data, '$.{field_path}') "
+                    f'WHERE json_each.value IN ({placeholders}))'
+                )
+                params.extend(_sql_value(item) for item in items)
+            else:
+                raise ValueError(f'Unsupported filter operator: {op}')
+
+        # Like Firestore, documents missing an order_by field are excluded
+        order_terms = []
+        for field_path, direction in orders:
+            expr = _field_expr(field_path)
+            clauses.append(f"json_type(data, '$.{field_path}') IS NOT NULL")
+            order_terms.append((expr, direction))
+
+        return clauses, params, order_terms
+
+    @staticmethod
+    def _keyset(keys):
+        """
+        Build a "strictly after" condition over (expression, direction, value) keys
+
+        :return: (sql, params) tuple
+        """
+        alternatives = []
+        params = []
+        for i, (expr, direction, value) in enumerate(keys):
+            parts = []
+            for prev_expr, _, prev_value in keys[:i]:
+                parts.append(f'{prev_expr} = ?')
+                params.append(_sql_value(prev_value))
+            parts.append(f"{expr} {'<' if direction == DESCENDING else '>'} ?")
+            params.append(_sql_value(value))
+            alternatives.append('(' + ' AND '.join(parts) + ')')
+        return '(' + ' OR '.join(alternatives) + ')', params
+
+    def query(self, collection, filters, orders, after, limit):
+        """
+        Stream matching documents page by page using keyset pagination
+
+        :return: Generator of (doc_id, data, update_time)
+        """
+        clauses, params, order_terms = self._build_query(collection, filters, orders)
+        id_direction = order_terms[-1][1] if order_terms else 'ASCENDING'
+        order_sql = ', '.join(
+            f"{expr} {'DESC' if direction == DESCENDING else 'ASC'}"
+            for expr, direction in order_terms + [('id', id_direction)]
+        )
+
+        cursor = None
+        if after is not None:
+            values, doc_id = after
+            cursor = [(expr, direction, value)
+                      for (expr, direction), value in zip(order_terms, values)]
+            if doc_id is not None:
+                cursor.append(('id', id_direction, doc_id))
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_clauses = list(clauses)
+            page_params = list(params)
+            if cursor:
+                keyset_sql, keyset_params = self._keyset(cursor)
+                page_clauses.append(keyset_sql)
+                page_params.extend(keyset_params)
+
+            page_size = PAGE_SIZE if remaining is None else min(PAGE_SIZE, remaining)
+            select_exprs = ''.join(f', {expr}' for expr, _ in order_terms)
+            rows = self._connection().execute(
+                f'SELECT id, data, updated_at{select_exprs} FROM documents '
+                f"WHERE {' AND '.join(page_clauses)} ORDER BY {order_sql} LIMIT ?",
+                page_params + [page_size]
+            ).fetchall()
+
+            for row in rows:
+                yield row[0], json.loads(row[1]), datetime.fromisoformat(row[2])
+
+            if len(rows) < page_size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+
+            last = rows[-1]
+            cursor = [(expr, direction, last[3 + i])
+                      for i, (expr, direction) in enumerate(order_terms)]
+            cursor.append(('id', id_direction, last[0]))
+
+    def close(self):
+        """Close every connection opened by this store"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def create_client(path):
+    """
+    Create a Firestore-compatible client backed by SQLite
+
+    :param path: Path of the SQLite database file
+    :return: LocalClient instance
+    """
+    return LocalClient(SQLiteStore(path))
@@ -1,5 +1,6 @@
-from firebase_admin import firestore
 from datetime import datetime
+from ..backends import get_db
+from ..services.admin_roles import invalidate_admin_role
 from .user_model import User
 
 class Admin(User):
@@ -8,6 +9,9 @@ class Admin(User):
     This represents a user with admin privileges.
     """
     
+    # Admin-specific slots; the user fields come from User
+    __slots__ = ('admin_id', 'active', 'granted_at', 'granted_by')
+    
     def __init__(self, uid=None, email=None, profile_picture=None, task_count=0, 
                  last_active=None, created_at=None, admin_id=None, active=True, 
                  granted_at=None, granted_by=None):
@@ -86,7 +90,7 @@ class Admin(User):
         super().save()
         
         # Save admin data
-        db = firestore.client()
+        db = get_db()
         
         # If no admin_id, create a new document
         if not self.admin_id:
@@ -96,6 +100,7 @@ class Admin(User):
             doc_ref = db.collection('admins').document(self.admin_id)
             
         doc_ref.set(self.admin_to_dict())
+        invalidate_admin_role(self.uid)
         return True
     
     def update_admin(self, data):
@@ -105,9 +110,10 @@ class Admin(User):
         :param data: Dictionary of data to update
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('admins').document(self.admin_id)
         doc_ref.update(data)
+        invalidate_admin_role(self.uid)
         return True
     
     def deactivate(self):
@@ -127,14 +133,24 @@ class Admin(User):
         :param admin_id: Admin ID
         :return: Admin instance or None
         """
-        db = firestore.client()
+        db = get_db()
         admin_ref = db.collection('admins').document(admin_id)
         admin_doc = admin_ref.get()
         
         if not admin_doc.exists:
             return None
             
-        admin_data = admin_doc.to_dict()
+        return cls._from_admin_data(admin_id, admin_doc.to_dict())
+    
+    @classmethod
+    def _from_admin_data(cls, admin_id, admin_data):
+        """
+        Build an Admin from an already fetched admin record
+        
+        :param admin_id: Admin ID
+        :param admin_data: Dictionary data of the admin document
+        :return: Admin instance or None
+        """
         user_id = admin_data.get('userId')
         
         if not user_id:
@@ -163,12 +179,12 @@ class Admin(User):
         :param user_id: User ID
         :return: Admin instance or None
         """
-        db = firestore.client()
+        db = get_db()
         query = db.collection('admins').where('userId', '==', user_id).where('active', '==', True).limit(1)
         docs = query.get()
         
         for doc in docs:
-            return cls.get_by_admin_id(doc.id)
+            return cls._from_admin_data(doc.id, doc.to_dict())
         return None
     
     @classmethod
@@ -202,13 +218,13 @@ class Admin(User):
         
         :return: List of Admin instances
         """
-        db = firestore.client()
+        db = get_db()
         query = db.collection('admins').where('active', '==', True)
         docs = query.get()
         
         admins = []
         for doc in docs:
-            admin = cls.get_by_admin_id(doc.id)
+            admin = cls._from_admin_data(doc.id, doc.to_dict())
             if admin:
                 admins.append(admin)
         return admins
@@ -1,5 +1,6 @@
 from firebase_admin import firestore
 from datetime import datetime
+from ..backends import get_db
 
 class Category:
     """
@@ -7,6 +8,10 @@ class Category:
     This class provides methods for category operations and mapping to/from Firestore.
     """
     
+    # Attributes are kept in slots instead of a per-instance __dict__, which
+    # matters when thousands of tasks (a subclass) are loaded at once
+    __slots__ = ('category_id', 'name', 'color', 'created_at')
+    
     def __init__(self, category_id=None, name=None, color=None, created_at=None):
         """
         Initialize a new Category instance
@@ -61,7 +66,7 @@ class Category:
         :param category_id: Category ID
         :return: Category instance or None
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('categories').document(category_id)
         doc = doc_ref.get()
         
@@ -69,6 +74,27 @@ class Category:
             return cls.from_dict(category_id, doc.to_dict())
         return None
     
+    @classmethod
+    def get_many(cls, category_ids):
+        """
+        Get several categories in a single batched read
+        
+        :param category_ids: Iterable of category IDs
+        :return: Dictionary mapping category ID to Category instance (missing IDs are left out)
+        """
+        category_ids = {category_id for category_id in category_ids if category_id}
+        if not category_ids:
+            return {}
+            
+        db = get_db()
+        refs = [db.collection('categories').document(category_id) for category_id in category_ids]
+        
+        categories = {}
+        for doc in db.get_all(refs):
+            if doc.exists:
+                categories[doc.id] = cls.from_dict(doc.id, doc.to_dict())
+        return categories
+    
     @classmethod
     def get_all(cls):
         """
@@ -76,7 +102,7 @@ class Category:
         
         :return: List of Category instances
         """
-        db = firestore.client()
+        db = get_db()
         docs = db.collection('categories').get()
         
         categories = []
@@ -90,7 +116,7 @@ class Category:
         
         :return: Category ID
         """
-        db = firestore.client()
+        db = get_db()
         
         if not self.category_id:
             # Create new document
@@ -110,7 +136,7 @@ class Category:
         :param data: Dictionary of data to update
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('categories').document(self.category_id)
         
         # Update the model with the new data
@@ -129,7 +155,7 @@ class Category:
         
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         db.collection('categories').document(self.category_id).delete()
         return True
     
@@ -139,7 +165,7 @@ class Category:
         
         :return: List of task dictionaries
         """
-        db = firestore.client()
+        db = get_db()
         query = db.collection('tasks').where('categoryId', '==', self.category_id)
         docs = query.get()
         
@@ -157,7 +183,7 @@ class Category:
         
         :return: List of Category instances
         """
-        db = firestore.client()
+        db = get_db()
         categories_ref = db.collection('categories')
         docs = categories_ref.get()
         
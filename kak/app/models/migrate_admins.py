@@ -8,11 +8,12 @@ import os
 import sys
 from datetime import datetime
 
-# Add the project root to the sys.path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+# Add the project root (the kak directory) to the sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 # Import the models
 from app.models import User, Admin
+from app.backends import get_db, get_backend_name
 
 def migrate_admins():
     """
@@ -20,8 +21,8 @@ def migrate_admins():
     """
     print("Starting admin migration...")
     
-    # Get Firestore database client
-    db = firestore.client()
+    # Get database client of the configured backend
+    db = get_db()
     
     # Query all users with is_admin=True
     query = db.collection('users').where('is_admin', '==', True)
@@ -74,9 +75,10 @@ def migrate_admins():
     """
 
 if __name__ == "__main__":
-    # Initialize Firebase if not already initialized
+    # Initialize Firebase if not already initialized (only needed for the Firestore backend)
     try:
-        db = firestore.client()
+        if get_backend_name() == 'firestore':
+            firestore.client()
     except:
         # Load Firebase credentials from the JSON file
         cred = credentials.Certificate('firebase-key.json')
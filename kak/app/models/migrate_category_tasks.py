@@ -0,0 +1,66 @@
+"""
+Migration script that removes the legacy 'tasks' arrays from category documents.
+Category membership is derived from the indexed 'category' field on tasks, so the
+arrays are no longer read or written. Run it once after deploying that change.
+"""
+
+from firebase_admin import firestore, credentials, initialize_app
+import os
+import sys
+
+# Add the project root (the kak directory) to the sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.backends import get_db, get_backend_name
+
+# Maximum number of writes in a single Firestore batch
+BATCH_SIZE = 500
+
+def migrate_category_tasks():
+    """
+    Delete the 'tasks' field from every category document
+    """
+    print("Starting category tasks migration...")
+    
+    # Get database client of the configured backend
+    db = get_db()
+    
+    batch = db.batch()
+    pending = 0
+    migrated_count = 0
+    
+    # Iterate through categories that still carry a tasks array
+    for doc in db.collection('categories').stream():
+        category_data = doc.to_dict()
+        if 'tasks' not in category_data:
+            continue
+            
+        print(f"Processing category: {doc.id} ({len(category_data['tasks'])} task IDs)")
+        batch.update(doc.reference, {'tasks': firestore.DELETE_FIELD})
+        pending += 1
+        migrated_count += 1
+        
+        # Commit full batches as we go
+        if pending >= BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+            
+    if pending:
+        batch.commit()
+        
+    print(f"Migration complete. {migrated_count} categories cleaned up.")
+
+if __name__ == "__main__":
+    # Initialize Firebase if not already initialized (only needed for the Firestore backend)
+    try:
+        if get_backend_name() == 'firestore':
+            firestore.client()
+    except:
+        # Load Firebase credentials from the JSON file
+        cred = credentials.Certificate('firebase-key.json')
+        # Initialize Firebase app
+        initialize_app(cred)
+    
+    # Run migration
+    migrate_category_tasks()
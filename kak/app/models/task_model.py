@@ -1,10 +1,12 @@
-from firebase_admin import firestore, storage
+from firebase_admin import firestore
 from datetime import datetime
-import os
-import uuid
-from werkzeug.utils import secure_filename
-import tempfile
 from .category_model import Category
+from ..backends import get_db, get_bucket
+from ..services.counters import user_task_counter
+from ..services.jobs import enqueue, enqueue_counter_change
+from ..services.task_versions import task_versions
+from ..services.images import release_image, store_image
+from ..utils.storage import task_image_folder
 
 class Task(Category):
     """
@@ -12,10 +14,14 @@ class Task(Category):
     This represents a task which is a specialized form of a category.
     """
     
+    # Task-specific slots; the category fields (and created_at) come from Category
+    __slots__ = ('task_id', 'title', 'description', 'status', 'user_id', 'image_url',
+                 'image_renditions', 'due_date', 'updated_at')
+    
     def __init__(self, task_id=None, title=None, description=None, status=None, 
                  user_id=None, due_date=None, image_url=None, created_at=None, 
                  updated_at=None, category_id=None, name=None, color=None, 
-                 category_created_at=None):
+                 category_created_at=None, image_renditions=None):
         """
         Initialize a new Task instance
         
@@ -32,6 +38,7 @@ class Task(Category):
         :param name: Category name (from parent)
         :param color: Category color (from parent)
         :param category_created_at: Category creation timestamp (from parent)
+        :param image_renditions: Dictionary of rendition name (thumbnail, medium) to URL
         """
         # Initialize parent Category class
         super().__init__(
@@ -48,24 +55,30 @@ class Task(Category):
         self.status = status or 'pending'
         self.user_id = user_id
         self.image_url = image_url
+        self.image_renditions = image_renditions or {}
         self.due_date = due_date
         self.created_at = created_at
         self.updated_at = updated_at or datetime.now().isoformat()
     
     @classmethod
-    def from_dict(cls, task_id, data):
+    def from_dict(cls, task_id, data, categories=None):
         """
         Create a Task instance from a Firestore document
         
         :param task_id: Task ID
         :param data: Dictionary data from Firestore
+        :param categories: Optional dictionary of already loaded categories by ID;
+                           when given, no extra read is made for the task's category
         :return: Task instance
         """
         # Get category data for this task
         category_id = data.get('categoryId')
         category_data = {}
         if category_id:
-            category = Category.get_by_id(category_id)
+            if categories is not None:
+                category = categories.get(category_id)
+            else:
+                category = Category.get_by_id(category_id)
             if category:
                 category_data = {
                     'name': category.name,
@@ -81,12 +94,33 @@ class Task(Category):
             user_id=data.get('userId'),
             due_date=data.get('dueDate'),
             image_url=data.get('imageUrl'),
+            image_renditions=data.get('imageRenditions'),
             created_at=data.get('createdAt'),
             updated_at=data.get('updatedAt'),
             category_id=category_id,
             **category_data
         )
     
+    @classmethod
+    def from_docs(cls, docs):
+        """
+        Create Task instances from a list of Firestore documents,
+        resolving all of their categories with one batched read
+        
+        :param docs: Iterable of document snapshots
+        :return: List of Task instances
+        """
+        # Build the tasks first so each document's data can be freed right away,
+        # then fill in the category fields (a task's own created_at wins, as in __init__)
+        tasks = [cls.from_dict(doc.id, doc.to_dict(), categories={}) for doc in docs]
+        categories = Category.get_many(task.category_id for task in tasks)
+        for task in tasks:
+            category = categories.get(task.category_id)
+            if category:
+                task.name = category.name
+                task.color = category.color
+        return tasks
+    
     def to_dict(self):
         """
         Convert Task instance to a dictionary for Firestore
@@ -106,6 +140,7 @@ class Task(Category):
             
         if self.image_url:
             task_dict['imageUrl'] = self.image_url
+            task_dict['imageRenditions'] = self.image_renditions
             
         if self.due_date:
             task_dict['dueDate'] = self.due_date
@@ -123,7 +158,7 @@ class Task(Category):
         :param task_id: Task ID
         :return: Task instance or None
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('tasks').document(task_id)
         doc = doc_ref.get()
         
@@ -141,7 +176,7 @@ class Task(Category):
         :param status: Status filter (optional)
         :return: List of Task instances
         """
-        db = firestore.client()
+        db = get_db()
         query = db.collection('tasks').where('userId', '==', user_id)
         
         if category_id and category_id != 'all':
@@ -152,10 +187,7 @@ class Task(Category):
             
         docs = query.get()
         
-        tasks = []
-        for doc in docs:
-            tasks.append(cls.from_dict(doc.id, doc.to_dict()))
-        return tasks
+        return cls.from_docs(docs)
     
     @classmethod
     def get_all(cls, admin=False):
@@ -168,13 +200,10 @@ class Task(Category):
         if not admin:
             return []
             
-        db = firestore.client()
+        db = get_db()
         docs = db.collection('tasks').get()
         
-        tasks = []
-        for doc in docs:
-            tasks.append(cls.from_dict(doc.id, doc.to_dict()))
-        return tasks
+        return cls.from_docs(docs)
     
     def save(self):
         """
@@ -182,7 +211,7 @@ class Task(Category):
         
         :return: Task ID
         """
-        db = firestore.client()
+        db = get_db()
         
         if not self.task_id:
             # Create new document
@@ -192,15 +221,18 @@ class Task(Category):
             # Update existing document
             doc_ref = db.collection('tasks').document(self.task_id)
             
-        doc_ref.set(self.to_dict(), merge=True)
-        
-        # If this is a new task, increment the user's task count
+        # Write the task together with a new version stamp of the owner's task list
+        batch = db.batch()
+        batch.set(doc_ref, self.to_dict(), merge=True)
+        if self.user_id:
+            task_versions.add_to_batch(batch, self.user_id)
+        batch.commit()
+        
+        # If this is a new task, increment the user's (sharded) task count in the background
         if not self.created_at:
-            user_ref = db.collection('users').document(self.user_id)
-            user_ref.update({
-                'taskCount': firestore.Increment(1),
-                'lastActive': datetime.now().isoformat()
-            })
+            enqueue('merge_document', collection='users', doc_id=self.user_id,
+                    data={'lastActive': datetime.now().isoformat()})
+            enqueue_counter_change(user_task_counter, self.user_id, 1)
             
         return self.task_id
     
@@ -211,7 +243,7 @@ class Task(Category):
         :param data: Dictionary of data to update
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('tasks').document(self.task_id)
         
         # Update the model with the new data
@@ -236,7 +268,11 @@ class Task(Category):
         data['updatedAt'] = datetime.now().isoformat()
         self.updated_at = data['updatedAt']
         
-        doc_ref.update(data)
+        batch = db.batch()
+        batch.update(doc_ref, data)
+        if self.user_id:
+            task_versions.add_to_batch(batch, self.user_id)
+        batch.commit()
         return True
     
     def delete(self):
@@ -245,30 +281,23 @@ class Task(Category):
         
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         
-        # Delete the task document
-        db.collection('tasks').document(self.task_id).delete()
+        # Delete the task document together with a new version stamp of the owner's task list
+        batch = db.batch()
+        batch.delete(db.collection('tasks').document(self.task_id))
+        if self.user_id:
+            task_versions.add_to_batch(batch, self.user_id)
+        batch.commit()
         
-        # If task had an image, delete it from storage
+        # If task had an image, release it; the blob goes once no task or user references it
         if self.image_url:
-            try:
-                # Extract filename from URL
-                filename = self.image_url.split('/task_images/')[1]
-                
-                # Delete from Firebase Storage
-                bucket = storage.bucket()
-                blob = bucket.blob(f'task_images/{filename}')
-                blob.delete()
-            except Exception as e:
-                print(f"Error deleting image: {str(e)}")
-        
-        # Decrement user's task count
-        user_ref = db.collection('users').document(self.user_id)
-        user_ref.update({
-            'taskCount': firestore.Increment(-1),
-            'lastActive': datetime.now().isoformat()
-        })
+            release_image(self.image_url, self.image_renditions, task_image_folder(self.image_url))
+        
+        # Decrement user's (sharded) task count in the background
+        enqueue('merge_document', collection='users', doc_id=self.user_id,
+                data={'lastActive': datetime.now().isoformat()})
+        enqueue_counter_change(user_task_counter, self.user_id, -1)
         
         return True
     
@@ -290,36 +319,21 @@ class Task(Category):
         if not file or file.filename == '':
             return None
             
-        # Create a secure filename
-        filename = f"task_{self.task_id}_{uuid.uuid4()}_{secure_filename(file.filename)}"
-        
-        # Save to temporary file
-        temp_path = None
-        try:
-            with tempfile.NamedTemporaryFile(delete=False) as temp:
-                temp_path = temp.name
-                file.save(temp_path)
-                
-            # Upload to Firebase Storage
-            bucket = storage.bucket()
-            blob = bucket.blob(f"task_images/{filename}")
-            blob.upload_from_filename(temp_path)
-            
-            # Make public
-            blob.make_public()
-            public_url = blob.public_url
-            
-            # Update task with image URL
-            self.image_url = public_url
-            self.update({'imageUrl': public_url})
-            
-            return public_url
-        finally:
-            # Clean up temporary file
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+        previous_url, previous_renditions = self.image_url, self.image_renditions
         
-        return None
+        # Store the upload under its content hash (identical files are uploaded once)
+        public_url, renditions = store_image(file, get_bucket(), 'task_images')
+        
+        # Update task with image URLs
+        self.image_url = public_url
+        self.image_renditions = renditions
+        self.update({'imageUrl': public_url, 'imageRenditions': renditions})
+        
+        # Release the image this one replaced
+        if previous_url:
+            release_image(previous_url, previous_renditions, task_image_folder(previous_url))
+        
+        return public_url
     
     @classmethod
     def get_task_counts_by_category(cls, user_id=None):
@@ -329,7 +343,7 @@ class Task(Category):
         :param user_id: User ID to filter by (optional)
         :return: Dictionary with category IDs as keys and counts as values
         """
-        db = firestore.client()
+        db = get_db()
         tasks_ref = db.collection('tasks')
         
         # If user_id provided, filter by user
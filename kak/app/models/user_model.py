@@ -1,5 +1,6 @@
 from firebase_admin import firestore
 from datetime import datetime
+from ..backends import get_db
 
 class User:
     """
@@ -7,8 +8,12 @@ class User:
     This class provides methods for user operations and mapping to/from Firestore.
     """
     
+    # Attributes are kept in slots instead of a per-instance __dict__
+    __slots__ = ('uid', 'email', 'profile_picture', 'profile_picture_renditions', 'task_count',
+                 'last_active', 'created_at')
+    
     def __init__(self, uid=None, email=None, profile_picture=None, task_count=0, 
-                 last_active=None, created_at=None):
+                 last_active=None, created_at=None, profile_picture_renditions=None):
         """
         Initialize a new User instance
         
@@ -18,10 +23,12 @@ class User:
         :param task_count: Count of tasks created by the user
         :param last_active: Timestamp of user's last activity
         :param created_at: Timestamp when user was created
+        :param profile_picture_renditions: Dictionary of rendition name (thumbnail, medium) to URL
         """
         self.uid = uid
         self.email = email
         self.profile_picture = profile_picture
+        self.profile_picture_renditions = profile_picture_renditions or {}
         self.task_count = task_count
         self.last_active = last_active or datetime.now().isoformat()
         self.created_at = created_at
@@ -41,7 +48,8 @@ class User:
             profile_picture=data.get('profilePicture'),
             task_count=data.get('taskCount', 0),
             last_active=data.get('lastActive'),
-            created_at=data.get('created_at')
+            created_at=data.get('created_at'),
+            profile_picture_renditions=data.get('profilePictureRenditions')
         )
     
     def to_dict(self):
@@ -58,6 +66,7 @@ class User:
         
         if self.profile_picture:
             user_dict['profilePicture'] = self.profile_picture
+            user_dict['profilePictureRenditions'] = self.profile_picture_renditions
             
         if not self.created_at:
             user_dict['created_at'] = firestore.SERVER_TIMESTAMP
@@ -72,7 +81,7 @@ class User:
         :param uid: User ID
         :return: User instance or None
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('users').document(uid)
         doc = doc_ref.get()
         
@@ -86,7 +95,7 @@ class User:
         
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('users').document(self.uid)
         doc_ref.set(self.to_dict(), merge=True)
         return True
@@ -98,7 +107,7 @@ class User:
         :param data: Dictionary of data to update
         :return: True if successful
         """
-        db = firestore.client()
+        db = get_db()
         doc_ref = db.collection('users').document(self.uid)
         doc_ref.update(data)
         return True
@@ -109,6 +118,5 @@ class User:
         
         :return: True if user is an admin
         """
-        from .admin_model import Admin
-        admin = Admin.get_by_user_id(self.uid)
-        return admin is not None 
\ No newline at end of file
+        from ..services.admin_roles import is_active_admin
+        return is_active_admin(self.uid) 
\ No newline at end of file
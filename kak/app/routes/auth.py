@@ -1,26 +1,35 @@
 # Import required components from Flask
 from flask import Blueprint, request, jsonify, session
-# Import Firebase authentication, database and storage
-from firebase_admin import auth, firestore, storage
-# Import secure_filename to sanitize uploaded file names
-from werkzeug.utils import secure_filename
-# Import UUID for generating unique identifiers
-import uuid
-# Import tempfile for creating temporary files
-import tempfile
-# Import os for file operations
-import os
+# Import Firebase authentication
+from firebase_admin import auth
+# Import the error raised when an upload exceeds the size cap
+from werkzeug.exceptions import RequestEntityTooLarge
 # Import datetime for handling dates and times
 from datetime import datetime
 # Import User and Admin models
 from app.models import User, Admin
+# Import the database client, storage bucket and Firebase app of the configured backend
+from app.backends import db, bucket, get_firebase_app
+# Import the cached admin-role lookup
+from app.services.admin_roles import is_active_admin
+# Import the streaming JSON response helper
+from app.utils.streaming import stream_json_array
+# Import the user-email cache so deleted users are evicted
+from app.services.user_emails import forget_user_email
+# Import the sharded user task counter
+from app.services.counters import user_task_counter
+# Import the batched cascade delete of a user's data
+from app.services.cascade_delete import delete_user_data, get_deletion_progress
+# Import the background job queue
+from app.services.jobs import job_queue
+# Import the content-addressed image storage helpers
+from app.services.images import release_image, store_image
 
 # Create a Blueprint for auth routes with prefix '/auth'
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
-# Create a Firestore database client
-db = firestore.client()
-# Get reference to Firebase storage bucket
-bucket = storage.bucket()
+
+# Number of streamed users whose task counts are resolved together
+TASK_COUNT_CHUNK_SIZE = 200
 
 # Define function to check if user is authenticated
 def check_auth():
@@ -47,9 +56,8 @@ def check_admin():
     
     # Check for admin status
     if not is_admin:
-        # If not admin in session, check for admin record
-        admin = Admin.get_by_user_id(user_id)
-        if admin:
+        # If not admin in session, check for an active admin record (cached)
+        if is_active_admin(user_id):
             # Update session with admin status
             session['is_admin'] = True
             # Return that user is admin
@@ -77,7 +85,8 @@ def register():
         # Create user in Firebase Authentication
         firebase_user = auth.create_user(
             email=email,
-            password=password
+            password=password,
+            app=get_firebase_app()
         )
         
         # Create user model
@@ -118,7 +127,7 @@ def login():
         # Verify the ID token
         try:
             # Decode and verify the token
-            decoded_token = auth.verify_id_token(id_token)
+            decoded_token = auth.verify_id_token(id_token, app=get_firebase_app())
             # Get user ID from token
             uid = decoded_token['uid']
         # Catch token verification errors
@@ -132,7 +141,7 @@ def login():
         # If user doesn't exist in database, create it
         if not user:
             # Get user info from Firebase Auth
-            firebase_user = auth.get_user(uid)
+            firebase_user = auth.get_user(uid, app=get_firebase_app())
             # Create new User model
             user = User(
                 uid=uid,
@@ -203,74 +212,33 @@ def upload_profile_picture():
             # Return error if no file selected
             return jsonify({'error': 'No selected file'}), 400
             
-        # Create a secure filename with user ID and UUID
-        filename = f"{user_id}_{uuid.uuid4()}_{secure_filename(file.filename)}"
+        # Store the upload under its content hash (identical files are uploaded once)
+        public_url, renditions = store_image(file, bucket, 'profile_photos')
         
-        # Variable to store temporary file path
-        temp_path = None
-        try:
-            # Save file to a temporary location
-            with tempfile.NamedTemporaryFile(delete=False) as temp:
-                # Get temporary file path
-                temp_path = temp.name
-                # Save uploaded file to temporary location
-                file.save(temp_path)
-                
-            # Create reference to file in Firebase Storage
-            blob = bucket.blob(f"profile_photos/{filename}")
-            # Upload file from temporary location to Firebase
-            blob.upload_from_filename(temp_path)
-            # Make the file publicly accessible
-            blob.make_public()
-            # Get public URL for the file
-            public_url = blob.public_url
-            
-            # Get reference to user document in Firestore
-            user_ref = db.collection('users').document(user_id)
-            
-            # Check if user already has a profile picture
-            user_doc = user_ref.get()
-            # If user document exists
-            if user_doc.exists:
-                # Convert document to dictionary
-                user_data = user_doc.to_dict()
-                # If user has a profile picture
-                if user_data.get('profilePicture'):
-                    try:
-                        # Get URL of old profile picture
-                        old_image_url = user_data['profilePicture']
-                        # Extract filename from URL
-                        old_filename = old_image_url.split('/profile_photos/')[1] if '/profile_photos/' in old_image_url else None
-                        # If filename was found
-                        if old_filename:
-                            # Get reference to old file in Firebase Storage
-                            old_blob = bucket.blob(f"profile_photos/{old_filename}")
-                            # Delete old file
-                            old_blob.delete()
-                    # Catch errors during deletion
-                    except Exception as e:
-                        # Print error message
-                        print(f"Error deleting old profile picture: {e}")
-            
-            # Update user document with new profile picture URL
-            user_ref.update({
-                'profilePicture': public_url,
-                'lastActive': datetime.now().isoformat()
-            })
-            
-            # Return success with new image URL
-            return jsonify({'imageUrl': public_url}), 200
-        # Always execute this block
-        finally:
-            # Delete temporary file if it exists
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    # Remove temporary file
-                    os.unlink(temp_path)
-                # Catch errors during file deletion
-                except Exception as e:
-                    # Print error message
-                    print(f"Error deleting temp file: {e}")
+        # Get reference to user document in Firestore
+        user_ref = db.collection('users').document(user_id)
+        
+        # Check if user already has a profile picture
+        user_doc = user_ref.get()
+        old_user_data = user_doc.to_dict() if user_doc.exists else {}
+        
+        # Update user document with new profile picture URL
+        user_ref.update({
+            'profilePicture': public_url,
+            'profilePictureRenditions': renditions,
+            'lastActive': datetime.now().isoformat()
+        })
+        
+        # Release the old picture in the background (deleted once nothing references it)
+        if old_user_data.get('profilePicture'):
+            release_image(old_user_data['profilePicture'], old_user_data.get('profilePictureRenditions'),
+                          'profile_photos')
+        
+        # Return success with new image URL
+        return jsonify({'imageUrl': public_url, 'imageRenditions': renditions}), 200
+    # Reject uploads over the size cap
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     # Catch any exceptions during upload
     except Exception as e:
         # Return error message
@@ -305,7 +273,7 @@ def change_password():
         
         # Update password in Firebase Auth
         # In a real app, you would verify the current password first
-        auth.update_user(user_id, password=new_password)
+        auth.update_user(user_id, password=new_password, app=get_firebase_app())
         
         # Update last active timestamp
         db.collection('users').document(user_id).update({
@@ -335,51 +303,39 @@ def delete_account():
         if not user_doc.exists:
             return jsonify({'error': 'User not found'}), 404
         
-        user_data = user_doc.to_dict()
-        
-        # Delete profile picture if exists
-        if user_data.get('profilePicture'):
-            try:
-                image_url = user_data['profilePicture']
-                filename = image_url.split('/profile_photos/')[1] if '/profile_photos/' in image_url else None
-                if filename:
-                    blob = bucket.blob(f"profile_photos/{filename}")
-                    blob.delete()
-            except Exception as e:
-                print(f"Error deleting profile picture: {e}")
-        
-        # Delete user's tasks
-        tasks = db.collection('tasks').where('userId', '==', user_id).stream()
-        for task in tasks:
-            task_data = task.to_dict()
-            
-            # Delete task image if exists
-            if task_data.get('imageUrl'):
-                try:
-                    image_url = task_data['imageUrl']
-                    if '/image_photo/' in image_url:
-                        filename = image_url.split('/image_photo/')[1]
-                        blob = bucket.blob(f"image_photo/{filename}")
-                        blob.delete()
-                except Exception as e:
-                    print(f"Error deleting task image: {e}")
-            
-            # Delete task document
-            task.reference.delete()
+        # Delete the user's tasks, images and counters in batches (resumes an interrupted run)
+        progress = delete_user_data(user_id)
         
         # Delete user document
         db.collection('users').document(user_id).delete()
+        forget_user_email(user_id)
         
         # Delete user from Firebase Auth
-        auth.delete_user(user_id)
+        auth.delete_user(user_id, app=get_firebase_app())
         
         # Clear session
         session.clear()
         
-        return jsonify({'message': 'Account deleted successfully'}), 200
+        return jsonify({
+            'message': 'Account deleted successfully',
+            'tasksDeleted': progress['tasksDeleted'],
+            'imagesDeleted': progress['imagesDeleted']
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def add_task_counts(users):
+    """
+    Add the sharded task count to each user's stored base count
+    
+    :param users: List of user dictionaries
+    :return: The same list
+    """
+    totals = user_task_counter.get_totals(user_data['id'] for user_data in users)
+    for user_data in users:
+        user_data['taskCount'] = user_data.get('taskCount', 0) + totals.get(user_data['id'], 0)
+    return users
+
 @auth_bp.route('/users', methods=['GET'])
 def get_users():
     """Get all users - admin only"""
@@ -389,15 +345,22 @@ def get_users():
     
     try:
         users_ref = db.collection('users')
-        users_docs = users_ref.stream()
         
-        users = []
-        for doc in users_docs:
-            user_data = doc.to_dict()
-            user_data['id'] = doc.id
-            users.append(user_data)
+        # Stream users one by one instead of building the whole list in memory,
+        # adding the sharded task counts one chunk of users at a time
+        def generate_users():
+            chunk = []
+            for doc in users_ref.stream():
+                user_data = doc.to_dict()
+                user_data['id'] = doc.id
+                chunk.append(user_data)
+                
+                if len(chunk) >= TASK_COUNT_CHUNK_SIZE:
+                    yield from add_task_counts(chunk)
+                    chunk = []
+            yield from add_task_counts(chunk)
         
-        return jsonify(users), 200
+        return stream_json_array(generate_users())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -454,45 +417,60 @@ def delete_user(user_id):
         if not user_doc.exists:
             return jsonify({'error': 'User not found'}), 404
         
-        user_data = user_doc.to_dict()
-        
-        # Delete profile picture if exists
-        if user_data.get('profilePicture'):
-            try:
-                image_url = user_data['profilePicture']
-                filename = image_url.split('/profile_photos/')[1] if '/profile_photos/' in image_url else None
-                if filename:
-                    blob = bucket.blob(f"profile_photos/{filename}")
-                    blob.delete()
-            except Exception as e:
-                print(f"Error deleting profile picture: {e}")
-        
-        # Delete user's tasks
-        tasks = db.collection('tasks').where('userId', '==', user_id).stream()
-        for task in tasks:
-            task_data = task.to_dict()
-            
-            # Delete task image if exists
-            if task_data.get('imageUrl'):
-                try:
-                    image_url = task_data['imageUrl']
-                    if '/image_photo/' in image_url:
-                        filename = image_url.split('/image_photo/')[1]
-                        blob = bucket.blob(f"image_photo/{filename}")
-                        blob.delete()
-                except Exception as e:
-                    print(f"Error deleting task image: {e}")
-            
-            # Delete task document
-            task.reference.delete()
+        # Delete the user's tasks, images and counters in batches (resumes an interrupted run)
+        progress = delete_user_data(user_id)
         
         # Delete user document
         user_ref.delete()
+        forget_user_email(user_id)
         
         # Delete user from Firebase Auth
-        auth.delete_user(user_id)
+        auth.delete_user(user_id, app=get_firebase_app())
         
-        return jsonify({'message': 'User deleted successfully'}), 200
+        return jsonify({
+            'message': 'User deleted successfully',
+            'tasksDeleted': progress['tasksDeleted'],
+            'imagesDeleted': progress['imagesDeleted']
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/users/<user_id>/deletion', methods=['GET'])
+def get_user_deletion(user_id):
+    """Get the progress of a user's cascade deletion - admin only"""
+    auth_success, admin_id, error_response = check_admin()
+    if not auth_success:
+        return jsonify(error_response), error_response['code']
+    
+    try:
+        progress = get_deletion_progress(user_id)
+        if progress is None:
+            return jsonify({'error': 'No deletion found for this user'}), 404
+        return jsonify(progress), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/admin/jobs', methods=['GET'])
+def get_job_stats():
+    """Get the background job queue depth and recent failures - admin only"""
+    auth_success, admin_id, error_response = check_admin()
+    if not auth_success:
+        return jsonify(error_response), error_response['code']
+    
+    try:
+        return jsonify(job_queue.stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/admin/jobs/retry', methods=['POST'])
+def retry_failed_jobs():
+    """Queue every failed background job again - admin only"""
+    auth_success, admin_id, error_response = check_admin()
+    if not auth_success:
+        return jsonify(error_response), error_response['code']
+    
+    try:
+        return jsonify({'retried': job_queue.retry_failed()}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
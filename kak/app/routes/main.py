@@ -1,14 +1,12 @@
 # Import necessary components from Flask
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-# Import requests library for making HTTP requests
-import requests
-# Import Firestore database from Firebase
-from firebase_admin import firestore
+# Import the buffered quote service
+from app.services.quotes import quote_service
+# Import the database client of the configured backend
+from app.backends import db
 
 # Create a Blueprint named 'main' for organizing routes
 main_bp = Blueprint('main', __name__)
-# Create a Firestore database client
-db = firestore.client()
 
 # Define route for the homepage
 @main_bp.route('/')
@@ -72,46 +70,9 @@ def admin():
 @main_bp.route('/quote')
 # Define the function that handles the quote request
 def get_quote():
-    """Get a random quote from API Ninjas"""
-    try:
-        # Set the API URL for quotes
-        api_url = 'https://api.api-ninjas.com/v1/quotes'
-        # Set headers with API key for authentication
-        headers = {
-            'X-Api-Key': 'whXhcw6atow6MmzGEuJTgQ==34nA35P7ioKTsheO'
-        }
-        
-        # Make GET request to the API
-        response = requests.get(api_url, headers=headers)
-        
-        # Check if the API response was successful
-        if not response.ok:
-            # Return error if API request failed
-            return jsonify({'error': f'API error: {response.status_code}'}), 500
-            
-        # Convert API response to JSON
-        data = response.json()
-        
-        # Validate the API response format
-        if not data or not isinstance(data, list) or len(data) == 0:
-            # Return error if response format is invalid
-            return jsonify({'error': 'Invalid API response format'}), 500
-            
-        # Get the first quote from the response array
-        quote_data = data[0]
-        
-        # Prepare and return quote data as JSON
-        return jsonify({
-            'content': quote_data.get('quote', 'No content available'),
-            'author': quote_data.get('author', 'Unknown'),
-            'category': quote_data.get('category', 'General')
-        })
-    # Handle network/connection errors
-    except requests.RequestException as e:
-        return jsonify({'error': f'Request error: {str(e)}'}), 500
-    # Handle JSON parsing errors
-    except ValueError as e:  # JSON parsing error
-        return jsonify({'error': f'JSON parsing error: {str(e)}'}), 500
-    # Handle any other unexpected errors
-    except Exception as e:
-        return jsonify({'error': f'Unexpected error: {str(e)}'}), 500 
\ No newline at end of file
+    """Get a random quote (served from memory, refilled from API Ninjas in the background)"""
+    # Never waits on the quote API: buffered quotes, or the offline set while the buffer is empty
+    response = jsonify(quote_service.get_quote())
+    # Every request should get a different quote
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -1,24 +1,48 @@
 # Import necessary Flask components
 from flask import Blueprint, request, jsonify, session
-# Import Firebase Firestore database and storage
-from firebase_admin import firestore, storage
-# Import UUID for generating unique identifiers
-import uuid
+# Import Firestore for query direction constants
+from firebase_admin import firestore
+# Import the database client and storage bucket of the configured backend
+from app.backends import db, bucket
+# Import the streaming JSON response helper
+from app.utils.streaming import stream_json_array
+# Import the targeted user-email lookup
+from app.services.user_emails import resolve_user_emails
+# Import the sharded task counters
+from app.services.counters import category_task_counter, user_task_counter
+# Import the background job queue for side effects that can run after the response
+from app.services.jobs import enqueue, enqueue_counter_change
+# Import the per-user task version stamps used for ETags
+from app.services.task_versions import task_versions
+# Import the conditional GET helpers
+from app.utils.conditional import not_modified, weak_etag, with_etag
+# Import the content-addressed image storage helpers
+from app.services.images import release_image, store_image
+# Import the lookup of a task image's storage folder
+from app.utils.storage import task_image_folder
 # Import datetime for handling dates and times
 from datetime import datetime
-# Import tempfile for creating temporary files
-import tempfile
-# Import os for file operations
-import os
-# Import secure_filename to sanitize file names
-from werkzeug.utils import secure_filename
+# Import the error raised when an upload exceeds the size cap
+from werkzeug.exceptions import RequestEntityTooLarge
+# Import base64 and json for encoding page cursors
+import base64
+import json
 
 # Create a Blueprint named 'tasks' with URL prefix '/tasks'
 tasks_bp = Blueprint('tasks', __name__, url_prefix='/tasks')
-# Create a Firestore database client
-db = firestore.client()
-# Get reference to Firebase storage bucket
-bucket = storage.bucket()
+
+# Number of tasks per page when a client asks for pagination without a limit
+DEFAULT_PAGE_SIZE = 50
+# Largest page a client may request
+MAX_PAGE_SIZE = 500
+# Number of streamed tasks whose owner emails are resolved together
+EMAIL_CHUNK_SIZE = 200
+# Largest number of operations accepted by one bulk request
+MAX_BULK_OPERATIONS = 5000
+# Firestore accepts at most 500 writes per batch
+BATCH_WRITE_LIMIT = 500
+# Fields a bulk update may change
+BULK_UPDATE_FIELDS = ('title', 'description', 'status', 'category', 'urgency', 'dueDate')
 
 # Define function to check if user is authenticated
 def check_auth():
@@ -31,11 +55,101 @@ def check_auth():
     # If user ID is found, return success with user ID
     return True, user_id, None
 
+def encode_cursor(task_data, task_id):
+    """
+    Encode the position of the last task on a page as an opaque next-page token. The token
+    holds the sort values themselves, so the next page does not depend on that task still existing.
+    
+    :param task_data: Task dictionary (for its createdAt)
+    :param task_id: Task ID, the tie-breaker between tasks created at the same time
+    :return: Token string
+    """
+    created_at = task_data.get('createdAt')
+    # Server timestamps come back as datetimes, older tasks hold ISO strings
+    if isinstance(created_at, datetime):
+        created_at = {'timestamp': created_at.isoformat()}
+    payload = json.dumps({'createdAt': created_at, 'id': task_id}).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a next-page token into (createdAt, task ID) (None if the token is malformed)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at, task_id = cursor['createdAt'], cursor['id']
+        if isinstance(created_at, dict):
+            created_at = datetime.fromisoformat(created_at['timestamp'])
+        if not isinstance(task_id, str) or not task_id:
+            return None
+        return created_at, task_id
+    except (ValueError, KeyError, TypeError):
+        return None
+
+def wants_pagination():
+    """Check whether the client asked for a paginated response"""
+    return 'limit' in request.args or 'cursor' in request.args
+
+def get_task_page(query):
+    """
+    Fetch one page of tasks ordered by creation time (newest first)
+    
+    :param query: Base tasks query
+    :return: (tasks, next_cursor, error_response) tuple
+    """
+    # Parse and clamp the requested page size
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return None, None, (jsonify({'error': 'limit must be an integer'}), 400)
+    if limit < 1:
+        return None, None, (jsonify({'error': 'limit must be positive'}), 400)
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    # Stable ordering: createdAt, then the document ID between tasks created at the same time
+    query = query.order_by('createdAt', direction=firestore.Query.DESCENDING).order_by(
+        '__name__', direction=firestore.Query.DESCENDING)
+    
+    # Resume after the position of the last task of the previous page
+    token = request.args.get('cursor')
+    if token:
+        cursor = decode_cursor(token)
+        if not cursor:
+            return None, None, (jsonify({'error': 'Invalid cursor'}), 400)
+        created_at, task_id = cursor
+        query = query.start_after({'createdAt': created_at, '__name__': task_id})
+    
+    # Fetch one extra document to know whether another page exists
+    docs = list(query.limit(limit + 1).stream())
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    
+    tasks = []
+    for doc in docs:
+        task_data = doc.to_dict()
+        task_data['id'] = doc.id
+        tasks.append(task_data)
+    
+    next_cursor = encode_cursor(tasks[-1], docs[-1].id) if has_more else None
+    return tasks, next_cursor, None
+
+def delete_task_image(task_data):
+    """
+    Queue the release of a task's image (runs after the response); the image and its
+    renditions are deleted from storage once no other task or user references them
+    
+    :param task_data: Task dictionary holding imageUrl and imageRenditions
+    :return: List of job IDs
+    """
+    if not task_data.get('imageUrl'):
+        return []
+    image_url = task_data['imageUrl']
+    return release_image(image_url, task_data.get('imageRenditions'), task_image_folder(image_url))
+
 # Define route for getting all tasks
 @tasks_bp.route('/', methods=['GET'])
 # Define function to handle GET requests for tasks
 def get_tasks():
-    """Get all tasks for the current user"""
+    """Get all tasks for the current user (paginated when ?limit= or ?cursor= is given)"""
     # Check if user is authenticated
     auth_success, result, code = check_auth()
     # If not authenticated, return error
@@ -46,6 +160,21 @@ def get_tasks():
     user_id = result
     
     try:
+        # The ETag follows the user's task version stamp, so an unchanged list is answered
+        # with 304 after one document read instead of reading every task
+        etag = weak_etag('tasks', user_id, task_versions.get(user_id), request.query_string.decode())
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        
+        # Return a single page with a next-page token if requested
+        if wants_pagination():
+            query = db.collection('tasks').where('userId', '==', user_id)
+            tasks, next_cursor, error = get_task_page(query)
+            if error:
+                return error
+            return with_etag(jsonify({'tasks': tasks, 'nextCursor': next_cursor}), etag)
+        
         # Get tasks from Firestore that belong to the current user
         tasks_ref = db.collection('tasks').where('userId', '==', user_id).stream()
         # Create empty list to store tasks
@@ -61,7 +190,7 @@ def get_tasks():
             tasks.append(task_data)
             
         # Return all tasks as JSON
-        return jsonify(tasks)
+        return with_etag(jsonify(tasks), etag)
     # Catch any exceptions
     except Exception as e:
         # Return error message
@@ -131,114 +260,53 @@ def create_task():
             
             # Check if file has a name (not empty)
             if image_file.filename != '':
-                # Create secure filename with user ID and UUID
-                filename = f"{user_id}_{uuid.uuid4()}_{secure_filename(image_file.filename)}"
-                # Log the created filename
-                print("Secure filename created:", filename)
-                
-                # Variable to store temporary file path
-                temp_path = None
                 try:
-                    # Save image to temporary file
-                    with tempfile.NamedTemporaryFile(delete=False) as temp:
-                        # Get the temporary file path
-                        temp_path = temp.name
-                        # Save the uploaded file to temporary path
-                        image_file.save(temp_path)
-                        # Log temp file save
-                        print("Saved to temp file:", temp_path)
-                    
-                    # Create reference to file location in Firebase Storage
-                    blob = bucket.blob(f"image_photo/{filename}")
-                    # Upload image from temporary file to Firebase
-                    blob.upload_from_filename(temp_path)
-                    # Make the image publicly accessible
-                    blob.make_public()
-                    
-                    # Get the public URL of the uploaded image
-                    public_url = blob.public_url
+                    # Store the upload under its content hash (identical files are uploaded once)
+                    public_url, renditions = store_image(image_file, bucket, 'image_photo')
                     # Log successful upload
                     print("Uploaded to Firebase, public URL:", public_url)
                     
-                    # Add image URL to task data
+                    # Add image URLs to task data (list views use the thumbnail)
                     task_data['imageUrl'] = public_url
+                    task_data['imageRenditions'] = renditions
                 # Catch any errors during upload
                 except Exception as e:
                     # Log the error
                     print(f"Error during image upload: {e}")
                     # Continue without image if there's an error
-                # Always clean up temporary file
-                finally:
-                    # Check if temporary file exists
-                    if temp_path and os.path.exists(temp_path):
-                        try:
-                            # Delete the temporary file
-                            os.unlink(temp_path)
-                            # Log successful deletion
-                            print("Temporary file deleted")
-                        # Catch errors during file deletion
-                        except Exception as e:
-                            # Log deletion error
-                            print(f"Failed to delete temporary file: {e}")
-                            # Continue even if we can't delete the temp file
-        
-        # Create a new document in the tasks collection
+        
+        # Create a new document reference (the ID is generated client-side)
         task_ref = db.collection('tasks').document()
-        # Save task data to Firestore
-        task_ref.set(task_data)
         # Get the ID of the created task
         task_id = task_ref.id
-        
-        # Get reference to user document
-        user_ref = db.collection('users').document(user_id)
-        # Get user document
-        user_doc = user_ref.get()
-        
-        # Check if user document exists
-        if user_doc.exists:
-            # Get current task count or default to 0
-            current_task_count = user_doc.to_dict().get('taskCount', 0)
-            # Update user document with new task count
-            user_ref.update({
-                'taskCount': current_task_count + 1,
-                'lastTaskCreated': datetime.now().isoformat()
-            })
-        
-        # Get reference to category document
-        category_ref = db.collection('categories').document(category)
-        # Get category document
-        category_doc = category_ref.get()
-        
-        # Check if category already exists
-        if category_doc.exists:
-            # Get category data
-            category_data = category_doc.to_dict()
-            # Get list of tasks or empty list if none
-            tasks_list = category_data.get('tasks', [])
-            # Add new task ID to list
-            tasks_list.append(task_id)
-            
-            # Update category document with new task
-            category_ref.update({
-                'tasks': tasks_list,
-                'taskCount': len(tasks_list),
-                'lastUpdated': datetime.now().isoformat()
-            })
-        else:
-            # Create new category document if it doesn't exist
-            category_ref.set({
-                'name': category,
-                'tasks': [task_id],
-                'taskCount': 1,
-                'createdAt': datetime.now().isoformat(),
-                'lastUpdated': datetime.now().isoformat()
-            })
+        # Timestamp shared by all denormalized updates
+        now = datetime.now().isoformat()
+        
+        # Write the task and all counter changes atomically in a single round trip.
+        # Increment/ArrayUnion are applied server-side, so concurrent creates never lose counts.
+        batch = db.batch()
+        # Save task data
+        batch.set(task_ref, task_data)
+        # Record the owner's activity and bump their sharded task count
+        batch.set(db.collection('users').document(user_id), {
+            'lastTaskCreated': now
+        }, merge=True)
+        user_task_counter.add_to_batch(batch, user_id, 1)
+        # Category membership is the indexed 'category' field of the task itself;
+        # only the sharded count changes, the shared category document is not touched
+        category_task_counter.add_to_batch(batch, category, 1)
+        # A new version stamp of the user's task list invalidates their ETags
+        task_versions.add_to_batch(batch, user_id)
+        batch.commit()
             
         # Add task ID to the response data
         task_data['id'] = task_id
         
         # Return created task data and 201 status code
         return jsonify(task_data), 201
+    # Reject uploads over the size cap
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     # Catch any exceptions
     except Exception as e:
         # Return error message
@@ -275,10 +343,16 @@ def get_task(task_id):
             # Return error if unauthorized
             return jsonify({'error': 'Unauthorized access'}), 403
             
+        # The ETag follows the document's last write; skip the body if the client has it
+        etag = weak_etag('task', task_id, task_ref.update_time or task_data.get('updatedAt'))
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        
         # Add task ID to data
         task_data['id'] = task_ref.id
         # Return task data as JSON
-        return jsonify(task_data)
+        return with_etag(jsonify(task_data), etag)
     # Catch any exceptions
     except Exception as e:
         # Return error message
@@ -338,115 +412,43 @@ def update_task(task_id):
         if 'image' in request.files:
             image_file = request.files['image']
             if image_file.filename != '':
-                # Delete old image if exists
-                if task_data.get('imageUrl'):
-                    try:
-                        # Extract the file name from the URL path
-                        image_url = task_data['imageUrl']
-                        # URL format: https://storage.googleapis.com/roeeki-a4ca2.firebasestorage.app/image_photo/filename
-                        file_path = image_url.split('/o/')[1].split('?')[0] if '/o/' in image_url else image_url.split('/image_photo/')[1]
-                        file_path = file_path.replace('%2F', '/') # Fix URL encoding if present
-                        
-                        print(f"Attempting to delete image: {file_path}")
-                        blob = bucket.blob(f"image_photo/{file_path}")
-                        blob.delete()
-                        print(f"Deleted image from storage: {file_path}")
-                    except Exception as e:
-                        print(f"Error deleting image from storage: {e}")
-                        # Continue with task deletion even if image deletion fails
-                
-                # Create a secure filename
-                filename = f"{user_id}_{uuid.uuid4()}_{secure_filename(image_file.filename)}"
-                
-                # Create a temporary file for the upload
-                temp_path = None
                 try:
-                    # Save to a temporary file using a context manager to ensure it's closed
-                    with tempfile.NamedTemporaryFile(delete=False) as temp:
-                        temp_path = temp.name
-                        image_file.save(temp_path)
-                        print("Saved to temp file:", temp_path)
-                    
-                    # Upload to Firebase Storage - after the file is properly closed
-                    blob = bucket.blob(f"image_photo/{filename}")
-                    blob.upload_from_filename(temp_path)
-                    blob.make_public()
-                    
-                    # Get and print the public URL
-                    public_url = blob.public_url
+                    # Store the upload under its content hash (identical files are uploaded once)
+                    public_url, renditions = store_image(image_file, bucket, 'image_photo')
                     print("Uploaded to Firebase, public URL:", public_url)
                     
-                    # Update task data with image URL
+                    # Update task data with image URLs
                     update_data['imageUrl'] = public_url
+                    update_data['imageRenditions'] = renditions
                 except Exception as e:
                     print(f"Error during image upload: {e}")
                     # Continue without image if there's an error
-                finally:
-                    # Clean up temporary file
-                    if temp_path and os.path.exists(temp_path):
-                        try:
-                            os.unlink(temp_path)
-                            print("Temporary file deleted")
-                        except Exception as e:
-                            print(f"Failed to delete temporary file: {e}")
-                            # Continue even if we can't delete the temp file
-        
-        # Update task in Firestore
-        task_ref.update(update_data)
+        
+        # Update task in Firestore together with the owner's task version stamp
+        # (the only write the response waits for)
+        batch = db.batch()
+        batch.update(task_ref, update_data)
+        task_versions.add_to_batch(batch, task_data['userId'])
+        batch.commit()
+        
+        # Release the replaced image in the background once the new one is stored
+        if 'imageUrl' in update_data and task_data.get('imageUrl'):
+            delete_task_image(task_data)
         
         # Handle category change if needed
         if new_category != old_category:
-            # Remove task from old category
-            old_category_ref = db.collection('categories').document(old_category)
-            old_category_doc = old_category_ref.get()
-            
-            if old_category_doc.exists:
-                old_category_data = old_category_doc.to_dict()
-                old_tasks_list = old_category_data.get('tasks', [])
-                
-                if task_id in old_tasks_list:
-                    old_tasks_list.remove(task_id)
-                    
-                    # Update old category
-                    old_category_ref.update({
-                        'tasks': old_tasks_list,
-                        'taskCount': len(old_tasks_list),
-                        'lastUpdated': datetime.now().isoformat()
-                    })
-            
-            # Add task to new category
-            new_category_ref = db.collection('categories').document(new_category)
-            new_category_doc = new_category_ref.get()
-            
-            if new_category_doc.exists:
-                # Category exists, add task to tasks array
-                new_category_data = new_category_doc.to_dict()
-                new_tasks_list = new_category_data.get('tasks', [])
-                
-                if task_id not in new_tasks_list:
-                    new_tasks_list.append(task_id)
-                    
-                    # Update category with new task
-                    new_category_ref.update({
-                        'tasks': new_tasks_list,
-                        'taskCount': len(new_tasks_list),
-                        'lastUpdated': datetime.now().isoformat()
-                    })
-            else:
-                # Create new category document
-                new_category_ref.set({
-                    'name': new_category,
-                    'tasks': [task_id],
-                    'taskCount': 1,
-                    'createdAt': datetime.now().isoformat(),
-                    'lastUpdated': datetime.now().isoformat()
-                })
+            # The task's 'category' field was updated above; move its count between the categories
+            # in the background
+            enqueue_counter_change(category_task_counter, old_category, -1)
+            enqueue_counter_change(category_task_counter, new_category, 1)
         
-        # Get updated task
-        updated_task = task_ref.get().to_dict()
+        # Build the updated task from what was read and written instead of reading it again
+        updated_task = dict(task_data, **update_data)
         updated_task['id'] = task_id
         
         return jsonify(updated_task)
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -474,63 +476,230 @@ def delete_task(task_id):
         if task_data['userId'] != user_id and not session.get('is_admin'):
             return jsonify({'error': 'Unauthorized access'}), 403
         
-        # Delete the image if exists
+        # Delete the task together with the owner's task version stamp
+        # (the only write the response waits for)
+        batch = db.batch()
+        batch.delete(task_ref)
+        task_versions.add_to_batch(batch, task_data['userId'])
+        batch.commit()
+        
+        # Delete the image if exists, in the background
         if task_data.get('imageUrl'):
-            try:
-                # Extract the file name from the URL path
-                image_url = task_data['imageUrl']
-                # URL format: https://storage.googleapis.com/roeeki-a4ca2.firebasestorage.app/image_photo/filename
-                file_path = image_url.split('/o/')[1].split('?')[0] if '/o/' in image_url else image_url.split('/image_photo/')[1]
-                file_path = file_path.replace('%2F', '/') # Fix URL encoding if present
-                
-                print(f"Attempting to delete image: {file_path}")
-                blob = bucket.blob(f"image_photo/{file_path}")
-                blob.delete()
-                print(f"Deleted image from storage: {file_path}")
-            except Exception as e:
-                print(f"Error deleting image from storage: {e}")
-                # Continue with task deletion even if image deletion fails
-        
-        # Delete the task
-        task_ref.delete()
-        
-        # Update user's task count in the users collection
+            delete_task_image(task_data)
+        
+        # Update the owner's activity and the owner's and the category's task counts in the background
         task_owner_id = task_data['userId']
-        user_ref = db.collection('users').document(task_owner_id)
-        user_doc = user_ref.get()
-        
-        if user_doc.exists:
-            # Get current task count or default to 0
-            current_task_count = user_doc.to_dict().get('taskCount', 0)
-            # Update with decremented count (ensure it doesn't go below 0)
-            user_ref.update({
-                'taskCount': max(0, current_task_count - 1),
-                'lastTaskDeleted': datetime.now().isoformat()
-            })
+        enqueue('merge_document', collection='users', doc_id=task_owner_id,
+                data={'lastTaskDeleted': datetime.now().isoformat()})
+        enqueue_counter_change(user_task_counter, task_owner_id, -1)
         
-        # Remove task from category
-        category_ref = db.collection('categories').document(task_category)
-        category_doc = category_ref.get()
+        # Decrement the category count; empty categories are hidden by get_categories
+        enqueue_counter_change(category_task_counter, task_category, -1)
         
-        if category_doc.exists:
-            category_data = category_doc.to_dict()
-            tasks_list = category_data.get('tasks', [])
+        return jsonify({'message': 'Task deleted successfully'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def commit_in_chunks(writes):
+    """
+    Commit (method, reference, data) writes in batches of at most BATCH_WRITE_LIMIT
+    
+    :param writes: List of writes, where method is 'set', 'update' or 'delete'
+    :return: List with one error (or None) per chunk, in order
+    """
+    errors = []
+    for start in range(0, len(writes), BATCH_WRITE_LIMIT):
+        batch = db.batch()
+        for method, ref, data in writes[start:start + BATCH_WRITE_LIMIT]:
+            if method == 'delete':
+                batch.delete(ref)
+            else:
+                getattr(batch, method)(ref, data)
+        try:
+            batch.commit()
+            errors.append(None)
+        except Exception as e:
+            print(f"Error committing bulk batch: {e}")
+            errors.append(e)
+    return errors
+
+@tasks_bp.route('/bulk', methods=['POST'])
+def bulk_tasks():
+    """
+    Apply many create/update/delete operations in one request
+    
+    Body: {"operations": [{"op": "create", "data": {...}},
+                          {"op": "update", "id": "...", "data": {...}},
+                          {"op": "delete", "id": "..."}]}
+    The response lists one result per operation, in request order.
+    """
+    auth_success, result, code = check_auth()
+    if not auth_success:
+        return jsonify(result), code
+    
+    user_id = result
+    is_admin = session.get('is_admin')
+    
+    body = request.get_json(silent=True)
+    operations = body.get('operations') if isinstance(body, dict) else body
+    if not isinstance(operations, list):
+        return jsonify({'error': 'operations must be a list'}), 400
+    if len(operations) > MAX_BULK_OPERATIONS:
+        return jsonify({'error': f'At most {MAX_BULK_OPERATIONS} operations per request'}), 400
+    
+    try:
+        # Fetch every task targeted by an update or delete in one batched read
+        target_ids = {op.get('id') for op in operations
+                      if isinstance(op, dict) and op.get('op') in ('update', 'delete') and isinstance(op.get('id'), str)}
+        target_ids.discard('')
+        existing = {}
+        if target_ids:
+            refs = [db.collection('tasks').document(task_id) for task_id in target_ids]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    existing[doc.id] = doc.to_dict()
+        
+        now = datetime.now().isoformat()
+        results = []
+        # Planned writes: (result index, (method, ref, data), user deltas, category deltas, deleted task data)
+        planned = []
+        seen_ids = set()
+        
+        for index, operation in enumerate(operations):
+            op = operation.get('op') if isinstance(operation, dict) else None
+            task_id = operation.get('id') if isinstance(operation, dict) else None
+            results.append({'index': index, 'op': op, 'id': task_id})
+            
+            if op not in ('create', 'update', 'delete'):
+                results[index].update(status=400, error='op must be create, update or delete')
+                continue
             
-            if task_id in tasks_list:
-                tasks_list.remove(task_id)
+            data = operation.get('data') or {}
+            if not isinstance(data, dict):
+                results[index].update(status=400, error='data must be an object')
+                continue
+            
+            if op == 'create':
+                if not data.get('title'):
+                    results[index].update(status=400, error='Title is required')
+                    continue
                 
-                # Update category with removed task
-                if tasks_list:
-                    category_ref.update({
-                        'tasks': tasks_list,
-                        'taskCount': len(tasks_list),
-                        'lastUpdated': datetime.now().isoformat()
-                    })
-                else:
-                    # If no tasks left, delete the category
-                    category_ref.delete()
-        
-        return jsonify({'message': 'Task deleted successfully'})
+                category = data.get('category') or 'other'
+                task_data = {
+                    'title': data['title'],
+                    'description': data.get('description', ''),
+                    'userId': user_id,
+                    'status': 'pending',
+                    'category': category,
+                    'urgency': data.get('urgency', 'medium'),
+                    'dueDate': data.get('dueDate'),
+                    'createdAt': now,
+                    'imageUrl': None
+                }
+                task_ref = db.collection('tasks').document()
+                results[index].update(id=task_ref.id, task=dict(task_data, id=task_ref.id))
+                planned.append((index, ('set', task_ref, task_data),
+                                {user_id: 1}, {category: 1}, None))
+                continue
+            
+            # Update and delete target an existing task the user may change
+            if not task_id or not isinstance(task_id, str):
+                results[index].update(status=400, error='id is required')
+                continue
+            if task_id in seen_ids:
+                results[index].update(status=409, error='Task is already changed by another operation in this request')
+                continue
+            task_data = existing.get(task_id)
+            if task_data is None:
+                results[index].update(status=404, error='Task not found')
+                continue
+            if task_data['userId'] != user_id and not is_admin:
+                results[index].update(status=403, error='Unauthorized access')
+                continue
+            seen_ids.add(task_id)
+            
+            task_ref = db.collection('tasks').document(task_id)
+            owner_id = task_data['userId']
+            old_category = task_data.get('category', 'other')
+            
+            if op == 'update':
+                update_data = {field: data[field] for field in BULK_UPDATE_FIELDS if field in data}
+                if not update_data:
+                    results[index].update(status=400, error='No updatable fields given')
+                    continue
+                new_category = update_data.get('category', old_category) or 'other'
+                if 'category' in update_data:
+                    update_data['category'] = new_category
+                category_deltas = {}
+                if new_category != old_category:
+                    category_deltas = {old_category: -1, new_category: 1}
+                results[index]['task'] = dict(task_data, **update_data, id=task_id)
+                planned.append((index, ('update', task_ref, update_data), {}, category_deltas, None))
+            else:
+                planned.append((index, ('delete', task_ref, None),
+                                {owner_id: -1}, {old_category: -1}, task_data))
+        
+        # Write the task documents in chunks of at most BATCH_WRITE_LIMIT writes
+        errors = commit_in_chunks([write for _, write, _, _, _ in planned])
+        
+        # Aggregate the counter changes of the committed operations
+        user_deltas_total = {}
+        category_deltas_total = {}
+        created_by = set()
+        deleted_from = set()
+        changed_owners = set()
+        deleted_images = []
+        for position, (index, write, user_deltas, category_deltas, deleted_task) in enumerate(planned):
+            error = errors[position // BATCH_WRITE_LIMIT]
+            if error is not None:
+                # The whole chunk was rejected, so none of its counter changes apply
+                results[index].pop('task', None)
+                results[index].update(status=500, error=str(error))
+                continue
+            results[index]['status'] = 201 if results[index]['op'] == 'create' else 200
+            changed_owners.add(existing.get(write[1].id, {}).get('userId', user_id))
+            for key, amount in user_deltas.items():
+                user_deltas_total[key] = user_deltas_total.get(key, 0) + amount
+                (created_by if amount > 0 else deleted_from).add(key)
+            for key, amount in category_deltas.items():
+                category_deltas_total[key] = category_deltas_total.get(key, 0) + amount
+            if deleted_task and deleted_task.get('imageUrl'):
+                deleted_images.append(deleted_task)
+        
+        # Apply one counter write per user and category, plus the owners' activity and version stamps
+        counter_writes = []
+        for owner_id in created_by | deleted_from:
+            activity = {}
+            if owner_id in created_by:
+                activity['lastTaskCreated'] = now
+            if owner_id in deleted_from:
+                activity['lastTaskDeleted'] = now
+            counter_writes.append(lambda batch, owner_id=owner_id, activity=activity: batch.set(
+                db.collection('users').document(owner_id), activity, merge=True))
+        for owner_id in changed_owners:
+            counter_writes.append(lambda batch, owner_id=owner_id: task_versions.add_to_batch(batch, owner_id))
+        for counter, deltas in ((user_task_counter, user_deltas_total),
+                                (category_task_counter, category_deltas_total)):
+            for doc_id, amount in deltas.items():
+                if amount:
+                    counter_writes.append(lambda batch, counter=counter, doc_id=doc_id, amount=amount:
+                                          counter.add_to_batch(batch, doc_id, amount))
+        for start in range(0, len(counter_writes), BATCH_WRITE_LIMIT):
+            counter_batch = db.batch()
+            for add_write in counter_writes[start:start + BATCH_WRITE_LIMIT]:
+                add_write(counter_batch)
+            counter_batch.commit()
+        
+        # Queue the removal of the images of deleted tasks
+        for deleted_task in deleted_images:
+            delete_task_image(deleted_task)
+        
+        succeeded = sum(1 for item in results if item['status'] < 300)
+        return jsonify({
+            'results': results,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -542,19 +711,40 @@ def get_categories():
         return jsonify(result), code
     
     try:
+        # Get sharded task counts of every category (cached for a few seconds)
+        shard_totals = category_task_counter.get_all_totals()
+        
         # Get all categories from Firestore
         categories_ref = db.collection('categories').stream()
         categories = []
+        seen = set()
         
         for category in categories_ref:
             category_data = category.to_dict()
+            seen.add(category.id)
+            shard_count, shard_updated = shard_totals.get(category.id, (0, None))
+            last_updated = max(filter(None, [category_data.get('lastUpdated'), shard_updated]), default=None)
             categories.append({
                 'id': category.id,
                 'name': category_data.get('name', category.id),
-                'taskCount': category_data.get('taskCount', 0),
-                'lastUpdated': category_data.get('lastUpdated')
+                # Legacy count stored on the document plus the sharded changes
+                'taskCount': category_data.get('taskCount', 0) + shard_count,
+                'lastUpdated': last_updated
             })
         
+        # Categories that only exist as counter shards
+        for category_id, (shard_count, shard_updated) in shard_totals.items():
+            if category_id not in seen:
+                categories.append({
+                    'id': category_id,
+                    'name': category_id,
+                    'taskCount': shard_count,
+                    'lastUpdated': shard_updated
+                })
+        
+        # Hide categories without tasks
+        categories = [category for category in categories if category['taskCount'] > 0]
+        
         # Sort categories by task count (descending)
         categories.sort(key=lambda x: x['taskCount'], reverse=True)
         
@@ -562,6 +752,18 @@ def get_categories():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def add_user_emails(tasks):
+    """
+    Add the owner's email to each task, fetching only the owners referenced by these tasks
+    
+    :param tasks: List of task dictionaries
+    :return: The same list
+    """
+    emails = resolve_user_emails(task_data.get('userId') for task_data in tasks)
+    for task_data in tasks:
+        task_data['userEmail'] = emails.get(task_data.get('userId'), 'Unknown')
+    return tasks
+
 @tasks_bp.route('/admin/all', methods=['GET'])
 def get_all_tasks():
     """Get all tasks (admin only)"""
@@ -576,32 +778,29 @@ def get_all_tasks():
         return jsonify({'error': 'Admin privileges required'}), 403
     
     try:
-        # Get all tasks
-        tasks_ref = db.collection('tasks')
-        tasks_docs = tasks_ref.stream()
-        
-        # Get all users to map user IDs to emails
-        users_ref = db.collection('users')
-        users_docs = users_ref.stream()
-        
-        # Create a dictionary to map user IDs to emails
-        user_emails = {}
-        for doc in users_docs:
-            user_data = doc.to_dict()
-            user_emails[doc.id] = user_data.get('email', 'Unknown')
+        # Paginated: return one page with the next-page token
+        if wants_pagination():
+            tasks, next_cursor, error = get_task_page(db.collection('tasks'))
+            if error:
+                return error
+            add_user_emails(tasks)
+            return jsonify({'tasks': tasks, 'nextCursor': next_cursor}), 200
+        
+        # Otherwise stream every task straight from the Firestore stream,
+        # resolving owner emails one chunk of tasks at a time
+        def generate_tasks():
+            chunk = []
+            for doc in db.collection('tasks').stream():
+                task_data = doc.to_dict()
+                task_data['id'] = doc.id
+                chunk.append(task_data)
+                
+                if len(chunk) >= EMAIL_CHUNK_SIZE:
+                    yield from add_user_emails(chunk)
+                    chunk = []
+            yield from add_user_emails(chunk)
         
-        # Process tasks
-        tasks = []
-        for doc in tasks_docs:
-            task_data = doc.to_dict()
-            task_data['id'] = doc.id
-            
-            # Add user email to task data
-            task_data['userEmail'] = user_emails.get(task_data.get('userId'), 'Unknown')
-            
-            tasks.append(task_data)
-            
-        return jsonify(tasks), 200
+        return stream_json_array(generate_tasks())
     except Exception as e:
         print(f"Error getting all tasks: {e}")
         return jsonify({'error': str(e)}), 500 
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""
+Application services shared by models and routes.
+"""
@@ -0,0 +1,92 @@
+"""
+Admin-role resolution with a per-process TTL cache.
+
+Answers "is this uid an active admin" with at most one indexed query on the
+admins collection, instead of the Admin.get_by_user_id -> get_by_admin_id ->
+User.get_by_id chain. Admin.save/update_admin/deactivate invalidate entries
+explicitly; the TTL bounds staleness for changes made by other workers.
+"""
+
+import os
+import threading
+import time
+
+from ..backends import get_db
+
+# Seconds an admin-role answer stays cached
+DEFAULT_TTL = float(os.environ.get('ADMIN_ROLE_CACHE_TTL', 60))
+
+
+class AdminRoleCache:
+    """
+    TTL cache of admin status keyed by user ID
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        Initialize a new AdminRoleCache instance
+
+        :param ttl: Seconds an entry stays valid
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_admin(self, user_id):
+        """
+        Check whether a user has an active admin record
+
+        :param user_id: User ID
+        :return: True if the user is an active admin
+        """
+        if not user_id:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry and entry[1] > now:
+            return entry[0]
+
+        db = get_db()
+        query = db.collection('admins').where('userId', '==', user_id).where('active', '==', True).limit(1)
+        is_admin = len(query.get()) > 0
+
+        with self._lock:
+            self._entries[user_id] = (is_admin, now + self.ttl)
+        return is_admin
+
+    def invalidate(self, user_id=None):
+        """
+        Drop cached answers
+
+        :param user_id: User ID to drop; clears the whole cache if omitted
+        """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+# Shared cache used by the models and routes
+admin_roles = AdminRoleCache()
+
+
+def is_active_admin(user_id):
+    """
+    Check whether a user is an active admin, using the shared cache
+
+    :param user_id: User ID
+    :return: True if the user is an active admin
+    """
+    return admin_roles.is_admin(user_id)
+
+
+def invalidate_admin_role(user_id=None):
+    """
+    Forget the cached admin status of a user (or of everyone)
+
+    :param user_id: User ID, or None to clear the whole cache
+    """
+    admin_roles.invalidate(user_id)
@@ -0,0 +1,279 @@
+"""
+Cascade deletion of a user's data.
+
+A user's tasks are deleted one page at a time: older per-upload images of the
+page are deleted concurrently through a bounded thread pool, then the task
+documents, the matching category counter changes and the release of their
+content-addressed images (which may be shared with other tasks) are committed
+in write batches of at most 500 operations; the job queue collects the
+released images once unreferenced. Progress is recorded on a 'deletion_jobs'
+document, and because every page is re-read from the tasks query, running the
+deletion again after an interruption simply continues with the tasks that are
+left: a reference is only released in the batch deleting the task holding it,
+so it is never released twice. That batch also writes the progress document,
+so the recorded counts cover exactly the pages that were committed.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from google.api_core.exceptions import NotFound
+
+from ..backends import get_bucket, get_db
+from ..utils.storage import image_blob_name, task_image_folder
+from .counters import category_task_counter, user_task_counter
+from .images import add_release_to_batch, image_urls, is_content_addressed, schedule_collection
+from .task_versions import task_versions
+
+# Collection holding one progress document per user being deleted
+JOB_COLLECTION = 'deletion_jobs'
+
+# Firestore accepts at most 500 writes per batch
+BATCH_WRITE_LIMIT = 500
+
+# Writes of a page batch besides the tasks, counters and releases (the progress document)
+PROGRESS_WRITES = 1
+
+# Number of threads deleting blobs concurrently
+DEFAULT_WORKERS = int(os.environ.get('CASCADE_DELETE_WORKERS', 8))
+
+
+class CascadeDelete:
+    """
+    Deletion of one user's tasks, images and counters, resumable from its progress document
+    """
+
+    def __init__(self, user_id, workers=DEFAULT_WORKERS, progress=None):
+        """
+        Initialize a new CascadeDelete instance
+
+        :param user_id: ID of the user whose data is deleted
+        :param workers: Maximum number of concurrent blob deletions
+        :param progress: Optional callable receiving the progress dictionary after every page
+        """
+        self.user_id = user_id
+        self.workers = workers
+        self.progress = progress
+        self.job_ref = get_db().collection(JOB_COLLECTION).document(user_id)
+        self.state = {
+            'userId': user_id,
+            'status': 'running',
+            'tasksDeleted': 0,
+            'imagesDeleted': 0,
+            'imagesFailed': 0,
+            'startedAt': datetime.now().isoformat()
+        }
+
+    def _delete_blob(self, blob_name):
+        """
+        Delete one blob
+
+        :return: 'deleted', 'missing' (already gone, e.g. deleted by an interrupted run) or 'failed'
+        """
+        try:
+            get_bucket().blob(blob_name).delete()
+            return 'deleted'
+        except NotFound:
+            return 'missing'
+        except Exception as e:
+            print(f"Error deleting {blob_name}: {e}")
+            return 'failed'
+
+    def _delete_blobs(self, pool, blob_names):
+        """Delete blobs concurrently and record the outcome (missing blobs were counted already)"""
+        for outcome in pool.map(self._delete_blob, blob_names):
+            if outcome != 'missing':
+                self.state['imagesDeleted' if outcome == 'deleted' else 'imagesFailed'] += 1
+
+    @staticmethod
+    def _shared_image(image_url, folder=None):
+        """Get the blob name of a content-addressed image, or None"""
+        if not image_url:
+            return None
+        blob_name = image_blob_name(image_url, folder or task_image_folder(image_url))
+        return blob_name if is_content_addressed(blob_name) else None
+
+    def _old_image_blobs(self, image_url, renditions, folder=None):
+        """
+        List the blobs of an older per-upload image, deleted before the document referencing it
+
+        :param folder: Storage folder (derived from the URL for task images)
+        :return: List of blob names to delete now (empty for content-addressed images)
+        """
+        if not image_url or self._shared_image(image_url, folder):
+            return []
+        folder = folder or task_image_folder(image_url)
+        names = [image_blob_name(url, folder) for url in image_urls(image_url, renditions)]
+        return [name for name in names if name]
+
+    def _save_state(self):
+        """Persist the progress document and notify the progress callback"""
+        self.state['updatedAt'] = datetime.now().isoformat()
+        self.job_ref.set(self.state)
+        self._report_progress()
+
+    def _report_progress(self):
+        if self.progress:
+            self.progress(dict(self.state))
+
+    def _commit_with_state(self, batch, **changes):
+        """
+        Commit a batch together with the progress document updated by changes, and
+        apply the changes to self.state only once the commit went through
+
+        :param batch: Write batch
+        :param changes: Progress fields to set
+        """
+        state = dict(self.state, updatedAt=datetime.now().isoformat(), **changes)
+        batch.set(self.job_ref, state)
+        batch.commit()
+        self.state = state
+
+    def _commit_page(self, rows):
+        """
+        Delete a page of task documents together with their category count changes and
+        image releases, splitting into several batches if the page needs more than
+        BATCH_WRITE_LIMIT writes
+
+        :param rows: List of (document reference, task data) tuples
+        """
+        db = get_db()
+        pending = []
+        deltas = {}
+        releases = {}
+        for ref, task_data in rows:
+            category = task_data.get('category', 'other')
+            image = self._shared_image(task_data.get('imageUrl'))
+            # One write per task, per distinct category and per distinct released image
+            writes = 1 + (category not in deltas) + (image is not None and image not in releases)
+            if len(pending) + len(deltas) + len(releases) + writes > BATCH_WRITE_LIMIT - PROGRESS_WRITES:
+                self._commit_batch(db, pending, deltas, releases)
+                pending, deltas, releases = [], {}, {}
+            pending.append(ref)
+            deltas[category] = deltas.get(category, 0) - 1
+            if image:
+                releases[image] = releases.get(image, 0) + 1
+        if pending:
+            self._commit_batch(db, pending, deltas, releases)
+
+    def _commit_batch(self, db, refs, deltas, releases):
+        batch = db.batch()
+        for ref in refs:
+            batch.delete(ref)
+        for category, amount in deltas.items():
+            category_task_counter.add_to_batch(batch, category, amount)
+        for blob_name, count in releases.items():
+            add_release_to_batch(batch, blob_name, count)
+        # The counts are committed with the deletions they describe
+        self._commit_with_state(batch,
+                                tasksDeleted=self.state['tasksDeleted'] + len(refs),
+                                imagesDeleted=self.state['imagesDeleted'] + sum(releases.values()))
+        # An interruption before this point leaves the blob in place, never a dangling reference
+        for blob_name in releases:
+            schedule_collection(blob_name)
+
+    def _remove_profile_picture(self, pool):
+        """
+        Delete or release the user's profile picture. A content-addressed picture is released in
+        the same batch that records the release on the progress document, so a resumed run skips it.
+        """
+        if self.state.get('profilePictureReleased'):
+            return
+        user_doc = get_db().collection('users').document(self.user_id).get()
+        if not user_doc.exists:
+            return
+        user_data = user_doc.to_dict()
+        image_url = user_data.get('profilePicture')
+        image = self._shared_image(image_url, 'profile_photos')
+        if image is None:
+            self._delete_blobs(pool, self._old_image_blobs(
+                image_url, user_data.get('profilePictureRenditions'), 'profile_photos'))
+            return
+
+        batch = get_db().batch()
+        add_release_to_batch(batch, image)
+        self._commit_with_state(batch, profilePictureReleased=True,
+                                imagesDeleted=self.state['imagesDeleted'] + 1)
+        schedule_collection(image)
+
+    def run(self):
+        """
+        Delete every task of the user, their images, the user's counter shards
+        and profile picture. The user document itself is left to the caller.
+
+        :return: Final progress dictionary
+        """
+        db = get_db()
+        previous = self.job_ref.get()
+        if previous.exists:
+            # Resume: keep the counts of the interrupted run
+            previous_state = previous.to_dict()
+            for key in ('tasksDeleted', 'imagesDeleted', 'imagesFailed', 'startedAt', 'profilePictureReleased'):
+                if key in previous_state:
+                    self.state[key] = previous_state[key]
+        self._save_state()
+
+        query = db.collection('tasks').where('userId', '==', self.user_id).limit(BATCH_WRITE_LIMIT)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while True:
+                    docs = list(query.stream())
+                    if not docs:
+                        break
+
+                    rows = [(doc.reference, doc.to_dict()) for doc in docs]
+
+                    # Delete older images first, so an interruption never leaves an orphaned blob
+                    blob_names = []
+                    for _, task_data in rows:
+                        blob_names.extend(self._old_image_blobs(
+                            task_data.get('imageUrl'), task_data.get('imageRenditions')))
+                    self._delete_blobs(pool, blob_names)
+
+                    # Saves the progress document with the page
+                    self._commit_page(rows)
+                    self._report_progress()
+
+                self._remove_profile_picture(pool)
+        except Exception:
+            # Record how far the interrupted run got; the next run continues from there
+            self.state['status'] = 'interrupted'
+            self._save_state()
+            raise
+
+        # Sharded task count and task version stamp of the user
+        batch = db.batch()
+        for shard_ref in user_task_counter.shard_refs(self.user_id):
+            batch.delete(shard_ref)
+        batch.delete(task_versions.version_ref(self.user_id))
+        batch.commit()
+        user_task_counter.invalidate(self.user_id)
+        task_versions.invalidate(self.user_id)
+
+        self.state['status'] = 'completed'
+        self.state['completedAt'] = datetime.now().isoformat()
+        self._save_state()
+        return dict(self.state)
+
+
+def delete_user_data(user_id, progress=None):
+    """
+    Delete (or finish deleting) everything a user owns except the user document
+
+    :param user_id: ID of the user
+    :param progress: Optional callable receiving the progress dictionary after every page
+    :return: Final progress dictionary
+    """
+    return CascadeDelete(user_id, progress=progress).run()
+
+
+def get_deletion_progress(user_id):
+    """
+    Get the recorded progress of a user's cascade deletion
+
+    :param user_id: ID of the user
+    :return: Progress dictionary, or None if no deletion was started
+    """
+    doc = get_db().collection(JOB_COLLECTION).document(user_id).get()
+    return doc.to_dict() if doc.exists else None
@@ -0,0 +1,182 @@
+"""
+Sharded counters for frequently updated totals.
+
+Firestore sustains roughly one write per second per document, so a counter
+that every user bumps (e.g. the task count of the 'work' category) must not
+live in a single document. Each counter is spread over N shard documents in
+the top-level 'counter_shards' collection; writes pick a random shard and
+reads sum the shards. Totals are cached for a short TTL.
+
+The shards hold the changes made since sharding was introduced; the legacy
+field on the parent document (e.g. categories/work.taskCount) is the base
+value, so a full total is ``base + shard sum``.
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+from firebase_admin import firestore
+
+from ..backends import get_db
+
+# Collection holding the shard documents of every counter
+SHARD_COLLECTION = 'counter_shards'
+
+# Default number of shards per counter
+DEFAULT_NUM_SHARDS = int(os.environ.get('COUNTER_SHARDS', 10))
+
+# Seconds a read-side total stays cached
+DEFAULT_CACHE_TTL = float(os.environ.get('COUNTER_CACHE_TTL', 5))
+
+
+class ShardedCounter:
+    """
+    A counter field of a collection, spread over shard documents per parent document
+    """
+
+    def __init__(self, collection, field='taskCount', num_shards=DEFAULT_NUM_SHARDS,
+                 cache_ttl=DEFAULT_CACHE_TTL):
+        """
+        Initialize a new ShardedCounter instance
+
+        :param collection: Collection of the documents being counted for (e.g. 'categories')
+        :param field: Name of the counted field
+        :param num_shards: Number of shard documents per parent document
+        :param cache_ttl: Seconds a total stays cached
+        """
+        self.collection = collection
+        self.field = field
+        self.name = f'{collection}.{field}'
+        self.num_shards = num_shards
+        self.cache_ttl = cache_ttl
+        self._totals = {}
+        self._all_totals = None
+        self._lock = threading.Lock()
+
+    def _shard_id(self, doc_id, shard):
+        return f'{self.collection}_{doc_id}_{self.field}_{shard}'
+
+    def shard_refs(self, doc_id):
+        """
+        Get references to every shard of a parent document
+
+        :param doc_id: Parent document ID
+        :return: List of DocumentReference
+        """
+        db = get_db()
+        return [db.collection(SHARD_COLLECTION).document(self._shard_id(doc_id, shard))
+                for shard in range(self.num_shards)]
+
+    def add_to_batch(self, batch, doc_id, amount):
+        """
+        Queue an increment of one random shard on a write batch
+
+        :param batch: WriteBatch the write is added to
+        :param doc_id: Parent document ID
+        :param amount: Amount to add (negative to decrement)
+        """
+        shard = random.randrange(self.num_shards)
+        shard_ref = get_db().collection(SHARD_COLLECTION).document(self._shard_id(doc_id, shard))
+        batch.set(shard_ref, {
+            'counter': self.name,
+            'docId': doc_id,
+            'shard': shard,
+            'count': firestore.Increment(amount),
+            'lastUpdated': datetime.now().isoformat()
+        }, merge=True)
+        self.invalidate(doc_id)
+
+    def increment(self, doc_id, amount=1):
+        """
+        Increment the counter of a parent document in its own write
+
+        :param doc_id: Parent document ID
+        :param amount: Amount to add (negative to decrement)
+        """
+        batch = get_db().batch()
+        self.add_to_batch(batch, doc_id, amount)
+        batch.commit()
+
+    def get_totals(self, doc_ids):
+        """
+        Get the shard sums of several parent documents (one batched read for cache misses)
+
+        :param doc_ids: Iterable of parent document IDs
+        :return: Dictionary mapping document ID to shard sum
+        """
+        doc_ids = {doc_id for doc_id in doc_ids if doc_id}
+        now = time.monotonic()
+        totals = {}
+        missing = []
+
+        with self._lock:
+            for doc_id in doc_ids:
+                entry = self._totals.get(doc_id)
+                if entry and entry[1] > now:
+                    totals[doc_id] = entry[0]
+                else:
+                    missing.append(doc_id)
+
+        if missing:
+            refs = [ref for doc_id in missing for ref in self.shard_refs(doc_id)]
+            fetched = dict.fromkeys(missing, 0)
+            for doc in get_db().get_all(refs, field_paths=['docId', 'count']):
+                if doc.exists:
+                    data = doc.to_dict()
+                    fetched[data.get('docId')] = fetched.get(data.get('docId'), 0) + data.get('count', 0)
+
+            with self._lock:
+                for doc_id, total in fetched.items():
+                    self._totals[doc_id] = (total, now + self.cache_ttl)
+            totals.update(fetched)
+
+        return totals
+
+    def get_all_totals(self):
+        """
+        Get the shard sums and last update time of every parent document of this counter
+
+        :return: Dictionary mapping document ID to (shard sum, last updated) tuples
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._all_totals and self._all_totals[1] > now:
+                return self._all_totals[0]
+
+        totals = {}
+        query = get_db().collection(SHARD_COLLECTION).where('counter', '==', self.name)
+        for doc in query.stream():
+            data = doc.to_dict()
+            doc_id = data.get('docId')
+            count, last_updated = totals.get(doc_id, (0, None))
+            shard_updated = data.get('lastUpdated')
+            if shard_updated and (last_updated is None or shard_updated > last_updated):
+                last_updated = shard_updated
+            totals[doc_id] = (count + data.get('count', 0), last_updated)
+
+        with self._lock:
+            self._all_totals = (totals, now + self.cache_ttl)
+        return totals
+
+    def invalidate(self, doc_id=None):
+        """
+        Drop cached totals
+
+        :param doc_id: Parent document whose total changed; clears every total if omitted
+        """
+        with self._lock:
+            self._all_totals = None
+            if doc_id is None:
+                self._totals.clear()
+            else:
+                self._totals.pop(doc_id, None)
+
+
+# Task counts of categories (shared by every user, so heavily contended)
+category_task_counter = ShardedCounter('categories')
+
+# Task counts of users
+user_task_counter = ShardedCounter('users', num_shards=int(os.environ.get('USER_COUNTER_SHARDS', 3)))
@@ -0,0 +1,312 @@
+"""
+Image storage for task images and profile pictures.
+
+At upload time the original file is stored as-is and Pillow produces smaller,
+recompressed JPEG renditions (thumbnail and medium) in a thread pool while the
+original is uploaded. Pillow releases the GIL while it decodes, resizes and
+encodes, and the threads read the in-memory upload spool directly, so the image
+is neither copied nor written to disk again. The rendition URLs are stored next
+to the original URL so list views can load the thumbnail.
+Files Pillow cannot read are stored without renditions.
+
+Images are content-addressed: the blob name is the SHA-256 of the file
+(computed while the upload is parsed), e.g. image_photo/sha256-<hex>.jpg. A
+document in the 'blob_refs' collection counts the tasks/users referencing each
+blob, so uploading a file that is already stored only bumps the count, and the
+blob and its renditions are deleted once the last reference is released. The
+count is read and changed in transactions, and an upload takes its reference
+before the blob is written. A collection deletes only the blob generations it
+saw before dropping the count, so an upload of the same content that lands in
+the meantime is not deleted with them.
+"""
+
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from firebase_admin import firestore
+from flask import current_app, has_app_context
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from ..backends import get_bucket, get_db, run_transaction
+from ..utils.storage import image_blob_name
+from ..utils.uploads import file_digest, spooled_content, upload_file
+from .jobs import apply_once, enqueue, job_handler
+
+# Rendition name -> (longest side in pixels, JPEG quality)
+RENDITIONS = {
+    'thumbnail': (320, 75),
+    'medium': (1024, 82)
+}
+
+# Number of threads generating renditions
+DEFAULT_WORKERS = int(os.environ.get('IMAGE_WORKERS', min(2, os.cpu_count() or 1)))
+
+# Seconds to wait for the renditions of one upload
+RENDER_TIMEOUT = 30
+
+# Refuse to decode images with more pixels than this (decompression bombs)
+MAX_PIXELS = 50_000_000
+
+# Collection holding the reference count of every content-addressed blob
+REFS_COLLECTION = 'blob_refs'
+
+# Seconds between the last reference going away and the blob being deleted
+COLLECT_DELAY = float(os.environ.get('IMAGE_COLLECT_DELAY', 60))
+
+# Name of a content-addressed blob: <folder>/sha256-<hex digest><extension>
+_CONTENT_ADDRESSED_RE = re.compile(r'^[\w-]+/sha256-[0-9a-f]{64}(\.[a-z0-9]{1,8})?$')
+
+_pool = None
+_pool_pid = None
+
+
+def _render(data, renditions):
+    """
+    Produce the renditions of one image (runs in the rendition pool)
+
+    :param data: Encoded image bytes
+    :param renditions: Dictionary of rendition name to (longest side, JPEG quality)
+    :return: Dictionary of rendition name to JPEG bytes, or None if the data is not an image
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # Apply the camera's EXIF rotation before resizing
+            image = ImageOps.exif_transpose(source)
+            if image.mode not in ('RGB', 'L'):
+                # JPEG has no alpha channel: flatten onto white
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                rgba = image.convert('RGBA')
+                background.paste(rgba, mask=rgba.split()[-1])
+                image = background
+
+            results = {}
+            for name, (size, quality) in renditions.items():
+                rendition = image.copy()
+                # Only shrink; small images are just recompressed
+                rendition.thumbnail((size, size), Image.LANCZOS)
+                output = io.BytesIO()
+                rendition.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+                results[name] = output.getvalue()
+            return results
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"Cannot create image renditions: {e}")
+        return None
+
+
+def _get_pool():
+    """Get this process's rendition pool, creating it after start-up or a fork"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        workers = current_app.config.get('IMAGE_WORKERS', DEFAULT_WORKERS) if has_app_context() else DEFAULT_WORKERS
+        _pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='image-rendition')
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def rendition_blob_name(blob_name, rendition):
+    """
+    Get the blob name of a rendition, stored next to the original
+
+    :param blob_name: Blob name of the original (e.g. image_photo/abc.png)
+    :param rendition: Rendition name
+    :return: Blob name of the rendition (e.g. image_photo/abc.thumbnail.jpg)
+    """
+    stem = blob_name.rsplit('.', 1)[0] if '.' in blob_name.rsplit('/', 1)[-1] else blob_name
+    return f'{stem}.{rendition}.jpg'
+
+
+def upload_image(file, bucket, blob_name):
+    """
+    Store an uploaded image and its renditions
+
+    :param file: werkzeug FileStorage from request.files
+    :param bucket: Storage bucket
+    :param blob_name: Blob name of the original
+    :return: (original URL, dictionary of rendition name to URL) tuple
+    """
+    # Resize in the pool while the original is being uploaded
+    future = None
+    try:
+        future = _get_pool().submit(_render, spooled_content(file.stream), RENDITIONS)
+    except Exception as e:
+        print(f"Cannot start image rendition: {e}")
+
+    original_url = upload_file(file, bucket.blob(blob_name))
+
+    renditions = {}
+    if future is not None:
+        try:
+            rendered = future.result(timeout=RENDER_TIMEOUT)
+        except Exception as e:
+            print(f"Image rendition failed: {e}")
+            rendered = None
+        for name, content in (rendered or {}).items():
+            blob = bucket.blob(rendition_blob_name(blob_name, name))
+            blob.upload_from_string(content, content_type='image/jpeg')
+            blob.make_public()
+            renditions[name] = blob.public_url
+
+    return original_url, renditions
+
+
+def image_urls(image_url, renditions=None):
+    """
+    List the URL of an image and of all its renditions
+
+    :param image_url: URL of the original image (may be None)
+    :param renditions: Dictionary of rendition name to URL (may be None)
+    :return: List of URLs
+    """
+    urls = [image_url] if image_url else []
+    urls.extend(url for url in (renditions or {}).values() if url)
+    return urls
+
+
+def is_content_addressed(blob_name):
+    """Check whether a blob was stored under its content hash"""
+    return bool(blob_name and _CONTENT_ADDRESSED_RE.match(blob_name))
+
+
+def _ref_id(blob_name):
+    """Document ID of a blob's reference count (document IDs cannot contain '/')"""
+    return blob_name.replace('/', ':')
+
+
+def store_image(file, bucket, folder):
+    """
+    Store an uploaded image under its content hash and take a reference to it.
+    If the same content is already stored, nothing is uploaded.
+
+    :param file: werkzeug FileStorage from request.files
+    :param bucket: Storage bucket
+    :param folder: Storage folder (e.g. 'image_photo')
+    :return: (original URL, dictionary of rendition name to URL) tuple
+    """
+    extension = os.path.splitext(file.filename or '')[1].lower()
+    if not re.match(r'^\.[a-z0-9]{1,8}$', extension):
+        extension = ''
+    blob_name = f'{folder}/sha256-{file_digest(file)}{extension}'
+
+    ref = get_db().collection(REFS_COLLECTION).document(_ref_id(blob_name))
+    now = datetime.now().isoformat()
+
+    def take_reference(transaction):
+        snapshot = ref.get(transaction=transaction)
+        data = snapshot.to_dict() if snapshot.exists else {}
+        transaction.set(ref, {'blobName': blob_name, 'refCount': firestore.Increment(1), 'updatedAt': now},
+                        merge=True)
+        return data
+
+    # Already stored and referenced: only count the new reference
+    data = run_transaction(take_reference)
+    if data.get('refCount', 0) > 0 and data.get('url'):
+        return data['url'], data.get('renditions') or {}
+
+    # Concurrent uploads of new content both upload it (to the same blob name)
+    try:
+        url, renditions = upload_image(file, bucket, blob_name)
+    except Exception:
+        _release_image(blob_name)
+        raise
+    ref.set({'url': url, 'renditions': renditions, 'updatedAt': datetime.now().isoformat()}, merge=True)
+    return url, renditions
+
+
+def release_image(image_url, renditions, folder):
+    """
+    Drop a task's or user's reference to an image in the background. Content-addressed
+    images are deleted once unreferenced; older per-upload images are deleted right away.
+
+    :param image_url: URL of the original image
+    :param renditions: Dictionary of rendition name to URL (may be None)
+    :param folder: Storage folder of the image
+    :return: List of job IDs
+    """
+    blob_name = image_blob_name(image_url, folder)
+    if is_content_addressed(blob_name):
+        return [enqueue('release_image', blob_name=blob_name)]
+
+    job_ids = []
+    for url in image_urls(image_url, renditions):
+        name = image_blob_name(url, folder)
+        if name:
+            job_ids.append(enqueue('delete_blob', name=name))
+        else:
+            print(f"Not a {folder} image, nothing to delete: {url}")
+    return job_ids
+
+
+def add_release_to_batch(batch, blob_name, count=1):
+    """
+    Queue the release of references to a content-addressed blob in a write batch, so they are
+    dropped together with the documents holding them; call schedule_collection after the commit
+
+    :param batch: Write batch
+    :param blob_name: Blob name of the original
+    :param count: Number of references released
+    """
+    ref = get_db().collection(REFS_COLLECTION).document(_ref_id(blob_name))
+    batch.set(ref, {'refCount': firestore.Increment(-count), 'updatedAt': datetime.now().isoformat()}, merge=True)
+
+
+def schedule_collection(blob_name):
+    """
+    Delete a released blob after COLLECT_DELAY unless it is referenced again by then
+
+    :param blob_name: Blob name of the original
+    :return: Job ID
+    """
+    return enqueue('collect_image', delay=COLLECT_DELAY, blob_name=blob_name)
+
+
+@job_handler('release_image', keyed=True)
+def _release_image(blob_name, job_key=None):
+    """Decrement the reference count of a blob and schedule its collection"""
+    ref = get_db().collection(REFS_COLLECTION).document(_ref_id(blob_name))
+    # The decrement is committed with the job's marker, so a job run again after
+    # its commit went through does not decrement twice
+    apply_once(job_key, lambda writes: writes.update(ref, {
+        'refCount': firestore.Increment(-1),
+        'updatedAt': datetime.now().isoformat()
+    }))
+    schedule_collection(blob_name)
+
+
+@job_handler('collect_image')
+def _collect_image(blob_name):
+    """Delete a blob and its renditions if nothing references it anymore"""
+    ref = get_db().collection(REFS_COLLECTION).document(_ref_id(blob_name))
+    bucket = get_bucket()
+
+    # Generations of the stored files, read while the count document still exists: an upload
+    # taking a reference from here on either stops the transaction below or, once the document
+    # is gone, writes new generations, which the generation-matched deletes leave alone
+    generations = {}
+    for name in [blob_name] + [rendition_blob_name(blob_name, rendition) for rendition in RENDITIONS]:
+        blob = bucket.get_blob(name)
+        if blob is not None:
+            generations[name] = blob.generation
+
+    def drop_reference_count(transaction):
+        snapshot = ref.get(transaction=transaction)
+        if snapshot.exists and snapshot.to_dict().get('refCount', 0) > 0:
+            return False
+        transaction.delete(ref)
+        return True
+
+    # A retried job finds no document and deletes whatever blobs are left
+    if not run_transaction(drop_reference_count):
+        return
+
+    for name, generation in generations.items():
+        try:
+            bucket.blob(name).delete(if_generation_match=generation)
+        except (NotFound, PreconditionFailed):
+            # Already deleted, or stored again by a new upload
+            pass
@@ -0,0 +1,491 @@
+"""
+Background job queue for side effects that do not need to finish before the response.
+
+Jobs (deleting a replaced image, bumping a sharded counter, stamping a user's
+activity) are written to a durable SQLite table and executed by a small pool of
+worker threads in the same process. A failed job is retried with exponential
+backoff until JOB_MAX_ATTEMPTS is reached, then kept as 'failed' for inspection.
+A worker claims a job with a lease (JOB_LEASE_SECONDS); a job whose lease ran
+out, because the process running it died, is queued again. Jobs running in
+other live processes sharing the table are left alone.
+
+Delivery is at least once: a job may run again after a failure reported once
+its writes had already been committed, or after its lease expired. Handlers
+registered with keyed=True get a job_key, fixed when the job is enqueued, and
+apply their non-idempotent writes through apply_once(), which commits them with
+a marker document for the key and skips them when the marker already exists.
+
+With JOB_WORKERS=0 jobs run inline when they are enqueued; a job enqueued with
+a delay runs on a timer thread once it is due (and is lost if the process exits
+first).
+"""
+
+import atexit
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import NotFound
+
+from ..backends import get_bucket, get_db, run_transaction
+from . import metrics
+from .counters import category_task_counter, user_task_counter
+
+# Default location of the job table
+DEFAULT_DATABASE = 'jobs.sqlite3'
+
+# Default number of worker threads per process
+DEFAULT_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+
+# Attempts before a job is marked as failed
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+
+# Delay before the first retry in seconds; doubled for every further attempt
+DEFAULT_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 2))
+
+# Seconds a claimed job may run before another worker may take it over
+DEFAULT_LEASE = float(os.environ.get('JOB_LEASE_SECONDS', 300))
+
+# Seconds an idle worker waits before polling for delayed retries
+POLL_INTERVAL = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_error TEXT,
+    claimed_by TEXT,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_run_at ON jobs (status, run_at);
+"""
+
+# Columns added to job tables created by earlier versions
+_ADDED_COLUMNS = {'claimed_by': 'TEXT', 'claimed_at': 'REAL'}
+
+# Collection of the markers of jobs whose writes were applied (see apply_once)
+APPLIED_JOBS_COLLECTION = 'applied_jobs'
+
+# How long a marker is kept (expireAt, for a Firestore TTL policy); longer than any retry
+APPLIED_JOB_RETENTION = timedelta(days=7)
+
+# Handlers by job kind
+_handlers = {}
+
+# Job kinds whose handler takes a job_key
+_keyed_kinds = set()
+
+
+def job_handler(kind, keyed=False):
+    """
+    Register the function executing jobs of a kind
+
+    :param kind: Job kind
+    :param keyed: Pass the handler a job_key that stays the same across runs of one job
+    :return: Decorator
+    """
+    def register(func):
+        _handlers[kind] = func
+        if keyed:
+            _keyed_kinds.add(kind)
+        return func
+    return register
+
+
+def apply_once(job_key, write):
+    """
+    Apply a job's writes at most once: they are committed in a transaction together with a
+    marker document for the job, and skipped when an earlier run already wrote the marker
+
+    :param job_key: Key of the job (None for jobs enqueued without one: applied unconditionally)
+    :param write: Callable adding the writes to a transaction or write batch
+    :return: True if the writes were applied, False if they already had been
+    """
+    if job_key is None:
+        batch = get_db().batch()
+        write(batch)
+        batch.commit()
+        return True
+
+    marker = get_db().collection(APPLIED_JOBS_COLLECTION).document(job_key)
+
+    def apply(transaction):
+        if marker.get(transaction=transaction).exists:
+            return False
+        write(transaction)
+        now = datetime.now(timezone.utc)
+        transaction.set(marker, {'appliedAt': now.isoformat(), 'expireAt': now + APPLIED_JOB_RETENTION})
+        return True
+
+    return run_transaction(apply)
+
+
+class JobQueue:
+    """
+    Durable job table with an in-process pool of worker threads
+    """
+
+    def __init__(self, path=None, workers=DEFAULT_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 retry_delay=DEFAULT_RETRY_DELAY, lease=DEFAULT_LEASE):
+        """
+        Initialize a new JobQueue instance
+
+        :param path: Path of the SQLite job table (defaults to $JOB_QUEUE_DATABASE or jobs.sqlite3)
+        :param workers: Number of worker threads (0 runs jobs inline)
+        :param max_attempts: Attempts before a job is marked as failed
+        :param retry_delay: Delay before the first retry in seconds
+        :param lease: Seconds a claimed job may run before it is queued again
+        """
+        self.path = path or os.environ.get('JOB_QUEUE_DATABASE', DEFAULT_DATABASE)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.processed = Counter()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+        self._pid = None
+        self._stopping = False
+
+    def configure(self, path=None, workers=None, max_attempts=None, retry_delay=None, lease=None):
+        """Change the settings; running workers are stopped and restart on next use"""
+        self.stop()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            if path is not None:
+                self.path = path
+            if workers is not None:
+                self.workers = workers
+            if max_attempts is not None:
+                self.max_attempts = max_attempts
+            if retry_delay is not None:
+                self.retry_delay = retry_delay
+            if lease is not None:
+                self.lease = lease
+
+    def _connection(self):
+        """Get the shared connection (callers hold self._lock)"""
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            if self.path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+            for column, column_type in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+            self._pid = os.getpid()
+            self._threads = []
+        return self._conn
+
+    def ensure_started(self):
+        """Start the worker threads of this process if they are not running (fork-safe)"""
+        if self.workers <= 0:
+            return
+        with self._lock:
+            self._connection()
+            if self._threads and all(thread.is_alive() for thread in self._threads):
+                return
+            self._stopping = False
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, kind, delay=0, **payload):
+        """
+        Add a job to the queue
+
+        :param kind: Job kind (must have a registered handler)
+        :param delay: Seconds to wait before the first attempt
+        :param payload: JSON-serializable job arguments
+        :return: Job ID, or None if the job ran inline
+        """
+        if kind not in _handlers:
+            raise ValueError(f'No handler registered for job kind {kind!r}')
+        if kind in _keyed_kinds:
+            # Stored with the payload, so every run of the job sees the same key
+            payload['job_key'] = uuid.uuid4().hex
+
+        if self.workers <= 0:
+            if delay > 0:
+                # No worker polls the table: wait for the delay on a timer instead
+                timer = threading.Timer(delay, self._execute_delayed, (kind, payload))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._execute(kind, payload)
+            return None
+
+        self.ensure_started()
+        now = time.time()
+        with self._wakeup:
+            job_id = self._connection().execute(
+                'INSERT INTO jobs (kind, payload, run_at, created_at) VALUES (?, ?, ?, ?)',
+                (kind, json.dumps(payload), now + delay, now)
+            ).lastrowid
+            self._wakeup.notify()
+        return job_id
+
+    def _execute(self, kind, payload):
+        with metrics.operation(f'job:{kind}'):
+            _handlers[kind](**payload)
+        with self._lock:
+            self.processed[kind] += 1
+
+    def _worker_id(self):
+        """Identify the calling worker thread in the claimed_by column"""
+        return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+    def _execute_delayed(self, kind, payload):
+        """Run an inline job whose delay has passed (there is no caller to raise to)"""
+        try:
+            self._execute(kind, payload)
+        except Exception as e:
+            print(f"Delayed job ({kind}) failed: {e}")
+
+    def _claim(self, worker_id):
+        """
+        Mark the next due job as running (callers hold self._lock). The job table
+        may be shared by several worker processes, so the claim is one write transaction.
+        Jobs whose lease has expired are queued again first.
+
+        :param worker_id: Identifier of the claiming worker
+        :return: (job, seconds until the next queued job is due) tuple; job is None if none is due
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # The worker holding these died (or hung) mid-run; the attempt it used counts
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                "last_error = 'lease expired', claimed_by = NULL, claimed_at = NULL "
+                "WHERE status = 'running' AND (claimed_at IS NULL OR claimed_at < ?)",
+                (self.max_attempts, now - self.lease)
+            )
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts, run_at FROM jobs WHERE status = 'queued' "
+                'ORDER BY run_at LIMIT 1'
+            ).fetchone()
+            if row is None or row[4] > now:
+                conn.execute('COMMIT')
+                return None, (row[4] - now if row else None)
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, claimed_by = ?, claimed_at = ? "
+                'WHERE id = ?',
+                (worker_id, now, row[0])
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return row[:4], 0
+
+    def _work(self):
+        """Worker loop: run due jobs, sleep until notified or the next poll"""
+        worker_id = self._worker_id()
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+                job, next_due = self._claim(worker_id)
+                if job is None:
+                    # Sleep until notified, the next retry is due, or the next poll
+                    # (jobs may also be added by other processes)
+                    self._wakeup.wait(POLL_INTERVAL if next_due is None else min(next_due, POLL_INTERVAL))
+                    continue
+
+            job_id, kind, payload, attempts = job
+            attempts += 1
+            # The updates below only apply while this worker still holds the job: after its
+            # lease expired, the job belongs to whichever worker claimed it again
+            try:
+                self._execute(kind, json.loads(payload))
+            except Exception as e:
+                print(f"Job {job_id} ({kind}) failed on attempt {attempts}: {e}")
+                with self._lock:
+                    if attempts >= self.max_attempts:
+                        self._connection().execute(
+                            "UPDATE jobs SET status = 'failed', last_error = ?, claimed_by = NULL "
+                            'WHERE id = ? AND claimed_by = ?',
+                            (str(e), job_id, worker_id)
+                        )
+                    else:
+                        # Exponential backoff with jitter
+                        delay = self.retry_delay * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+                        self._connection().execute(
+                            "UPDATE jobs SET status = 'queued', run_at = ?, last_error = ?, claimed_by = NULL "
+                            'WHERE id = ? AND claimed_by = ?',
+                            (time.time() + delay, str(e), job_id, worker_id)
+                        )
+            else:
+                with self._lock:
+                    self._connection().execute('DELETE FROM jobs WHERE id = ? AND claimed_by = ?',
+                                               (job_id, worker_id))
+
+    def stats(self):
+        """
+        Get the queue depth and recent failures
+
+        :return: Dictionary with counts by status, the age of the oldest queued job,
+                 jobs processed by this process and the latest failed jobs
+        """
+        with self._lock:
+            conn = self._connection()
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            failed = conn.execute(
+                "SELECT id, kind, payload, attempts, last_error FROM jobs WHERE status = 'failed' "
+                'ORDER BY id DESC LIMIT 20'
+            ).fetchall()
+            workers = sum(1 for thread in self._threads if thread.is_alive())
+
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'failed': counts.get('failed', 0),
+            'oldestQueuedSeconds': round(time.time() - oldest, 3) if oldest else None,
+            'workers': workers,
+            'processed': dict(self.processed),
+            'recentFailures': [
+                {'id': job_id, 'kind': kind, 'payload': json.loads(payload),
+                 'attempts': attempts, 'error': error}
+                for job_id, kind, payload, attempts, error in failed
+            ]
+        }
+
+    def retry_failed(self):
+        """
+        Queue every failed job again
+
+        :return: Number of jobs queued
+        """
+        with self._wakeup:
+            count = self._connection().execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ? WHERE status = 'failed'",
+                (time.time(),)
+            ).rowcount
+            self._wakeup.notify_all()
+        return count
+
+    def drain(self, timeout=10.0):
+        """
+        Wait until no job is queued or running (failed jobs are not waited for)
+
+        :param timeout: Maximum seconds to wait
+        :return: True if the queue drained in time
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                pending = self._connection().execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+                ).fetchone()[0]
+            if not pending:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def stop(self, timeout=5.0):
+        """Stop the worker threads of this process"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+            threads = self._threads if self._pid == os.getpid() else []
+        for thread in threads:
+            thread.join(timeout)
+        with self._lock:
+            self._threads = []
+
+
+@job_handler('delete_blob')
+def delete_blob(name):
+    """Delete a blob from storage; a blob that is already gone is not an error"""
+    try:
+        get_bucket().blob(name).delete()
+    except NotFound:
+        pass
+
+
+# Counters that jobs may change, by name
+COUNTERS = {counter.name: counter for counter in (category_task_counter, user_task_counter)}
+
+
+@job_handler('increment_counter', keyed=True)
+def increment_counter(counter, doc_id, amount, job_key=None):
+    """Apply a change to a sharded counter, once per job"""
+    apply_once(job_key, lambda writes: COUNTERS[counter].add_to_batch(writes, doc_id, amount))
+
+
+@job_handler('merge_document')
+def merge_document(collection, doc_id, data):
+    """Merge fields into a document (e.g. a user's activity timestamps)"""
+    get_db().collection(collection).document(doc_id).set(data, merge=True)
+
+
+# Shared queue of this process
+job_queue = JobQueue()
+atexit.register(job_queue.stop, 1.0)
+
+
+def init_app(app):
+    """
+    Configure the job queue from a Flask application's config and make every
+    worker process start its own threads on its first request
+
+    :param app: Flask application
+    """
+    app.config.setdefault('JOB_QUEUE_DATABASE', os.environ.get('JOB_QUEUE_DATABASE', DEFAULT_DATABASE))
+    app.config.setdefault('JOB_WORKERS', DEFAULT_WORKERS)
+    app.config.setdefault('JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    app.config.setdefault('JOB_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    app.config.setdefault('JOB_LEASE_SECONDS', DEFAULT_LEASE)
+
+    job_queue.configure(
+        path=app.config['JOB_QUEUE_DATABASE'],
+        workers=int(app.config['JOB_WORKERS']),
+        max_attempts=int(app.config['JOB_MAX_ATTEMPTS']),
+        retry_delay=float(app.config['JOB_RETRY_DELAY']),
+        lease=float(app.config['JOB_LEASE_SECONDS'])
+    )
+    app.before_request(job_queue.ensure_started)
+
+
+def enqueue(kind, **payload):
+    """
+    Add a job to the shared queue
+
+    :param kind: Job kind ('delete_blob', 'increment_counter' or 'merge_document')
+    :param payload: Job arguments
+    :return: Job ID, or None if the job ran inline
+    """
+    return job_queue.enqueue(kind, **payload)
+
+
+def enqueue_counter_change(counter, doc_id, amount):
+    """
+    Queue a change to a sharded counter
+
+    :param counter: ShardedCounter instance
+    :param doc_id: Parent document ID
+    :param amount: Amount to add (negative to decrement)
+    """
+    return enqueue('increment_counter', counter=counter.name, doc_id=doc_id, amount=amount)
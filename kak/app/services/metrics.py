@@ -0,0 +1,304 @@
+"""
+Request and datastore RPC metrics in Prometheus text format.
+
+Every Firestore and Storage call made through get_db()/get_bucket() is counted
+and timed (see app/backends/instrumentation.py), labelled with the Flask
+endpoint that made it, or with 'job:<kind>' / 'background' outside a request.
+Each request additionally records its duration and how many RPCs it made, so an
+N+1 pattern shows up as a high app_request_rpcs for one endpoint; for streamed
+responses these totals are recorded when the response is closed. The numbers
+are served on /metrics; they are kept per process, so with several workers each
+one is scraped (or reports) separately. They reveal the traffic of every route
+and collection, so /metrics answers only signed-in admins and requests carrying
+"Authorization: Bearer <METRICS_TOKEN>" (for the scraper).
+"""
+
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, current_app, g, has_request_context, request, session
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets of the number of RPCs made by one request
+RPC_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+# Buckets of bytes moved by one Storage call
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+# Label used for work done outside a request
+_operation = ContextVar('metrics_operation', default='background')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic counter with labels
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Initialize a new Counter instance
+
+        :param name: Metric name
+        :param documentation: HELP text
+        :param labelnames: Names of the labels
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        """
+        Increase the counter
+
+        :param labels: Label values, in labelnames order
+        :param amount: Amount to add
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        """Render the counter in Prometheus text format"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets and labels
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Initialize a new Histogram instance
+
+        :param name: Metric name
+        :param documentation: HELP text
+        :param labelnames: Names of the labels
+        :param buckets: Upper bounds of the buckets
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        """
+        Record one observation
+
+        :param labels: Label values, in labelnames order
+        :param value: Observed value
+        """
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def collect(self):
+        """Render the histogram in Prometheus text format (cumulative buckets)"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket'
+                             f'{_format_labels(self.labelnames, labels, [("le", _format_number(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+rpc_total = Counter(
+    'app_rpc_total', 'Firestore and Storage calls', ('endpoint', 'service', 'method'))
+rpc_errors_total = Counter(
+    'app_rpc_errors_total', 'Firestore and Storage calls that raised', ('endpoint', 'service', 'method'))
+rpc_duration = Histogram(
+    'app_rpc_duration_seconds', 'Latency of Firestore and Storage calls', ('endpoint', 'service', 'method'))
+rpc_documents_total = Counter(
+    'app_rpc_documents_total', 'Firestore documents read or written', ('endpoint', 'method'))
+storage_bytes_total = Counter(
+    'app_storage_bytes_total', 'Bytes uploaded to or downloaded from Storage', ('endpoint', 'direction'))
+storage_transfer_size = Histogram(
+    'app_storage_transfer_bytes', 'Size of Storage uploads and downloads', ('endpoint', 'direction'),
+    buckets=SIZE_BUCKETS)
+requests_total = Counter(
+    'app_requests_total', 'HTTP requests', ('endpoint', 'method', 'status'))
+request_duration = Histogram(
+    'app_request_duration_seconds', 'HTTP request latency until the response is returned', ('endpoint',))
+request_rpcs = Histogram(
+    'app_request_rpcs', 'Firestore and Storage calls made by one HTTP request', ('endpoint',),
+    buckets=RPC_COUNT_BUCKETS)
+request_rpc_duration = Histogram(
+    'app_request_rpc_duration_seconds', 'Time one HTTP request spent in Firestore and Storage calls',
+    ('endpoint',))
+
+METRICS = (rpc_total, rpc_errors_total, rpc_duration, rpc_documents_total, storage_bytes_total,
+           storage_transfer_size, requests_total, request_duration, request_rpcs, request_rpc_duration)
+
+
+def current_endpoint():
+    """
+    Get the label of the work in progress
+
+    :return: Flask endpoint of the current request, or the operation set with operation()
+    """
+    operation = _operation.get()
+    if operation != 'background' or not has_request_context():
+        return operation
+    return request.endpoint or 'unmatched'
+
+
+@contextmanager
+def operation(name):
+    """
+    Label the RPCs made inside the block (e.g. 'job:delete_blob')
+
+    :param name: Label value
+    """
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def record_rpc(service, method, seconds, documents=None, upload_bytes=None, download_bytes=None, failed=False):
+    """
+    Record one Firestore or Storage call
+
+    :param service: 'firestore' or 'storage'
+    :param method: RPC name (get, query, batch_get, commit, upload, ...)
+    :param seconds: Duration of the call
+    :param documents: Firestore documents read or written, if known
+    :param upload_bytes: Bytes sent to Storage, if any
+    :param download_bytes: Bytes received from Storage, if any
+    :param failed: Whether the call raised
+    """
+    endpoint = current_endpoint()
+    labels = (endpoint, service, method)
+    rpc_total.inc(labels)
+    rpc_duration.observe(labels, seconds)
+    if failed:
+        rpc_errors_total.inc(labels)
+    if documents:
+        rpc_documents_total.inc((endpoint, method), documents)
+    for direction, size in (('upload', upload_bytes), ('download', download_bytes)):
+        if size is not None:
+            storage_bytes_total.inc((endpoint, direction), size)
+            storage_transfer_size.observe((endpoint, direction), size)
+
+    # Per-request totals, reported when the request finishes
+    if has_request_context() and _operation.get() == 'background':
+        totals = g.get('_metrics')
+        if totals is not None:
+            totals['rpcs'] += 1
+            totals['rpc_seconds'] += seconds
+
+
+def render():
+    """
+    Render every metric in Prometheus text format
+
+    :return: Exposition text
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+def _start_request():
+    # Mutable, so RPCs made while a streamed body is produced still land here
+    g._metrics = {'started': time.perf_counter(), 'rpcs': 0, 'rpc_seconds': 0.0}
+
+
+def _record_request(totals, labels):
+    """Record the totals of a finished request"""
+    endpoint = labels[0]
+    requests_total.inc(labels)
+    request_duration.observe((endpoint,), time.perf_counter() - totals['started'])
+    request_rpcs.observe((endpoint,), totals['rpcs'])
+    request_rpc_duration.observe((endpoint,), totals['rpc_seconds'])
+
+
+def _finish_request(response):
+    totals = g.get('_metrics')
+    if totals is None:
+        return response
+    labels = (request.endpoint or 'unmatched', request.method, str(response.status_code))
+
+    if response.is_streamed:
+        # The body (and the RPCs producing it, e.g. the admin listings) runs after this
+        # hook: record once the server has sent it and closes the response
+        response.call_on_close(lambda: _record_request(totals, labels))
+        return response
+
+    _record_request(totals, labels)
+    # Visible in the browser's network panel
+    response.headers.add('Server-Timing',
+                         f'rpc;dur={totals["rpc_seconds"] * 1000:.1f};desc="{totals["rpcs"]} calls"')
+    return response
+
+
+def metrics_view():
+    """Serve the metrics in Prometheus text format to the scraper (METRICS_TOKEN) or an admin"""
+    token = current_app.config.get('METRICS_TOKEN')
+    has_token = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not has_token and not session.get('is_admin'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """
+    Record request metrics and serve /metrics
+
+    :param app: Flask application
+    """
+    app.config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', 'true').lower()
+                          not in ('0', 'false', 'no'))
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN', ''))
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,196 @@
+"""
+Quote service for the dashboard's /quote endpoint.
+
+Quotes are served from an in-memory buffer and never wait on the network. A
+background thread keeps the buffer filled from the external quote API through
+a shared requests.Session (keep-alive connection pool) with strict connect and
+read timeouts, backing off while the API fails. When the buffer is empty a
+quote from the bundled offline set (app/data/quotes.json) is served instead.
+"""
+
+import json
+import os
+import random
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# External quote API (API Ninjas)
+DEFAULT_API_URL = os.environ.get('QUOTE_API_URL', 'https://api.api-ninjas.com/v1/quotes')
+DEFAULT_API_KEY = os.environ.get('QUOTE_API_KEY', 'whXhcw6atow6MmzGEuJTgQ==34nA35P7ioKTsheO')
+
+# Quotes kept in memory, and the level below which the buffer is refilled
+DEFAULT_BUFFER_SIZE = int(os.environ.get('QUOTE_BUFFER_SIZE', 20))
+REFILL_BELOW = 0.5
+
+# Seconds to connect to / wait for a response from the quote API
+CONNECT_TIMEOUT = float(os.environ.get('QUOTE_CONNECT_TIMEOUT', 1.0))
+READ_TIMEOUT = float(os.environ.get('QUOTE_READ_TIMEOUT', 2.0))
+
+# Backoff between failed fetches in seconds
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+
+OFFLINE_QUOTES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'quotes.json')
+
+
+def load_offline_quotes(path=OFFLINE_QUOTES_PATH):
+    """
+    Load the bundled quote set
+
+    :param path: Path of a JSON list of {content, author, category} objects
+    :return: List of quote dictionaries
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Cannot load offline quotes: {e}")
+        return [{'content': 'The will of man is his happiness.', 'author': 'Friedrich Schiller',
+                 'category': 'happiness'}]
+
+
+class QuoteService:
+    """
+    Buffer of quotes refilled from the quote API by a background thread
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, api_key=DEFAULT_API_KEY, buffer_size=DEFAULT_BUFFER_SIZE,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), offline_quotes=None):
+        """
+        Initialize a new QuoteService instance
+
+        :param api_url: URL of the quote API
+        :param api_key: API key sent as X-Api-Key (may be empty)
+        :param buffer_size: Number of quotes kept in memory
+        :param timeout: (connect, read) timeout in seconds for API calls
+        :param offline_quotes: Fallback quotes; defaults to the bundled set
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self.offline_quotes = offline_quotes if offline_quotes is not None else load_offline_quotes()
+        self.stats = {'served': 0, 'offline': 0, 'fetched': 0, 'fetchErrors': 0}
+        self._buffer = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._session = None
+        self._session_pid = None
+
+    def _get_session(self):
+        """HTTP session of this process (connection pools are not shared across a fork)"""
+        if self._session is None or self._session_pid != os.getpid():
+            session = requests.Session()
+            # Failed fetches are retried by the refill loop with backoff, not by urllib3
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            if self.api_key:
+                session.headers['X-Api-Key'] = self.api_key
+            self._session = session
+            self._session_pid = os.getpid()
+        return self._session
+
+    def fetch(self):
+        """
+        Fetch quotes from the API (called by the refill thread)
+
+        :return: List of quote dictionaries
+        :raises requests.RequestException, ValueError: if the API fails or answers unexpectedly
+        """
+        response = self._get_session().get(self.api_url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, list):
+            raise ValueError('Invalid API response format')
+        quotes = [{
+            'content': item.get('quote', 'No content available'),
+            'author': item.get('author', 'Unknown'),
+            'category': item.get('category', 'General')
+        } for item in data if isinstance(item, dict)]
+        if not quotes:
+            raise ValueError('Invalid API response format')
+        return quotes
+
+    def _pause(self, seconds):
+        """Wait after a failed fetch, returning early when the service is stopped"""
+        self._stopped.wait(seconds)
+
+    def _refill(self):
+        """Keep the buffer full, backing off while the API fails"""
+        backoff = MIN_BACKOFF
+        while not self._stopped.is_set():
+            # Cleared before filling, so a wake-up during the fill is not lost
+            self._wakeup.clear()
+            while len(self._buffer) < self.buffer_size and not self._stopped.is_set():
+                try:
+                    quotes = self.fetch()
+                except (requests.RequestException, ValueError) as e:
+                    self.stats['fetchErrors'] += 1
+                    print(f"Quote API error, retrying in {backoff:g}s: {e}")
+                    self._pause(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    continue
+                backoff = MIN_BACKOFF
+                with self._lock:
+                    self._buffer.extend(quotes)
+                self.stats['fetched'] += len(quotes)
+            self._wakeup.wait()
+
+    def ensure_started(self):
+        """Start the refill thread of this process if it is not running (fork-safe)"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._refill, name='quote-refill', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the refill thread of this process"""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            thread.join(timeout)
+
+    def get_quote(self):
+        """
+        Get a quote without waiting on the network
+
+        :return: Quote dictionary with content, author and category
+        """
+        self.ensure_started()
+        with self._lock:
+            quote = self._buffer.popleft() if self._buffer else None
+            remaining = len(self._buffer)
+        if remaining < self.buffer_size * REFILL_BELOW:
+            self._wakeup.set()
+
+        self.stats['served'] += 1
+        if quote is None:
+            self.stats['offline'] += 1
+            quote = random.choice(self.offline_quotes)
+        return quote
+
+
+# Shared service used by the routes
+quote_service = QuoteService()
+
+
+def get_quote():
+    """
+    Get a quote from the shared service
+
+    :return: Quote dictionary with content, author and category
+    """
+    return quote_service.get_quote()
@@ -0,0 +1,110 @@
+"""
+Per-user version stamps of task lists, for conditional GETs.
+
+Every write that changes a user's tasks also stores a new random stamp on the
+user's 'task_versions' document, in the same batch as the task write, so the
+stamp changes exactly when the list does. GET /tasks/ derives its weak ETag
+from the stamp and can answer If-None-Match with 304 after one single-document
+read instead of streaming every task. Stamps may additionally be cached per
+process for TASK_VERSION_CACHE_TTL seconds; keep the TTL at 0 when several
+processes serve the same users, as a stamp bumped by another process is only
+seen once the cached entry expires.
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from google.api_core.exceptions import Conflict
+
+from ..backends import get_db
+
+# Collection holding one version document per user
+VERSION_COLLECTION = 'task_versions'
+
+# Seconds a version stamp read from the database stays cached (0 disables caching)
+DEFAULT_TTL = float(os.environ.get('TASK_VERSION_CACHE_TTL', 0))
+
+
+def _new_stamp():
+    return uuid.uuid4().hex[:16]
+
+
+class TaskVersions:
+    """
+    Version stamps of users' task lists with an optional per-process TTL cache
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        """
+        Initialize a new TaskVersions instance
+
+        :param ttl: Seconds a stamp read from the database stays valid
+        """
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def version_ref(self, user_id):
+        """Reference of a user's version document"""
+        return get_db().collection(VERSION_COLLECTION).document(user_id)
+
+    def get(self, user_id):
+        """
+        Get the current version stamp of a user's tasks, creating one if the user has none yet
+
+        :param user_id: User ID
+        :return: Version stamp
+        """
+        now = time.monotonic()
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                return entry[0]
+
+        ref = self.version_ref(user_id)
+        doc = ref.get()
+        stamp = (doc.to_dict() or {}).get('version') if doc.exists else None
+        if not stamp:
+            # First conditional request of this user: start versioning their tasks
+            stamp = _new_stamp()
+            try:
+                ref.create({'version': stamp, 'updatedAt': datetime.now().isoformat()})
+            except Conflict:
+                # A concurrent write stored a stamp first; use that one
+                stamp = ref.get().to_dict().get('version')
+
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (stamp, now + self.ttl)
+        return stamp
+
+    def add_to_batch(self, batch, user_id):
+        """
+        Add a new version stamp for a user's tasks to a write batch
+
+        :param batch: Write batch holding the task change
+        :param user_id: Owner of the changed tasks
+        """
+        batch.set(self.version_ref(user_id), {'version': _new_stamp(), 'updatedAt': datetime.now().isoformat()})
+        # The batch may still fail; drop the cached stamp rather than guessing the outcome
+        self.invalidate(user_id)
+
+    def invalidate(self, user_id=None):
+        """
+        Drop cached stamps
+
+        :param user_id: User ID to drop; clears the whole cache if omitted
+        """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+# Shared version stamps used by the routes and models
+task_versions = TaskVersions()
@@ -0,0 +1,106 @@
+"""
+Targeted user-email resolution for admin listings.
+
+Instead of streaming the whole users collection, only the owners referenced by
+the tasks being returned are fetched, in one batched read projected to the
+email field. Resolved emails are kept in a bounded LRU cache.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from ..backends import get_db
+
+# Maximum number of emails kept in the LRU cache
+DEFAULT_CACHE_SIZE = int(os.environ.get('USER_EMAIL_CACHE_SIZE', 4096))
+
+
+class UserEmailCache:
+    """
+    Bounded LRU cache of user emails keyed by user ID
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        """
+        Initialize a new UserEmailCache instance
+
+        :param maxsize: Maximum number of cached emails
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, user_ids):
+        """
+        Get the emails of the given users, fetching cache misses in one batched read
+
+        :param user_ids: Iterable of user IDs
+        :return: Dictionary mapping user ID to email (unknown users are left out)
+        """
+        user_ids = {user_id for user_id in user_ids if user_id}
+        emails = {}
+        missing = []
+
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in self._entries:
+                    self._entries.move_to_end(user_id)
+                    emails[user_id] = self._entries[user_id]
+                else:
+                    missing.append(user_id)
+
+        if not missing:
+            return emails
+
+        db = get_db()
+        refs = [db.collection('users').document(user_id) for user_id in missing]
+        fetched = {}
+        for doc in db.get_all(refs, field_paths=['email']):
+            if doc.exists:
+                fetched[doc.id] = (doc.to_dict() or {}).get('email', 'Unknown')
+
+        with self._lock:
+            for user_id, email in fetched.items():
+                self._entries[user_id] = email
+                self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        emails.update(fetched)
+        return emails
+
+    def forget(self, user_id=None):
+        """
+        Drop cached emails
+
+        :param user_id: User ID to drop; clears the whole cache if omitted
+        """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+# Shared cache used by the routes
+user_emails = UserEmailCache()
+
+
+def resolve_user_emails(user_ids):
+    """
+    Map user IDs to emails using the shared cache
+
+    :param user_ids: Iterable of user IDs
+    :return: Dictionary mapping user ID to email
+    """
+    return user_emails.resolve(user_ids)
+
+
+def forget_user_email(user_id=None):
+    """
+    Forget the cached email of a user (or of everyone)
+
+    :param user_id: User ID, or None to clear the whole cache
+    """
+    user_emails.forget(user_id)
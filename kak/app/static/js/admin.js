@@ -10,6 +10,12 @@ document.addEventListener('DOMContentLoaded', function() {
     const noAllTasksMessage = document.getElementById('no-all-tasks-message');
     const searchAllTasks = document.getElementById('searchAllTasks');
     const categoryFilterAdmin = document.getElementById('categoryFilterAdmin');
+    const loadMoreAllTasksContainer = document.getElementById('load-more-all-tasks-container');
+    const loadMoreAllTasksBtn = document.getElementById('loadMoreAllTasks');
+    
+    // Define variables for the background job queue card
+    const refreshJobStatsBtn = document.getElementById('refreshJobStats');
+    const retryFailedJobsBtn = document.getElementById('retryFailedJobs');
     
     // Set up variables for the edit user modal window
     const editUserModal = new bootstrap.Modal(document.getElementById('editUserModal'));
@@ -29,6 +35,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // Create arrays to store user and task data
     let users = [];
     let allTasks = [];
+    // Number of tasks requested per page and token of the next page (null when all are loaded)
+    const ALL_TASKS_PAGE_SIZE = 100;
+    let nextAllTasksCursor = null;
     
     // Start the initialization function
     init();
@@ -46,6 +55,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Load user and task data from the server
         loadUsers();
         loadAllTasks();
+        loadJobStats();
         
         // Set up event listeners for buttons and inputs
         setupEventListeners();
@@ -59,6 +69,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // Add an event listener for the task search input
         searchAllTasks?.addEventListener('input', filterAllTasks);
         
+        // Add an event listener for loading the next page of tasks
+        loadMoreAllTasksBtn?.addEventListener('click', loadMoreAllTasks);
+        
         // Add an event listener for the category filter dropdown
         categoryFilterAdmin?.addEventListener('change', filterAllTasks);
         
@@ -67,6 +80,41 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Add an event listener for the confirm delete user button
         confirmDeleteUser?.addEventListener('click', deleteUser);
+        
+        // Add event listeners for the background job queue buttons
+        refreshJobStatsBtn?.addEventListener('click', loadJobStats);
+        retryFailedJobsBtn?.addEventListener('click', retryFailedJobs);
+    }
+    
+    // Function to fetch the background job queue depth from the server
+    async function loadJobStats() {
+        try {
+            const response = await fetch('/auth/admin/jobs');
+            if (!response.ok) {
+                throw new Error('Failed to load job queue stats');
+            }
+            
+            const stats = await response.json();
+            document.getElementById('jobs-queued').textContent = stats.queued;
+            document.getElementById('jobs-running').textContent = stats.running;
+            document.getElementById('jobs-failed').textContent = stats.failed;
+            document.getElementById('jobs-oldest').textContent = stats.oldestQueuedSeconds ?? '-';
+        } catch (error) {
+            console.error('Error loading job queue stats:', error);
+        }
+    }
+    
+    // Function to queue every failed background job again
+    async function retryFailedJobs() {
+        try {
+            const response = await fetch('/auth/admin/jobs/retry', { method: 'POST' });
+            if (!response.ok) {
+                throw new Error('Failed to retry jobs');
+            }
+            loadJobStats();
+        } catch (error) {
+            console.error('Error retrying failed jobs:', error);
+        }
     }
     
     // Function to check if a user has admin privileges
@@ -206,16 +254,11 @@ document.addEventListener('DOMContentLoaded', function() {
             // Show a loading spinner while tasks are being fetched
             allTasksTableBody.innerHTML = '<tr><td colspan="6" class="text-center"><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></td></tr>';
             
-            // Make a request to the server to get all tasks
-            const response = await fetch('/tasks/admin/all');
-            
-            // Check if the request was successful
-            if (!response.ok) {
-                throw new Error('Failed to load tasks');
-            }
-            
-            // Parse the JSON response and store tasks in the allTasks array
-            allTasks = await response.json();
+            // Request the first page of tasks and store them in the allTasks array
+            const page = await fetchAllTasksPage(null);
+            allTasks = page.tasks;
+            nextAllTasksCursor = page.nextCursor;
+            loadMoreAllTasksContainer?.classList.toggle('d-none', !nextAllTasksCursor);
             // Filter and display the tasks
             filterAllTasks();
         } catch (error) {
@@ -225,7 +268,46 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Function to filter and display tasks based on search and category
+    // Function to fetch one page of tasks, starting after the given cursor
+    async function fetchAllTasksPage(cursor) {
+        const params = new URLSearchParams({ limit: ALL_TASKS_PAGE_SIZE });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        
+        // Make a request to the server for the page
+        const response = await fetch(`/tasks/admin/all?${params}`);
+        
+        // Check if the request was successful
+        if (!response.ok) {
+            throw new Error('Failed to load tasks');
+        }
+        
+        return response.json();
+    }
+    
+    // Function to append the next page of tasks to the table
+    async function loadMoreAllTasks() {
+        if (!nextAllTasksCursor) {
+            return;
+        }
+        
+        loadMoreAllTasksBtn.disabled = true;
+        try {
+            const page = await fetchAllTasksPage(nextAllTasksCursor);
+            allTasks = allTasks.concat(page.tasks);
+            nextAllTasksCursor = page.nextCursor;
+            loadMoreAllTasksContainer?.classList.toggle('d-none', !nextAllTasksCursor);
+            filterAllTasks();
+        } catch (error) {
+            console.error('Error loading more tasks:', error);
+            alert('Error loading more tasks: ' + error.message);
+        } finally {
+            loadMoreAllTasksBtn.disabled = false;
+        }
+    }
+    
+    // Function to filter and display tasks based on search and category (over the loaded pages only)
     function filterAllTasks() {
         // Get the search term and category filter values
         const searchTerm = searchAllTasks?.value.toLowerCase().trim() || '';
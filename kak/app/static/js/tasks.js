@@ -7,6 +7,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const completedTasksCount = document.getElementById('completed-tasks');
     const pendingTasksCount = document.getElementById('pending-tasks');
     const searchInput = document.getElementById('searchTasks');
+    const loadMoreTasksContainer = document.getElementById('load-more-tasks-container');
+    const loadMoreTasksBtn = document.getElementById('loadMoreTasks');
     
     // Task modal elements
     const taskModal = new bootstrap.Modal(document.getElementById('taskModal'));
@@ -32,6 +34,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Store tasks data
     let tasks = [];
+    // Number of tasks requested per page and token of the next page (null when all are loaded)
+    const TASKS_PAGE_SIZE = 50;
+    let nextTasksCursor = null;
     let originalTaskImageUrl = null;
     let shouldRemoveImage = false;
     
@@ -115,7 +120,7 @@ document.addEventListener('DOMContentLoaded', function() {
         filterTasks(statusFilter, categoryFilter, urgencyFilter, searchTerm);
     }
     
-    // Filter tasks based on status, category, urgency and search term
+    // Filter tasks based on status, category, urgency and search term (over the loaded pages only)
     function filterTasks(statusFilter = 'all', categoryFilter = 'all', urgencyFilter = 'all', searchTerm = '') {
         let filteredTasks = [...tasks];
         
@@ -153,13 +158,10 @@ document.addEventListener('DOMContentLoaded', function() {
             // Show loading state
             tasksList.innerHTML = '<div class="spinner-container"><div class="spinner-border text-primary" role="status"><span class="visually-hidden">Loading...</span></div></div>';
             
-            const response = await fetch('/tasks/');
-            
-            if (!response.ok) {
-                throw new Error('Failed to load tasks');
-            }
-            
-            tasks = await response.json();
+            const page = await fetchTasksPage(null);
+            tasks = page.tasks;
+            nextTasksCursor = page.nextCursor;
+            updateLoadMoreButton();
             
             // Update counts
             updateTaskCounts();
@@ -172,6 +174,49 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Fetch one page of tasks, starting after the given cursor
+    async function fetchTasksPage(cursor) {
+        const params = new URLSearchParams({ limit: TASKS_PAGE_SIZE });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        
+        const response = await fetch(`/tasks/?${params}`);
+        
+        if (!response.ok) {
+            throw new Error('Failed to load tasks');
+        }
+        
+        return response.json();
+    }
+    
+    // Show the load more button only while there are more pages
+    function updateLoadMoreButton() {
+        loadMoreTasksContainer?.classList.toggle('d-none', !nextTasksCursor);
+    }
+    
+    // Load the next page of tasks and append it to the list
+    loadMoreTasksBtn?.addEventListener('click', async function() {
+        if (!nextTasksCursor) {
+            return;
+        }
+        
+        loadMoreTasksBtn.disabled = true;
+        try {
+            const page = await fetchTasksPage(nextTasksCursor);
+            tasks = tasks.concat(page.tasks);
+            nextTasksCursor = page.nextCursor;
+            updateLoadMoreButton();
+            updateTaskCounts();
+            applyFilters();
+        } catch (error) {
+            console.error('Error loading more tasks:', error);
+            alert('Error loading more tasks: ' + error.message);
+        } finally {
+            loadMoreTasksBtn.disabled = false;
+        }
+    });
+    
     // Render tasks to the UI
     function renderTasks(filteredTasks = null) {
         const tasksToRender = filteredTasks || tasks;
@@ -228,7 +273,7 @@ document.addEventListener('DOMContentLoaded', function() {
                             ${statusBadge}
                         </div>
                     </div>
-                    ${task.imageUrl ? `<img src="${task.imageUrl}" class="task-image" alt="${task.title}">` : ''}
+                    ${task.imageUrl ? `<img src="${task.imageRenditions?.thumbnail || task.imageUrl}" class="task-image" alt="${task.title}" loading="lazy">` : ''}
                     <div class="card-body">
                         <p class="card-text">${task.description || 'No description'}</p>
                         ${dueDateHtml}
@@ -289,20 +334,22 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Update task counts
+    // Update task counts (over the loaded pages: shown as "N+" while more pages remain)
     function updateTaskCounts() {
+        const suffix = nextTasksCursor ? '+' : '';
+        
         if (totalTasksCount) {
-            totalTasksCount.textContent = tasks.length;
+            totalTasksCount.textContent = tasks.length + suffix;
         }
         
         if (completedTasksCount) {
             const completed = tasks.filter(task => task.status === 'completed').length;
-            completedTasksCount.textContent = completed;
+            completedTasksCount.textContent = completed + suffix;
         }
         
         if (pendingTasksCount) {
             const pending = tasks.filter(task => task.status === 'pending').length;
-            pendingTasksCount.textContent = pending;
+            pendingTasksCount.textContent = pending + suffix;
         }
     }
     
@@ -363,7 +410,7 @@ document.addEventListener('DOMContentLoaded', function() {
             // Set image if exists
             if (task.imageUrl) {
                 currentImageContainer.classList.remove('d-none');
-                currentTaskImage.src = task.imageUrl;
+                currentTaskImage.src = task.imageRenditions?.medium || task.imageUrl;
                 originalTaskImageUrl = task.imageUrl;
             }
             
@@ -0,0 +1,218 @@
+"""
+Response compression negotiated through Accept-Encoding.
+
+Dynamic JSON, HTML and text responses larger than COMPRESS_MIN_SIZE are
+compressed with brotli (when the optional 'brotli' package is installed and the
+client accepts it) or gzip; streamed JSON listings are gzip-compressed
+incrementally as they are produced. Static files are compressed once, at
+start-up or with `flask precompress-static`, into STATIC_COMPRESSED_FOLDER and
+served from there without per-request CPU.
+"""
+
+import gzip
+import mimetypes
+import os
+import zlib
+
+import click
+from flask import current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # optional dependency: gzip only
+    brotli = None
+
+# Smallest response body in bytes worth compressing
+DEFAULT_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+# Compression levels for dynamic responses (fast) and static files (smallest)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+# Mimetypes that compress well
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'text/plain',
+    'image/svg+xml'
+}
+
+# Static file extensions that are precompressed
+STATIC_EXTENSIONS = ('.js', '.css', '.html', '.svg', '.json', '.txt')
+
+# Encodings in order of preference, with the suffix of their precompressed files
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _available_encodings():
+    return [(name, suffix) for name, suffix in _ENCODINGS if name != 'br' or brotli is not None]
+
+
+def negotiate_encoding():
+    """
+    Pick the best content coding the client accepts
+
+    :return: 'br', 'gzip' or None
+    """
+    accepted = request.accept_encodings
+    for name, _ in _available_encodings():
+        if accepted.quality(name) > 0:
+            return name
+    return None
+
+
+def _compress(data, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+def _gzip_stream(chunks):
+    """Gzip an iterable of response chunks as they are produced"""
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        # zlib buffers internally, so tiny chunks do not produce tiny blocks
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    yield compressor.flush()
+
+
+def compress_response(response):
+    """
+    Compress a dynamic response if the client accepts it and it is worth it (after_request hook)
+
+    :param response: Flask response
+    :return: The same response, possibly compressed
+    """
+    if (response.status_code < 200 or response.status_code == 204 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    # Files sent with send_file (static assets) are handled by the static view
+    if response.direct_passthrough:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Unknown length: gzip incrementally as the body is produced
+        if request.accept_encodings.quality('gzip') <= 0:
+            return response
+        response.response = _gzip_stream(response.response)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers.pop('Content-Length', None)
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+        return response
+
+    compressed = _compress(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def precompress_static(app):
+    """
+    Write .br/.gz copies of the static files that are missing or older than their source
+
+    :param app: Flask application
+    :return: Number of files written
+    """
+    source_root = app.static_folder
+    target_root = app.config['STATIC_COMPRESSED_FOLDER']
+    written = 0
+    for directory, _, filenames in os.walk(source_root):
+        for filename in filenames:
+            if not filename.endswith(STATIC_EXTENSIONS):
+                continue
+            source = os.path.join(directory, filename)
+            relative = os.path.relpath(source, source_root)
+            source_mtime = os.path.getmtime(source)
+            data = None
+            for encoding, suffix in _available_encodings():
+                target = os.path.join(target_root, relative + suffix)
+                if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    continue
+                if data is None:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # Write then rename, so concurrent workers never serve a partial file
+                partial = f'{target}.{os.getpid()}.tmp'
+                with open(partial, 'wb') as f:
+                    f.write(_compress(data, encoding, static=True))
+                os.replace(partial, target)
+                written += 1
+    return written
+
+
+def send_static_file(filename):
+    """
+    Serve a static file, from its precompressed copy when the client accepts one (static view)
+
+    :param filename: Path below the static folder
+    :return: Flask response
+    """
+    app = current_app
+    max_age = app.get_send_file_max_age(filename)
+    response = None
+    if filename.endswith(STATIC_EXTENSIONS):
+        accepted = request.accept_encodings
+        for encoding, suffix in _available_encodings():
+            if accepted.quality(encoding) <= 0:
+                continue
+            try:
+                response = send_from_directory(app.config['STATIC_COMPRESSED_FOLDER'], filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0], max_age=max_age)
+            except NotFound:
+                continue
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(app.static_folder, filename, max_age=max_age)
+    if filename.endswith(STATIC_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    """
+    Compress dynamic responses and serve precompressed static files
+
+    :param app: Flask application
+    """
+    app.config.setdefault('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    app.config.setdefault('STATIC_COMPRESSED_FOLDER', os.environ.get(
+        'STATIC_COMPRESSED_FOLDER', os.path.join(app.instance_path, 'static_compressed')))
+
+    try:
+        written = precompress_static(app)
+        if written:
+            print(f"Precompressed {written} static files")
+    except OSError as e:
+        # Read-only deployment: static files are served uncompressed
+        print(f"Cannot precompress static files: {e}")
+
+    app.after_request(compress_response)
+    app.view_functions['static'] = send_static_file
+
+    @app.cli.command('precompress-static')
+    def precompress_static_command():
+        """Compress the static files ahead of deployment"""
+        click.echo(f"Precompressed {precompress_static(app)} static files")
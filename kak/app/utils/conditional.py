@@ -0,0 +1,48 @@
+"""
+Weak ETags and If-None-Match handling for JSON endpoints.
+
+Responses carry Cache-Control: private, no-cache, so browsers keep the body
+but revalidate it on every request; fetch() then sends If-None-Match by itself
+and transparently reuses the cached body when the server answers 304.
+"""
+
+import hashlib
+
+from flask import Response, request
+
+
+def weak_etag(*parts):
+    """
+    Build an opaque ETag value from the parts that determine a response body
+
+    :param parts: Values that change whenever the body changes
+    :return: ETag value (unquoted, to be sent as a weak tag)
+    """
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8'))
+    return digest.hexdigest()[:20]
+
+
+def not_modified(etag):
+    """
+    Answer 304 if the client already holds the representation with this ETag
+
+    :param etag: ETag value from weak_etag
+    :return: 304 response, or None if the body has to be sent
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """
+    Attach a weak ETag and revalidation caching headers to a response
+
+    :param response: Flask response
+    :param etag: ETag value from weak_etag
+    :return: The same response
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
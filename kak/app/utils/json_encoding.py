@@ -0,0 +1,112 @@
+"""
+Pluggable JSON encoding for jsonify and streamed responses.
+
+Flask 2.0 has no JSON provider interface yet; its extension point is
+app.json_encoder, whose encode() method is what flask.json.dumps (and so
+jsonify and stream_json_array) ends up calling. JSON_ENCODER selects the
+encoder: 'orjson' hands whole documents to orjson, 'stdlib' keeps the standard
+library encoder, and 'auto' (the default) uses orjson when it is installed.
+The orjson encoder falls back to the standard library for the few inputs orjson
+does not support (indents other than 2, integers beyond 64 bits).
+
+Both encoders write Firestore timestamps (DatetimeWithNanoseconds) as ISO 8601
+strings, like the timestamps the app stores itself, and an unresolved
+SERVER_TIMESTAMP as the current UTC time, i.e. the value the server is about
+to store.
+"""
+
+import os
+from datetime import date, datetime, timezone
+
+from firebase_admin import firestore
+from flask import current_app
+from flask.json import JSONEncoder as FlaskJSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency: standard library only
+    orjson = None
+
+# Default encoder name ('auto', 'orjson' or 'stdlib')
+DEFAULT_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+
+
+class JSONEncoder(FlaskJSONEncoder):
+    """
+    Standard library encoder that understands Firestore values
+    """
+
+    def default(self, o):
+        # DatetimeWithNanoseconds is a datetime subclass
+        if isinstance(o, (datetime, date)):
+            return o.isoformat()
+        if o is firestore.SERVER_TIMESTAMP:
+            return datetime.now(timezone.utc).isoformat()
+        return super().default(o)
+
+
+class OrjsonEncoder(JSONEncoder):
+    """
+    Encoder that serializes with orjson, using JSONEncoder.default for other types
+    """
+
+    def encode(self, o):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent is not None:
+            if self.indent != 2:
+                return super().encode(o)
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            # Unsupported by orjson (e.g. big integers); the standard encoder raises if it is really invalid
+            return super().encode(o)
+
+
+# Encoders selectable through JSON_ENCODER
+ENCODERS = {
+    'stdlib': JSONEncoder,
+    'orjson': OrjsonEncoder
+}
+
+
+def get_encoder(name=DEFAULT_ENCODER):
+    """
+    Get the encoder class for a JSON_ENCODER setting
+
+    :param name: 'auto', 'orjson' or 'stdlib'
+    :return: JSONEncoder subclass
+    """
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown JSON_ENCODER {name!r}, expected one of: auto, {', '.join(ENCODERS)}")
+    if name == 'orjson' and orjson is None:
+        raise ValueError("JSON_ENCODER is 'orjson' but orjson is not installed")
+    return ENCODERS[name]
+
+
+def item_encoder():
+    """
+    Get an encode function configured like flask.json.dumps, for serializing many
+    values one by one without flask.json.dumps' per-call setup
+
+    :return: Callable taking a value and returning its JSON string
+    """
+    encoder = current_app.json_encoder(
+        ensure_ascii=current_app.config['JSON_AS_ASCII'],
+        sort_keys=current_app.config['JSON_SORT_KEYS']
+    )
+    return encoder.encode
+
+
+def init_app(app):
+    """
+    Install the configured JSON encoder
+
+    :param app: Flask application
+    """
+    app.config.setdefault('JSON_ENCODER', DEFAULT_ENCODER)
+    app.json_encoder = get_encoder(app.config['JSON_ENCODER'])
@@ -0,0 +1,40 @@
+"""
+Helpers for files kept in the storage bucket.
+"""
+
+
+# Folders holding task images: the task routes upload to image_photo, Task.attach_image to task_images
+TASK_IMAGE_FOLDERS = ('image_photo', 'task_images')
+
+
+def image_blob_name(image_url, folder):
+    """
+    Get the storage path of an uploaded image from its public URL
+
+    Handles both storage.googleapis.com URLs (.../folder/name) and Firebase
+    download URLs (.../o/folder%2Fname?alt=media).
+
+    :param image_url: Public URL of the image
+    :param folder: Storage folder of the image (e.g. 'image_photo')
+    :return: Blob name, or None if the URL does not point into the folder
+    """
+    if not image_url:
+        return None
+    path = image_url.split('?')[0].replace('%2F', '/')
+    marker = f'/{folder}/'
+    if marker not in path:
+        return None
+    return f'{folder}/{path.split(marker, 1)[1]}'
+
+
+def task_image_folder(image_url):
+    """
+    Get the storage folder of a task image from its URL
+
+    :param image_url: Public URL of the image
+    :return: One of TASK_IMAGE_FOLDERS ('image_photo' when the URL points into neither)
+    """
+    for folder in TASK_IMAGE_FOLDERS:
+        if image_blob_name(image_url, folder):
+            return folder
+    return TASK_IMAGE_FOLDERS[0]
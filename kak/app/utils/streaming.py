@@ -0,0 +1,36 @@
+"""
+Streaming JSON responses for large listings.
+"""
+
+from flask import Response, stream_with_context
+
+from .json_encoding import item_encoder
+
+
+def stream_json_array(items, status=200):
+    """
+    Stream an iterable as a JSON array, one element at a time.
+
+    The opening bracket is sent immediately and every element is serialized as it
+    is produced, so memory stays flat however many items the iterable yields.
+
+    :param items: Iterable (typically a generator over a Firestore stream()) of JSON-serializable values
+    :param status: HTTP status code
+    :return: Flask Response
+    """
+    def generate():
+        # One configured encoder for all elements instead of flask.json.dumps per element
+        encode = item_encoder()
+        yield '['
+        separator = ''
+        try:
+            for item in items:
+                yield separator + encode(item)
+                separator = ','
+        except Exception as e:
+            # Headers are already sent: log and cut the stream so the client sees invalid JSON
+            print(f"Error while streaming response: {e}")
+            raise
+        yield ']'
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/json')
@@ -0,0 +1,170 @@
+"""
+Upload pipeline for images sent as multipart form data.
+
+Werkzeug normally spools every uploaded file larger than 500KB to a temporary
+file on disk, and the routes then copied it into a second temporary file before
+handing it to the storage client. Here the multipart parser writes each file
+part into a capped in-memory spool (only parts above UPLOAD_SPOOL_SIZE spill to
+disk), the part is rejected with 413 as soon as it exceeds MAX_UPLOAD_SIZE, and
+the spool is passed straight to blob.upload_from_file, which sends it in
+UPLOAD_CHUNK_SIZE chunks. The spool computes the SHA-256 of the part while it
+is written, for content-addressed storage.
+"""
+
+import hashlib
+import os
+from tempfile import SpooledTemporaryFile
+
+from flask import Request, current_app, has_app_context
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Largest accepted file part in bytes
+DEFAULT_MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+
+# Bytes of a file part held in memory before it spills to a temporary file
+DEFAULT_SPOOL_SIZE = int(os.environ.get('UPLOAD_SPOOL_SIZE', 16 * 1024 * 1024))
+
+# Chunk size of resumable uploads to Cloud Storage (a multiple of 256KB)
+DEFAULT_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+# Allowance for the non-file form fields when capping the whole request body
+FORM_OVERHEAD = 64 * 1024
+
+_STORAGE_CHUNK_ALIGNMENT = 256 * 1024
+
+
+class UploadTooLarge(RequestEntityTooLarge):
+    """Raised while parsing when a file part exceeds the upload size cap"""
+
+    def __init__(self, max_size):
+        super().__init__(f'File is larger than the {max_size // (1024 * 1024)}MB upload limit')
+        self.max_size = max_size
+
+
+class CappedSpool(SpooledTemporaryFile):
+    """
+    In-memory spool for one file part that refuses to grow past a size cap
+    and hashes the content as it arrives
+    """
+
+    def __init__(self, max_size, spool_size):
+        """
+        Initialize a new CappedSpool instance
+
+        :param max_size: Largest accepted part in bytes
+        :param spool_size: Bytes kept in memory before spilling to disk
+        """
+        super().__init__(max_size=spool_size, mode='w+b')
+        self.cap = max_size
+        self.written = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.cap:
+            raise UploadTooLarge(self.cap)
+        self.sha256.update(data)
+        return super().write(data)
+
+    def hexdigest(self):
+        """SHA-256 of everything written so far"""
+        return self.sha256.hexdigest()
+
+    def getvalue(self):
+        """Everything written so far; the spool's own buffer (not a copy) while it is in memory"""
+        if not self._rolled:
+            return self._file.getvalue()
+        position = self.tell()
+        self.seek(0)
+        data = self.read()
+        self.seek(position)
+        return data
+
+
+class UploadRequest(Request):
+    """
+    Request class whose multipart file parts go to capped in-memory spools
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config if has_app_context() else {}
+        max_size = config.get('MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+        if content_length is not None and content_length > max_size:
+            raise UploadTooLarge(max_size)
+        return CappedSpool(max_size, min(max_size, config.get('UPLOAD_SPOOL_SIZE', DEFAULT_SPOOL_SIZE)))
+
+
+def init_app(app):
+    """
+    Install the upload request class and cap request bodies
+
+    :param app: Flask application
+    """
+    app.config.setdefault('MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+    app.config.setdefault('UPLOAD_SPOOL_SIZE', DEFAULT_SPOOL_SIZE)
+    app.config.setdefault('UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    # Refuse oversized bodies before reading them (bulk JSON bodies are allowed the same size)
+    app.config.setdefault('MAX_CONTENT_LENGTH', app.config['MAX_UPLOAD_SIZE'] + FORM_OVERHEAD)
+    app.request_class = UploadRequest
+
+
+def upload_file(file, blob, chunk_size=None):
+    """
+    Upload a received file to a blob straight from its spool and make it public
+
+    :param file: werkzeug FileStorage from request.files
+    :param blob: Destination blob
+    :param chunk_size: Resumable upload chunk size in bytes (defaults to UPLOAD_CHUNK_SIZE)
+    :return: Public URL of the blob
+    """
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    # Cloud Storage blobs upload in resumable chunks when chunk_size is set
+    if hasattr(blob, 'chunk_size'):
+        if not chunk_size:
+            config = current_app.config if has_app_context() else {}
+            chunk_size = config.get('UPLOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        blob.chunk_size = max(_STORAGE_CHUNK_ALIGNMENT, chunk_size - chunk_size % _STORAGE_CHUNK_ALIGNMENT)
+
+    blob.upload_from_file(stream, size=size, content_type=file.mimetype or None)
+    blob.make_public()
+    return blob.public_url
+
+
+def file_digest(file):
+    """
+    Get the SHA-256 of a received file, computed while it was parsed when possible
+
+    :param file: werkzeug FileStorage from request.files
+    :return: Hex digest
+    """
+    stream = file.stream
+    if isinstance(stream, CappedSpool):
+        return stream.hexdigest()
+
+    # File not parsed by UploadRequest: hash it now
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(DEFAULT_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest()
+
+
+def spooled_content(stream):
+    """
+    Get the content of a received file without moving its read position
+
+    :param stream: Upload stream (a CappedSpool when parsed by UploadRequest)
+    :return: Bytes
+    """
+    if hasattr(stream, 'getvalue'):
+        return stream.getvalue()
+    position = stream.tell()
+    stream.seek(0)
+    data = stream.read()
+    stream.seek(position)
+    return data
@@ -0,0 +1,139 @@
+"""
+Populate the configured datastore with synthetic data for load tests.
+
+Writes users, categories, admins and tasks (benchmarks/synthetic.py) into the
+backend selected by DATASTORE_BACKEND and the rest of the app configuration
+(.env is loaded like app.py does), so a server started with the same settings
+serves them. Task counts per user follow a Zipf-like skew; a share of the
+tasks reference a pool of generated images, which are uploaded once, with
+their renditions, through the same content-addressed storage as uploads.
+
+The memory backend lives inside one process and cannot be populated from here;
+use sqlite for a local server. Writing to Firestore requires --yes.
+
+Usage (from the kak directory):
+    DATASTORE_BACKEND=sqlite python benchmarks/generate_data.py [--users 10000] [--tasks 1000000]
+        [--admins 3] [--skew 0.8] [--images 50] [--image-fraction 0.2] [--seed 42]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from firebase_admin import firestore
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import synthetic
+from app import create_app
+from app.backends import get_backend_name, get_bucket, get_db
+from app.services import images as image_storage
+from app.utils.storage import image_blob_name
+
+
+def make_image(index, size=(640, 480)):
+    """
+    Render a distinct JPEG
+
+    :param index: Image number (decides the colours)
+    :param size: Width and height in pixels
+    :return: JPEG bytes
+    """
+    image = Image.new('RGB', size, ((index * 53) % 256, (index * 97) % 256, (index * 29) % 256))
+    # A gradient band, so the renditions are not trivially small
+    for x in range(0, size[0], 8):
+        shade = (x * 255 // size[0], (index * 13) % 256, 255 - x * 255 // size[0])
+        image.paste(shade, (x, size[1] // 3, x + 8, 2 * size[1] // 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def upload_images(count):
+    """
+    Store a pool of images as if they had been uploaded with a task
+
+    :param count: Number of distinct images
+    :return: List of (URL, renditions) tuples
+    """
+    bucket = get_bucket()
+    pool = []
+    for index in range(count):
+        file = FileStorage(stream=io.BytesIO(make_image(index)), filename=f'synthetic{index}.jpg',
+                           content_type='image/jpeg')
+        pool.append(image_storage.store_image(file, bucket, 'image_photo'))
+    return pool
+
+
+def count_image_references(pool, uses):
+    """
+    Set the reference count of every pooled image to the number of tasks using it
+    (store_image took one reference, which is released here if no task uses the image)
+
+    :param pool: List of (URL, renditions) tuples
+    :param uses: Counter of tasks by index in pool
+    """
+    db = get_db()
+    for index, (url, renditions) in enumerate(pool):
+        if not uses[index]:
+            image_storage.release_image(url, renditions, 'image_photo')
+            continue
+        blob_name = image_blob_name(url, 'image_photo')
+        refs = db.collection(image_storage.REFS_COLLECTION).where('blobName', '==', blob_name).limit(1).get()
+        for ref in refs:
+            db.collection(image_storage.REFS_COLLECTION).document(ref.id).update({
+                'refCount': firestore.Increment(uses[index] - 1)
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10_000, help='users')
+    parser.add_argument('--tasks', type=int, default=1_000_000, help='tasks')
+    parser.add_argument('--admins', type=int, default=3, help='users with an active admin record')
+    parser.add_argument('--skew', type=float, default=0.8, help='Zipf exponent of the tasks per user (0: even)')
+    parser.add_argument('--images', type=int, default=50, help='distinct images in the pool')
+    parser.add_argument('--image-fraction', type=float, default=0.2, help='share of tasks with an image')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--yes', action='store_true', help='allow writing to Firestore')
+    args = parser.parse_args()
+
+    load_dotenv()
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+    backend = get_backend_name()
+    if backend == 'memory':
+        sys.exit('The memory backend cannot be populated from another process; use DATASTORE_BACKEND=sqlite')
+    if backend == 'firestore' and not args.yes:
+        sys.exit('This would write to the Firestore project of the app; pass --yes to continue')
+
+    started = time.perf_counter()
+    with app.app_context():
+        pool = upload_images(args.images) if args.image_fraction > 0 else []
+        print(f"Stored {len(pool)} images")
+
+        def progress(written):
+            if written % 50_000 == 0:
+                print(f"  {written} tasks written")
+
+        result = synthetic.populate(get_db(), users=args.users, tasks=args.tasks, admins=args.admins,
+                                    seed=args.seed, skew=args.skew, images=pool,
+                                    image_fraction=args.image_fraction, progress=progress)
+        count_image_references(pool, result['imageUses'])
+
+    counts = sorted(result['taskCounts'].values(), reverse=True)
+    print(f"Wrote {args.users} users, {args.admins} admins and {args.tasks} tasks to the {backend} backend "
+          f"in {time.perf_counter() - started:.1f}s")
+    print(f"Tasks per user: max {counts[0]}, median {counts[len(counts) // 2]}, min {counts[-1]}; "
+          f"{sum(result['imageUses'].values())} tasks with an image")
+    print(f"Admin user: {synthetic.user_id(0)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of JSON serialization of task listings.
+
+Serializes N synthetic task documents, shaped like the ones Firestore returns
+(DatetimeWithNanoseconds createdAt, image rendition maps), with every encoder
+available, both the way jsonify encodes a whole list and the way
+stream_json_array encodes one task at a time (/tasks/admin/all).
+
+Usage (from the kak directory):
+    python benchmarks/json_serialization.py [--tasks 10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from app.utils import json_encoding
+
+
+def make_tasks(count, seed=42):
+    """
+    Build task dictionaries like the ones read from the tasks collection
+
+    :param count: Number of tasks
+    :param seed: Random seed, so runs are comparable
+    :return: List of task dictionaries
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    tasks = []
+    for index in range(count):
+        created = start + timedelta(seconds=rng.randrange(30_000_000))
+        task = {
+            'id': f'task{index:07d}',
+            'title': f'Task {index}: ' + ' '.join(rng.choice(['buy', 'call', 'fix', 'write', 'plan', 'review'])
+                                                  for _ in range(4)),
+            'description': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * rng.randint(0, 4),
+            'userId': f'user{rng.randrange(500):04d}',
+            'status': rng.choice(['pending', 'in-progress', 'completed']),
+            'category': rng.choice(['work', 'personal', 'shopping', 'health', 'other']),
+            'urgency': rng.choice(['low', 'medium', 'high']),
+            'dueDate': (created + timedelta(days=rng.randint(1, 30))).date().isoformat(),
+            'createdAt': DatetimeWithNanoseconds(created.year, created.month, created.day, created.hour,
+                                                 created.minute, created.second, rng.randrange(1_000_000),
+                                                 tzinfo=timezone.utc),
+            'updatedAt': created.replace(tzinfo=None).isoformat(),
+            'imageUrl': None
+        }
+        if rng.random() < 0.3:
+            name = f'image_photo/sha256-{rng.getrandbits(256):064x}'
+            task['imageUrl'] = f'https://storage.googleapis.com/bucket/{name}.jpg'
+            task['imageRenditions'] = {
+                'thumbnail': f'https://storage.googleapis.com/bucket/{name}.thumbnail.jpg',
+                'medium': f'https://storage.googleapis.com/bucket/{name}.medium.jpg'
+            }
+        tasks.append(task)
+    return tasks
+
+
+def measure(function, repeat):
+    """Run a function repeatedly and return the median duration in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=10_000, help='number of tasks to serialize')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (the median is shown)')
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.tasks)
+    encoders = ['stdlib'] + (['orjson'] if json_encoding.orjson is not None else [])
+    print(f"Serializing {args.tasks} tasks, median of {args.repeat} runs\n")
+    print(f"{'encoder':<10}{'jsonify (ms)':>14}{'streamed (ms)':>15}{'bytes':>12}")
+
+    baseline = None
+    for name in encoders:
+        app = Flask(__name__)
+        app.config['JSON_ENCODER'] = name
+        json_encoding.init_app(app)
+        with app.test_request_context():
+            size = len(jsonify(tasks).get_data())
+            whole = measure(lambda: jsonify(tasks).get_data(), args.repeat)
+            encode = json_encoding.item_encoder()
+            streamed = measure(lambda: [encode(task) for task in tasks], args.repeat)
+        baseline = baseline or whole
+        print(f"{name:<10}{whole:>14.1f}{streamed:>15.1f}{size:>12}   ({baseline / whole:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
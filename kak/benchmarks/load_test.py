@@ -0,0 +1,351 @@
+"""
+Multi-threaded load driver for a running server.
+
+Replays a weighted mix of requests against a server populated with
+benchmarks/generate_data.py and reports throughput and latency percentiles per
+operation, e.g. to compare gunicorn worker counts:
+
+    gunicorn -w 4 -b 127.0.0.1:8000 app:app
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --threads 32 --duration 60
+
+Each thread is a closed loop (send, wait for the answer, optionally think, send
+the next), acting for users picked with the same skew as the generated data,
+so heavy users are also the most active. Sessions are signed locally with the
+server's SECRET_KEY, since logging in needs Firebase Authentication. Updates
+and reads target tasks seen in earlier listings; deletes only remove tasks the
+driver created.
+
+Operations (--mix name=weight,...): list (GET /tasks/), page (GET /tasks/?limit=50),
+get, create, update, delete, bulk (20 updates), categories, admin_tasks
+(GET /tasks/admin/all?limit=50) and admin_users (GET /auth/users).
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+
+DEFAULT_MIX = 'list=40,page=10,get=15,create=10,update=12,delete=5,bulk=2,categories=4,admin_tasks=1,admin_users=1'
+
+# Task IDs remembered per user from listings
+KNOWN_TASKS_PER_USER = 100
+
+
+def session_cookie(secret_key, user_id, is_admin=False):
+    """
+    Sign a session cookie the way the server does after a login
+
+    :param secret_key: The server's SECRET_KEY
+    :param user_id: User ID stored in the session
+    :param is_admin: Whether the session is an admin session
+    :return: Cookie value
+    """
+    app = Flask(__name__)
+    app.secret_key = secret_key
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'user_id': user_id, 'is_admin': is_admin})
+
+
+def parse_mix(text):
+    """
+    Parse 'name=weight,...'
+
+    :return: (names, weights) tuple
+    """
+    names, weights = [], []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name.strip()!r}, expected one of: {', '.join(OPERATIONS)}")
+        names.append(name.strip())
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+class Worker(threading.Thread):
+    """
+    Closed-loop client sending requests from the mix until the deadline
+    """
+
+    def __init__(self, driver, index):
+        super().__init__(name=f'load-{index}', daemon=True)
+        self.driver = driver
+        self.rng = random.Random(driver.args.seed + index)
+        self.http = requests.Session()
+        self.known = defaultdict(list)
+        self.created = []
+        # operation -> list of latencies in ms, and error counts
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(int)
+
+    def request(self, method, path, user_id, is_admin=False, **kwargs):
+        cookie = self.driver.cookie(user_id, is_admin)
+        return self.http.request(method, self.driver.args.url + path, cookies={'session': cookie},
+                                 timeout=self.driver.args.timeout, **kwargs)
+
+    def pick_user(self):
+        return self.rng.choices(self.driver.owners, cum_weights=self.driver.cum_weights)[0]
+
+    def pick_task(self, user_id):
+        """Get a task ID of the user seen in a listing, listing the user's tasks first if needed"""
+        if not self.known[user_id]:
+            self.remember(user_id, self.request('GET', '/tasks/?limit=50', user_id))
+        tasks = self.known[user_id]
+        return self.rng.choice(tasks) if tasks else None
+
+    def remember(self, user_id, response):
+        if response.status_code != 200:
+            return
+        body = response.json()
+        tasks = body['tasks'] if isinstance(body, dict) else body
+        self.known[user_id] = [task['id'] for task in tasks[:KNOWN_TASKS_PER_USER]]
+
+    def run(self):
+        driver = self.driver
+        while True:
+            now = time.monotonic()
+            if now >= driver.deadline:
+                return
+            name = self.rng.choices(driver.names, weights=driver.weights)[0]
+            started = time.perf_counter()
+            try:
+                response = OPERATIONS[name](self)
+                ok = response is not None and response.status_code < 400
+                status = response.status_code if response is not None else 'skipped'
+            except requests.RequestException as e:
+                ok, status = False, type(e).__name__
+            elapsed = (time.perf_counter() - started) * 1000
+            # Requests still running when the warm-up ends are not counted
+            if now >= driver.measure_from:
+                self.latencies[name].append(elapsed)
+                self.statuses[(name, status)] += 1
+                if not ok:
+                    self.errors[name] += 1
+            if driver.args.think_ms:
+                time.sleep(self.rng.expovariate(1000.0 / driver.args.think_ms))
+
+
+def op_list(worker):
+    user_id = worker.pick_user()
+    response = worker.request('GET', '/tasks/', user_id)
+    worker.remember(user_id, response)
+    return response
+
+
+def op_page(worker):
+    user_id = worker.pick_user()
+    response = worker.request('GET', '/tasks/?limit=50', user_id)
+    worker.remember(user_id, response)
+    return response
+
+
+def op_get(worker):
+    user_id = worker.pick_user()
+    task_id = worker.pick_task(user_id)
+    return worker.request('GET', f'/tasks/{task_id}', user_id) if task_id else None
+
+
+def op_create(worker):
+    user_id = worker.pick_user()
+    data = synthetic.task_document(worker.rng, user_id)
+    response = worker.request('POST', '/tasks/', user_id, data={
+        'title': data['title'], 'description': data['description'], 'category': data['category'],
+        'urgency': data['urgency'], 'dueDate': data['dueDate'] or ''})
+    if response.status_code == 201:
+        worker.created.append((user_id, response.json()['id']))
+    return response
+
+
+def op_update(worker):
+    user_id = worker.pick_user()
+    task_id = worker.pick_task(user_id)
+    if not task_id:
+        return None
+    return worker.request('PUT', f'/tasks/{task_id}', user_id, data={
+        'status': worker.rng.choice(synthetic.STATUSES), 'urgency': worker.rng.choice(synthetic.URGENCIES)})
+
+
+def op_delete(worker):
+    # Only tasks created by this run are deleted, so the dataset does not shrink
+    if not worker.created:
+        return op_create(worker)
+    user_id, task_id = worker.created.pop(worker.rng.randrange(len(worker.created)))
+    return worker.request('DELETE', f'/tasks/{task_id}', user_id)
+
+
+def op_bulk(worker):
+    user_id = worker.pick_user()
+    worker.pick_task(user_id)
+    operations = [{'op': 'update', 'id': task_id, 'data': {'status': worker.rng.choice(synthetic.STATUSES)}}
+                  for task_id in worker.known[user_id][:20]]
+    if not operations:
+        return None
+    return worker.request('POST', '/tasks/bulk', user_id, json={'operations': operations})
+
+
+def op_categories(worker):
+    return worker.request('GET', '/tasks/categories', worker.pick_user())
+
+
+def op_admin_tasks(worker):
+    return worker.request('GET', '/tasks/admin/all?limit=50', worker.driver.admin_id, is_admin=True)
+
+
+def op_admin_users(worker):
+    return worker.request('GET', '/auth/users', worker.driver.admin_id, is_admin=True)
+
+
+OPERATIONS = {
+    'list': op_list,
+    'page': op_page,
+    'get': op_get,
+    'create': op_create,
+    'update': op_update,
+    'delete': op_delete,
+    'bulk': op_bulk,
+    'categories': op_categories,
+    'admin_tasks': op_admin_tasks,
+    'admin_users': op_admin_users
+}
+
+
+class Driver:
+    """
+    Shared state of a load test run
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.names, self.weights = parse_mix(args.mix)
+        self.owners, self.cum_weights = synthetic.owner_weights(args.users, args.skew, args.seed)
+        self.admin_id = synthetic.user_id(0)
+        self._cookies = {}
+        self.deadline = None
+        self.measure_from = None
+
+    def cookie(self, user_id, is_admin=False):
+        key = (user_id, is_admin)
+        cookie = self._cookies.get(key)
+        if cookie is None:
+            cookie = self._cookies[key] = session_cookie(self.args.secret_key, user_id, is_admin)
+        return cookie
+
+    def run(self):
+        """
+        Run the workers and merge their measurements
+
+        :return: (latencies, errors, statuses, measured seconds) tuple
+        """
+        workers = [Worker(self, index) for index in range(self.args.threads)]
+        start = time.monotonic()
+        self.measure_from = start + self.args.warmup
+        self.deadline = self.measure_from + self.args.duration
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        measured = time.monotonic() - self.measure_from
+
+        latencies, errors, statuses = defaultdict(list), defaultdict(int), defaultdict(int)
+        for worker in workers:
+            for name, values in worker.latencies.items():
+                latencies[name].extend(values)
+            for name, count in worker.errors.items():
+                errors[name] += count
+            for key, count in worker.statuses.items():
+                statuses[key] += count
+        return latencies, errors, statuses, measured
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(latencies, errors, measured):
+    """
+    Compute throughput and latency percentiles per operation
+
+    :return: Dictionary of operation name (and 'total') to statistics
+    """
+    summary = {}
+    everything = []
+    for name, values in sorted(latencies.items()):
+        everything.extend(values)
+        summary[name] = _stats(values, errors[name], measured)
+    if everything:
+        summary['total'] = _stats(everything, sum(errors.values()), measured)
+    return summary
+
+
+def _stats(values, error_count, measured):
+    return {
+        'requests': len(values),
+        'errors': error_count,
+        'throughput': round(len(values) / measured, 2),
+        'p50_ms': round(statistics.median(values), 2),
+        'p90_ms': round(percentile(values, 0.90), 2),
+        'p99_ms': round(percentile(values, 0.99), 2),
+        'max_ms': round(max(values), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server base URL')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='seconds before measuring starts')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='mean pause between requests per client')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation weights, e.g. list=60,create=20,update=20')
+    parser.add_argument('--users', type=int, default=10_000, help='users in the generated data')
+    parser.add_argument('--skew', type=float, default=0.8, help='skew used when generating the data')
+    parser.add_argument('--seed', type=int, default=42, help='seed used when generating the data')
+    parser.add_argument('--secret-key', default=os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production'),
+                        help="the server's SECRET_KEY (default: $SECRET_KEY)")
+    parser.add_argument('--timeout', type=float, default=30.0, help='request timeout in seconds')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    driver = Driver(args)
+    print(f"{args.threads} clients against {args.url} for {args.duration:g}s (+{args.warmup:g}s warm-up)\n")
+    latencies, errors, statuses, measured = driver.run()
+    summary = summarize(latencies, errors, measured)
+    if not summary:
+        sys.exit('No request completed')
+
+    print(f"{'operation':<14}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}"
+          f"{'p99 ms':>9}{'max ms':>9}")
+    for name, stats in summary.items():
+        print(f"{name:<14}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput']:>9.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+
+    failed = {key: count for key, count in statuses.items()
+              if not isinstance(key[1], int) or key[1] >= 400}
+    if failed:
+        print('\nFailed requests:')
+        for (name, status), count in sorted(failed.items(), key=str):
+            print(f"  {name} {status}: {count}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'threads': args.threads, 'duration': measured, 'mix': args.mix, 'operations': summary},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Memory used by the model classes on a bulk load.
+
+Seeds the in-memory datastore with synthetic tasks written the way Task.save
+does (with a categoryId, so the categories are resolved), loads them all with
+Task.get_all(admin=True) and reports the time, the memory retained by the
+result and the peak while loading (tracemalloc).
+
+It then measures the per-object cost of the model layout: every model
+(Task, Category, User, Admin) is copied once into its slotted class and once
+into an equivalent class keeping the same attributes in a per-instance
+__dict__ (the layout the models had before), both sharing the attribute
+values, so the difference is only the object overhead. The saving on the bulk
+load is that difference times the number of tasks.
+
+Usage (from the kak directory):
+    python benchmarks/model_memory.py [--tasks 100000] [--users 1000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configure the app before it is imported: in-memory datastore, jobs run inline
+_workdir = tempfile.mkdtemp(prefix='model-benchmark-')
+os.environ['DATASTORE_BACKEND'] = 'memory'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['JOB_QUEUE_DATABASE'] = os.path.join(_workdir, 'jobs.sqlite3')
+os.environ['STATIC_COMPRESSED_FOLDER'] = os.path.join(_workdir, 'static_compressed')
+os.environ['METRICS_ENABLED'] = 'false'
+
+import synthetic  # noqa: E402
+from app import create_app  # noqa: E402
+from app.backends import get_db  # noqa: E402
+from app.models import Admin, Category, Task, User  # noqa: E402
+
+# Objects per model in the layout comparison
+LAYOUT_SAMPLE = 10_000
+
+
+def seed(db, tasks, users, seed=42):
+    """
+    Write synthetic categories and tasks, the tasks with a categoryId like Task.to_dict writes
+
+    :param db: Database client
+    :param tasks: Number of tasks
+    :param users: Number of task owners
+    :param seed: Random seed
+    """
+    rng = random.Random(seed)
+    writer = synthetic.BatchWriter(db)
+    for name, color in synthetic.CATEGORIES.items():
+        writer.set('categories', name, {'name': name, 'color': color, 'createdAt': synthetic.EPOCH.isoformat()})
+    owners = [synthetic.user_id(index) for index in range(users)]
+    for index in range(tasks):
+        data = synthetic.task_document(rng, rng.choice(owners))
+        data['categoryId'] = data['category']
+        writer.set('tasks', synthetic.task_id(index), data)
+    writer.flush()
+
+
+def slot_names(model):
+    """Slot names of a model class and its bases, base class first"""
+    names = []
+    for klass in reversed(model.__mro__):
+        names.extend(getattr(klass, '__slots__', ()))
+    return names
+
+
+def dict_based(model):
+    """
+    Build a class holding the same attributes as model in a per-instance __dict__,
+    assigned in the same order as the model's __init__ does
+
+    :param model: Slotted model class
+    :return: Class taking a model instance to copy
+    """
+    names = slot_names(model)
+
+    def __init__(self, source):
+        for name in names:
+            setattr(self, name, getattr(source, name))
+
+    return type(f'Dict{model.__name__}', (), {'__init__': __init__})
+
+
+def slotted_copy(source):
+    """Copy a model instance without calling __init__ (the attribute values are shared)"""
+    copy = object.__new__(type(source))
+    for name in slot_names(type(source)):
+        setattr(copy, name, getattr(source, name))
+    return copy
+
+
+def bytes_per_object(factory, sources):
+    """
+    Measure the memory allocated per object created by factory
+
+    :param factory: Callable creating one object from a source object
+    :param sources: Source objects
+    :return: Bytes per object
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(source) for source in sources]
+    allocated = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(objects)
+    tracemalloc.stop()
+    return allocated / len(objects)
+
+
+def sample_objects(tasks, count):
+    """
+    Get count instances of each model
+
+    :param tasks: Loaded tasks
+    :param count: Instances per model
+    :return: Dictionary of model class to list of instances
+    """
+    users = [User.from_dict(synthetic.user_id(index), synthetic.user_document(index)) for index in range(count)]
+    return {
+        Task: tasks[:count],
+        Category: [Category.from_dict(task.category_id, {'name': task.name, 'color': task.color,
+                                                         'createdAt': synthetic.EPOCH.isoformat()})
+                   for task in tasks[:count]],
+        User: users,
+        Admin: [Admin.from_user(user, admin_id=f'admin{index:05d}', granted_at=synthetic.EPOCH.isoformat(),
+                                granted_by='system')
+                for index, user in enumerate(users)]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=100_000, help='tasks loaded at once')
+    parser.add_argument('--users', type=int, default=1_000, help='task owners')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+
+    with app.app_context():
+        seed(get_db(), args.tasks, args.users)
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        tasks = Task.get_all(admin=True)
+        elapsed = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    retained = current - before
+    print(f"Task.get_all(admin=True): {len(tasks)} tasks in {elapsed:.2f}s (measured under tracemalloc)")
+    print(f"  retained {retained / 2 ** 20:.1f} MiB ({retained / len(tasks):.0f} bytes per task), "
+          f"peak while loading {(peak - before) / 2 ** 20:.1f} MiB\n")
+
+    print(f"{'model':<10}{'attributes':>12}{'slots':>10}{'__dict__':>12}{'saved':>10}   (bytes per object)")
+    task_saving = None
+    for model, objects in sample_objects(tasks, min(LAYOUT_SAMPLE, len(tasks))).items():
+        slotted = bytes_per_object(slotted_copy, objects)
+        unslotted = bytes_per_object(dict_based(model), objects)
+        if model is Task:
+            task_saving = unslotted - slotted
+        print(f"{model.__name__:<10}{len(slot_names(model)):>12}{slotted:>10.0f}{unslotted:>12.0f}"
+              f"{unslotted - slotted:>10.0f}")
+
+    saved = task_saving * len(tasks)
+    print(f"\nSaved on this load: {saved / 2 ** 20:.1f} MiB "
+          f"({saved / (retained + saved):.0%} of what the tasks took with a per-instance __dict__)")
+
+
+if __name__ == '__main__':
+    main()
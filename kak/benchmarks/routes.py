@@ -0,0 +1,397 @@
+"""
+Route-level benchmark with RPC budgets.
+
+Drives every route of the main, auth and tasks blueprints through the Flask
+test client against the in-memory datastore, seeded with synthetic users and
+tasks (benchmarks/synthetic.py). For each route it records p50/p99 latency,
+the peak memory allocated while handling one request (tracemalloc), and the
+number of Firestore and Storage round trips per request, counted by the
+memory backend (inline background jobs included).
+
+The results are compared against benchmarks/baseline_routes.json: a route that
+makes more round trips per request than its baseline fails the run, as does a
+route without a scenario. Latency is machine dependent and is only compared
+when --max-slowdown is given; note that the in-memory datastore scans the whole
+collection for unfiltered ordered queries (the admin listings), where Firestore
+would use an index. Routes that need Firebase Authentication (login,
+registration, password and account changes) cannot run offline and are listed
+as skipped.
+
+Usage (from the kak directory):
+    python benchmarks/routes.py [--users 10000] [--tasks 1000000] [--iterations 50]
+                                [--latency-ms 0] [--only tasks.] [--update-baseline]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configure the app before it is imported: in-memory datastore, jobs run inline
+# (so their round trips count towards the request)
+_workdir = tempfile.mkdtemp(prefix='route-benchmark-')
+os.environ['DATASTORE_BACKEND'] = 'memory'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['JOB_QUEUE_DATABASE'] = os.path.join(_workdir, 'jobs.sqlite3')
+os.environ['IMAGE_WORKERS'] = '1'
+# Released images are collected after a delay, on a timer: keep that out of the measured requests
+os.environ['IMAGE_COLLECT_DELAY'] = '86400'
+os.environ['STATIC_COMPRESSED_FOLDER'] = os.path.join(_workdir, 'static_compressed')
+
+import synthetic  # noqa: E402
+from app import create_app  # noqa: E402
+from app.backends import get_bucket, get_db  # noqa: E402
+from app.services.quotes import quote_service  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_routes.json')
+
+# Blueprints whose routes must all be covered
+BLUEPRINTS = ('main', 'auth', 'tasks')
+
+# Routes that call Firebase Authentication and cannot run against the local datastore
+SKIPPED = {
+    'auth.register': 'creates a Firebase Authentication user',
+    'auth.login': 'verifies a Firebase ID token',
+    'auth.change_password': 'updates the Firebase Authentication user',
+    'auth.delete_account': 'deletes the Firebase Authentication user',
+    'auth.delete_user': 'deletes the Firebase Authentication user'
+}
+
+# Iterations of routes that read a whole collection
+HEAVY_ITERATIONS = 3
+
+
+class Scenario:
+    """
+    One request against one route, repeated
+    """
+
+    def __init__(self, endpoint, method, path, role='user', expect=(200,), heavy=False, prepare=None,
+                 name=None, **request_options):
+        """
+        Initialize a new Scenario instance
+
+        :param endpoint: Flask endpoint the request is routed to
+        :param method: HTTP method
+        :param path: URL, or callable(context, iteration) returning (url, request options)
+        :param role: Session of the client: 'user', 'admin' or None (anonymous)
+        :param expect: Accepted status codes
+        :param heavy: Whether the route reads a whole collection (fewer iterations)
+        :param prepare: Optional callable(context, iteration) run untimed before each request
+        :param name: Name in the report (defaults to the endpoint)
+        :param request_options: Keyword arguments for the test client (data, json, headers, ...)
+        """
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.role = role
+        self.expect = expect
+        self.heavy = heavy
+        self.prepare = prepare
+        self.name = name or endpoint
+        self.request_options = request_options
+
+    def request(self, context, iteration):
+        """Get the URL and test client options of one iteration"""
+        if callable(self.path):
+            return self.path(context, iteration)
+        return self.path, dict(self.request_options)
+
+
+def _png(iteration):
+    """A small PNG, different for every iteration so content-addressed storage uploads it"""
+    from PIL import Image
+    image = Image.new('RGB', (64, 64), ((iteration * 37) % 256, (iteration * 11) % 256, iteration % 256))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _own_task(context, iteration):
+    tasks = context['user_tasks']
+    return tasks[iteration % len(tasks)]
+
+
+def _create_disposable_task(context, iteration):
+    task_id = f'benchmark-delete-{iteration}'
+    get_db().collection('tasks').document(task_id).set(
+        dict(synthetic.task_document(context['rng'], context['user_id']), title='to delete'))
+    context['disposable'] = task_id
+
+
+def _login(context, iteration):
+    with context['clients']['logout'].session_transaction() as session:
+        session['user_id'] = context['user_id']
+
+
+def build_scenarios():
+    """
+    Build the scenario of every covered route
+
+    :return: List of Scenario
+    """
+    return [
+        # main
+        Scenario('main.index', 'GET', '/', role=None),
+        Scenario('main.profile', 'GET', '/profile'),
+        Scenario('main.admin', 'GET', '/admin', role='admin'),
+        Scenario('main.get_quote', 'GET', '/quote'),
+
+        # tasks
+        Scenario('tasks.get_tasks', 'GET', '/tasks/'),
+        Scenario('tasks.get_tasks', 'GET', '/tasks/?limit=50', name='tasks.get_tasks?limit=50'),
+        Scenario('tasks.get_tasks', 'GET', lambda context, i: (
+            '/tasks/', {'headers': {'If-None-Match': context['tasks_etag']}}),
+            expect=(304,), name='tasks.get_tasks (304)'),
+        Scenario('tasks.get_task', 'GET', lambda context, i: (f'/tasks/{_own_task(context, i)}', {})),
+        Scenario('tasks.create_task', 'POST', '/tasks/', expect=(201,), data={
+            'title': 'Benchmark task', 'description': 'Created by the route benchmark',
+            'category': 'work', 'urgency': 'medium', 'dueDate': '2025-06-01'}),
+        Scenario('tasks.create_task', 'POST', lambda context, i: ('/tasks/', {'data': {
+            'title': 'Benchmark task with image', 'category': 'personal',
+            'image': (io.BytesIO(_png(i)), f'photo{i}.png')}}),
+            expect=(201,), name='tasks.create_task (image)'),
+        Scenario('tasks.update_task', 'PUT', lambda context, i: (
+            f'/tasks/{_own_task(context, i)}', {'data': {'title': f'Updated {i}', 'status': 'in-progress'}})),
+        Scenario('tasks.delete_task', 'DELETE', lambda context, i: (f"/tasks/{context['disposable']}", {}),
+                 prepare=_create_disposable_task),
+        Scenario('tasks.bulk_tasks', 'POST', lambda context, i: ('/tasks/bulk', {'json': {'operations': [
+            {'op': 'update', 'id': task_id, 'data': {'status': 'completed'}}
+            for task_id in context['user_tasks'][:20]]}})),
+        Scenario('tasks.get_categories', 'GET', '/tasks/categories'),
+        Scenario('tasks.get_all_tasks', 'GET', '/tasks/admin/all?limit=50', role='admin', heavy=True,
+                 name='tasks.get_all_tasks?limit=50'),
+        Scenario('tasks.get_all_tasks', 'GET', '/tasks/admin/all', role='admin', heavy=True),
+
+        # auth
+        Scenario('auth.logout', 'POST', '/auth/logout', role='logout', prepare=_login),
+        Scenario('auth.upload_profile_picture', 'POST', lambda context, i: ('/auth/profile-picture', {'data': {
+            'profileImage': (io.BytesIO(_png(10_000 + i)), f'avatar{i}.png')}})),
+        Scenario('auth.get_users', 'GET', '/auth/users', role='admin', heavy=True),
+        Scenario('auth.update_user', 'PUT', lambda context, i: (
+            f"/auth/users/{context['other_user_id']}", {'json': {'is_admin': False}}), role='admin'),
+        Scenario('auth.update_user_role', 'PUT', lambda context, i: (
+            f"/auth/users/{context['other_user_id']}/role", {'json': {'is_admin': False}}), role='admin'),
+        Scenario('auth.get_user_deletion', 'GET', lambda context, i: (
+            f"/auth/users/{context['other_user_id']}/deletion", {}), role='admin', expect=(404,)),
+        Scenario('auth.get_job_stats', 'GET', '/auth/admin/jobs', role='admin'),
+        Scenario('auth.retry_failed_jobs', 'POST', '/auth/admin/jobs/retry', role='admin')
+    ]
+
+
+def rpc_count():
+    """Total round trips made so far to the datastore and the bucket"""
+    return sum(get_db().latency_model.counts.values()) + sum(get_bucket().latency_model.counts.values())
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def run_scenario(scenario, context, iterations):
+    """
+    Run one scenario
+
+    :return: Result dictionary (rpcs, p50_ms, p99_ms, peak_kb, iterations, error)
+    """
+    client = context['clients'][scenario.role]
+    timings = []
+    rpcs = []
+    error = None
+    peak = 0
+    # The last iteration runs under tracemalloc, which slows it down: it is not timed
+    for iteration in range(iterations + 1):
+        if scenario.prepare:
+            scenario.prepare(context, iteration)
+        url, options = scenario.request(context, iteration)
+        measure_memory = iteration == iterations
+        if measure_memory:
+            tracemalloc.start()
+        before = rpc_count()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.open(url, method=scenario.method, **options)
+            response.get_data()
+        elapsed = time.perf_counter() - started
+        calls = rpc_count() - before
+        if measure_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            timings.append(elapsed * 1000)
+            rpcs.append(calls)
+        if response.status_code not in scenario.expect:
+            error = f'status {response.status_code}: {response.get_data(as_text=True)[:200]}'
+            break
+        response.close()
+
+    if error:
+        return {'error': error}
+    return {
+        'rpcs': statistics.median(rpcs),
+        'max_rpcs': max(rpcs),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'peak_kb': round(peak / 1024, 1),
+        'iterations': iterations
+    }
+
+
+def setup(args):
+    """
+    Create the app, seed the datastore and log in the benchmark clients
+
+    :return: Context dictionary shared by the scenarios
+    """
+    import random
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+    # The quote API is not called: the refill thread gets the offline quotes
+    quote_service.fetch = lambda: list(quote_service.offline_quotes)
+
+    started = time.perf_counter()
+    db = get_db()
+    task_counts = synthetic.populate(db, users=args.users, tasks=args.tasks, admins=1)['taskCounts']
+    print(f"Seeded {args.users} users and {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+
+    # Simulated round-trip time, applied after seeding
+    for client in (db, get_bucket()):
+        client.latency_model.latency = args.latency_ms / 1000.0
+
+    # Benchmark user: the one with the median number of tasks
+    ranked = sorted(task_counts, key=lambda owner: (task_counts[owner], owner))
+    user_id = ranked[len(ranked) // 2]
+    admin_id = synthetic.user_id(0)
+    other_user_id = ranked[len(ranked) // 2 + 1]
+
+    clients = {}
+    for role, (session_user, is_admin) in {'user': (user_id, False), 'admin': (admin_id, True),
+                                           None: (None, False), 'logout': (None, False)}.items():
+        client = app.test_client()
+        if session_user:
+            with client.session_transaction() as session:
+                session['user_id'] = session_user
+                session['is_admin'] = is_admin
+        clients[role] = client
+
+    user_tasks = sorted(doc.id for doc in db.collection('tasks').where('userId', '==', user_id).stream())
+    tasks_etag = clients['user'].get('/tasks/').headers['ETag']
+    print(f"Benchmark user {user_id} owns {len(user_tasks)} tasks\n")
+    return {
+        'app': app,
+        'clients': clients,
+        'user_id': user_id,
+        'other_user_id': other_user_id,
+        'user_tasks': user_tasks,
+        'tasks_etag': tasks_etag,
+        'rng': random.Random(7)
+    }
+
+
+def check_coverage(app, scenarios):
+    """
+    Get the blueprint routes without a scenario
+
+    :return: Sorted list of endpoint names
+    """
+    covered = {scenario.endpoint for scenario in scenarios} | set(SKIPPED)
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in BLUEPRINTS}
+    return sorted(endpoints - covered)
+
+
+def compare(results, baseline, max_slowdown=None):
+    """
+    Compare results against the baseline
+
+    :return: List of failure messages
+    """
+    failures = []
+    for name, result in results.items():
+        if 'error' in result:
+            failures.append(f'{name}: {result["error"]}')
+            continue
+        expected = baseline.get('routes', {}).get(name)
+        if expected is None:
+            failures.append(f'{name}: no baseline (run with --update-baseline)')
+            continue
+        if result['rpcs'] > expected['rpcs']:
+            failures.append(f"{name}: {result['rpcs']:g} round trips per request, budget is {expected['rpcs']:g}")
+        if max_slowdown and result['p50_ms'] > expected['p50_ms'] * max_slowdown:
+            failures.append(f"{name}: p50 {result['p50_ms']:.1f}ms, baseline {expected['p50_ms']:.1f}ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10_000, help='synthetic users')
+    parser.add_argument('--tasks', type=int, default=1_000_000, help='synthetic tasks')
+    parser.add_argument('--iterations', type=int, default=50, help='requests per route')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated round-trip time')
+    parser.add_argument('--only', help='run only the routes whose name starts with this prefix')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--max-slowdown', type=float,
+                        help='also fail when a p50 latency exceeds the baseline by this factor')
+    args = parser.parse_args()
+
+    context = setup(args)
+    scenarios = build_scenarios()
+    uncovered = check_coverage(context['app'], scenarios)
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario.name.startswith(args.only)]
+
+    print(f"{'route':<36}{'rpcs':>6}{'p50 ms':>10}{'p99 ms':>10}{'peak KB':>10}")
+    results = {}
+    for scenario in scenarios:
+        iterations = min(args.iterations, HEAVY_ITERATIONS) if scenario.heavy else args.iterations
+        result = results[scenario.name] = run_scenario(scenario, context, iterations)
+        if 'error' in result:
+            print(f"{scenario.name:<36}  ERROR {result['error']}")
+        else:
+            print(f"{scenario.name:<36}{result['rpcs']:>6g}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                  f"{result['peak_kb']:>10.1f}")
+    for endpoint, reason in sorted(SKIPPED.items()):
+        print(f"{endpoint:<36}  skipped: {reason}")
+
+    if args.update_baseline:
+        if any('error' in result for result in results.values()):
+            sys.exit('Not updating the baseline: some routes failed')
+        baseline = {'users': args.users, 'tasks': args.tasks, 'latency_ms': args.latency_ms, 'routes': {}}
+        if args.only and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline['routes'] = json.load(f)['routes']
+        baseline['routes'].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline.get('users'), baseline.get('tasks')) != (args.users, args.tasks):
+        print(f"\nNote: the baseline was recorded with {baseline.get('users')} users and "
+              f"{baseline.get('tasks')} tasks; collection-wide routes scale with the data")
+    failures = compare(results, baseline, args.max_slowdown)
+    failures.extend(f'{endpoint}: no benchmark scenario' for endpoint in uncovered)
+    if failures:
+        print('\nFAILED')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print(f"\nAll {len(results)} routes within their round-trip budgets")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Synthetic users, categories, admins and tasks for benchmarks and load tests.
+
+Documents have the shape the routes write (see tasks.create_task and the
+models) and deterministic IDs (user00000, task0000000, ...), so a benchmark
+can address a known user or task. Tasks are spread over users with a Zipf-like
+skew (a few heavy users, a long tail of light ones), some have no due date or
+are overdue, and some reference shared images. Everything is written through
+get_db() in batches, so any configured backend can be populated.
+"""
+
+import itertools
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Firestore accepts at most 500 writes per batch
+BATCH_SIZE = 500
+
+CATEGORIES = {
+    'work': '#4a90d9',
+    'personal': '#7ed321',
+    'shopping': '#f5a623',
+    'health': '#d0021b',
+    'other': '#9b9b9b'
+}
+STATUSES = ('pending', 'in-progress', 'completed')
+URGENCIES = ('low', 'medium', 'high')
+WORDS = ('buy', 'call', 'fix', 'write', 'plan', 'review', 'book', 'clean', 'send', 'read')
+
+# Creation times are spread over the year before this date
+EPOCH = datetime(2025, 1, 1)
+
+# Share of tasks without a due date
+NO_DUE_DATE = 0.15
+
+
+def user_id(index):
+    """ID of the index-th synthetic user"""
+    return f'user{index:05d}'
+
+
+def task_id(index):
+    """ID of the index-th synthetic task"""
+    return f'task{index:07d}'
+
+
+def owner_weights(users, skew=0.0, seed=42):
+    """
+    Get the relative number of tasks of each user
+
+    :param users: Number of users
+    :param skew: Zipf exponent; 0 spreads tasks evenly, 1 gives the heaviest user ~10% of
+                 all tasks with 10,000 users
+    :param seed: Random seed deciding which users are heavy
+    :return: (list of user IDs, list of cumulative weights) tuple, for random.choices
+    """
+    owners = [user_id(index) for index in range(users)]
+    ranks = list(range(1, users + 1))
+    # Heavy users are spread over the ID range (user00000 is the admin)
+    random.Random(seed).shuffle(ranks)
+    weights = [rank ** -skew for rank in ranks]
+    return owners, list(itertools.accumulate(weights))
+
+
+def user_document(index, task_count=0):
+    """
+    Build a user document
+
+    :param index: User number
+    :param task_count: Legacy task count stored on the document
+    :return: Document data
+    """
+    created = EPOCH - timedelta(days=400 - index % 365)
+    return {
+        'email': f'{user_id(index)}@example.com',
+        'taskCount': task_count,
+        'lastActive': created.isoformat(),
+        'created_at': created.isoformat()
+    }
+
+
+def task_document(rng, owner, image=None):
+    """
+    Build a task document like the ones created through POST /tasks/
+
+    :param rng: random.Random instance
+    :param owner: Owner's user ID
+    :param image: Optional (URL, renditions) tuple of the attached image
+    :return: Document data
+    """
+    created = EPOCH - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    data = {
+        'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))),
+        'description': 'Lorem ipsum dolor sit amet. ' * rng.randint(0, 4),
+        'userId': owner,
+        'status': rng.choice(STATUSES),
+        'category': rng.choice(list(CATEGORIES)),
+        'urgency': rng.choice(URGENCIES),
+        'dueDate': None,
+        'createdAt': created.isoformat(),
+        'updatedAt': created.isoformat(),
+        'imageUrl': None
+    }
+    if rng.random() >= NO_DUE_DATE:
+        # Mostly upcoming, some already overdue when created
+        data['dueDate'] = (created + timedelta(days=rng.randint(-7, 60))).date().isoformat()
+    if image:
+        data['imageUrl'], data['imageRenditions'] = image
+    return data
+
+
+class BatchWriter:
+    """
+    Write documents in batches of BATCH_SIZE
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.batch()
+        self.pending = 0
+        self.written = 0
+
+    def set(self, collection, doc_id, data):
+        self.batch.set(self.db.collection(collection).document(doc_id), data)
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+            self.written += self.pending
+            self.batch = self.db.batch()
+            self.pending = 0
+
+
+def populate(db, users=10_000, tasks=1_000_000, admins=1, seed=42, skew=0.0, images=(),
+             image_fraction=0.0, progress=None):
+    """
+    Write synthetic users, categories, admins and tasks
+
+    :param db: Database client (get_db())
+    :param users: Number of users
+    :param tasks: Number of tasks
+    :param admins: Number of users (the first ones) with an active admin record
+    :param seed: Random seed, so runs are comparable
+    :param skew: Zipf exponent of the number of tasks per user (see owner_weights)
+    :param images: List of (URL, renditions) tuples that tasks may reference
+    :param image_fraction: Share of tasks with one of the images attached
+    :param progress: Optional callable(documents written) called after every batch
+    :return: Dictionary with taskCounts (by user ID) and imageUses (by index in images)
+    """
+    rng = random.Random(seed)
+    writer = BatchWriter(db)
+
+    owners, cum_weights = owner_weights(users, skew, seed)
+    task_counts = dict.fromkeys(owners, 0)
+    category_counts = Counter()
+    image_uses = Counter()
+    for index in range(tasks):
+        owner = rng.choices(owners, cum_weights=cum_weights)[0]
+        image = None
+        if images and rng.random() < image_fraction:
+            choice = rng.randrange(len(images))
+            image_uses[choice] += 1
+            image = images[choice]
+        data = task_document(rng, owner, image)
+        task_counts[owner] += 1
+        category_counts[data['category']] += 1
+        writer.set('tasks', task_id(index), data)
+        if progress and writer.pending == 0:
+            progress(writer.written)
+
+    for index, owner in enumerate(owners):
+        writer.set('users', owner, user_document(index, task_counts[owner]))
+
+    for name, color in CATEGORIES.items():
+        writer.set('categories', name, {
+            'name': name,
+            'color': color,
+            'taskCount': category_counts[name],
+            'createdAt': EPOCH.isoformat(),
+            'lastUpdated': EPOCH.isoformat()
+        })
+
+    for index in range(min(admins, users)):
+        writer.set('admins', f'admin{index:03d}', {
+            'userId': user_id(index),
+            'email': f'{user_id(index)}@example.com',
+            'active': True,
+            'grantedAt': EPOCH.isoformat(),
+            'grantedBy': 'system'
+        })
+
+    writer.flush()
+    return {'taskCounts': task_counts, 'imageUses': image_uses}
@@ -0,0 +1,8 @@
+"""
+Shared test setup: the app package is imported from the kak directory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,165 @@
+"""
+Quote service against a local stand-in for the quote API.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app.services import quotes
+from app.services.quotes import QuoteService, load_offline_quotes
+
+OFFLINE = [{'content': 'Offline quote', 'author': 'Nobody', 'category': 'test'}]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers like API Ninjas, following the script of its server"""
+
+    # Keep-alive, so connection reuse can be observed
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            status, delay = server.script.pop(0) if server.script else server.default
+            server.requests.append({'client': self.client_address, 'apiKey': self.headers.get('X-Api-Key')})
+            number = len(server.requests)
+        if delay:
+            time.sleep(delay)
+        body = b'{"error": "unavailable"}'
+        if status == 200:
+            body = json.dumps([{'quote': f'Quote {number}-{i}', 'author': 'Stand-in', 'category': 'test'}
+                               for i in range(server.per_response)]).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    """
+    Local quote API: server.script is a list of (status, delay in seconds) answers,
+    server.default answers once the script is used up
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.script = []
+    server.default = (200, 0)
+    server.per_response = 3
+    server.requests = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/v1/quotes'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def services():
+    """Create services and stop their refill threads after the test"""
+    created = []
+
+    def create(cls=QuoteService, **options):
+        options.setdefault('offline_quotes', OFFLINE)
+        service = cls(**options)
+        created.append(service)
+        return service
+
+    yield create
+    for service in created:
+        service.stop()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_quotes_are_served_from_the_buffer(stand_in, services):
+    service = services(api_url=stand_in.url, api_key='key', buffer_size=6)
+    service.ensure_started()
+    assert wait_for(lambda: len(service._buffer) == 6)
+
+    requests_made = len(stand_in.requests)
+    served = [service.get_quote() for _ in range(4)]
+    assert [quote['author'] for quote in served] == ['Stand-in'] * 4
+    assert served[0] == {'content': 'Quote 1-0', 'author': 'Stand-in', 'category': 'test'}
+    assert service.stats['offline'] == 0
+    # Serving did not wait for the API: the refill happens after the buffer drops below half
+    assert len(stand_in.requests) == requests_made
+
+    assert wait_for(lambda: len(service._buffer) == 6)
+    assert stand_in.requests[0]['apiKey'] == 'key'
+    # One pooled keep-alive connection for every fetch
+    assert len({request['client'] for request in stand_in.requests}) == 1
+
+
+def test_slow_api_times_out_and_never_delays_a_quote(stand_in, services):
+    stand_in.default = (200, 2.0)
+    service = services(api_url=stand_in.url, buffer_size=4, timeout=(0.5, 0.2))
+
+    started = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        service.fetch()
+    assert time.perf_counter() - started < 1.0
+
+    started = time.perf_counter()
+    quote = service.get_quote()
+    assert time.perf_counter() - started < 0.05
+    assert quote == OFFLINE[0]
+
+
+def test_failures_back_off_exponentially_and_reset_after_success(stand_in, services, monkeypatch):
+    monkeypatch.setattr(quotes, 'MIN_BACKOFF', 0.01)
+    monkeypatch.setattr(quotes, 'MAX_BACKOFF', 0.04)
+    pauses = []
+
+    class RecordingService(QuoteService):
+        def _pause(self, seconds):
+            pauses.append(seconds)
+            super()._pause(0.001)
+
+    stand_in.script = [(500, 0)] * 4 + [(200, 0), (503, 0)]
+    stand_in.per_response = 1
+    service = services(RecordingService, api_url=stand_in.url, buffer_size=100)
+    service.ensure_started()
+
+    assert wait_for(lambda: len(pauses) >= 5)
+    assert pauses[:5] == [0.01, 0.02, 0.04, 0.04, 0.01]
+    assert service.stats['fetchErrors'] >= 5
+    assert service.stats['fetched'] >= 1
+
+
+def test_offline_quote_while_the_api_is_down(stand_in, services):
+    stand_in.default = (500, 0)
+    service = services(api_url=stand_in.url, buffer_size=4)
+    quotes_served = [service.get_quote() for _ in range(5)]
+    assert quotes_served == OFFLINE * 5
+    assert service.stats['offline'] == 5
+    assert wait_for(lambda: service.stats['fetchErrors'] >= 1)
+
+
+def test_bundled_offline_quotes():
+    bundled = load_offline_quotes()
+    assert bundled
+    assert all(quote['content'] and quote['author'] for quote in bundled)
+    # A missing file still leaves one quote to serve
+    assert len(load_offline_quotes('/nonexistent/quotes.json')) == 1
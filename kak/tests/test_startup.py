@@ -0,0 +1,133 @@
+"""
+Cold-start budget and fork safety of the lazily created Firebase clients.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import backends
+
+KAK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds create_app() may take in a fresh interpreter (blueprint imports included)
+CREATE_APP_BUDGET = 1.0
+
+# Seconds importing the app package and creating the app may take together
+COLD_START_BUDGET = 2.0
+
+# Fresh interpreters measured; the fastest run is compared, so a busy machine does not fail the test
+RUNS = 3
+
+_COLD_START = """
+import contextlib, io, json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    create_app()
+created = time.perf_counter()
+
+import firebase_admin
+from app import backends
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'firebaseApps': len(firebase_admin._apps),
+    'clients': sorted(backends._clients)
+}))
+"""
+
+
+def cold_start(tmp_path):
+    """Create the app in a new interpreter with the Firestore backend and no credentials"""
+    env = dict(os.environ)
+    env.update({
+        'DATASTORE_BACKEND': 'firestore',
+        'FIREBASE_CREDENTIALS': str(tmp_path / 'missing-key.json'),
+        'JOB_WORKERS': '0',
+        'JOB_QUEUE_DATABASE': str(tmp_path / 'jobs.sqlite3'),
+        'STATIC_COMPRESSED_FOLDER': str(tmp_path / 'static_compressed')
+    })
+    result = subprocess.run([sys.executable, '-c', _COLD_START], cwd=KAK_DIR, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_create_app_needs_no_credentials_and_opens_no_client(tmp_path):
+    measured = cold_start(tmp_path)
+    assert measured['firebaseApps'] == 0
+    assert measured['clients'] == []
+
+
+def test_cold_start_budget(tmp_path):
+    runs = [cold_start(tmp_path) for _ in range(RUNS)]
+    fastest_create = min(run['create_app'] for run in runs)
+    fastest_total = min(run['import'] + run['create_app'] for run in runs)
+    assert fastest_create < CREATE_APP_BUDGET, f'create_app() took {fastest_create:.3f}s'
+    assert fastest_total < COLD_START_BUDGET, f'import and create_app() took {fastest_total:.3f}s'
+
+
+class FakeCredential:
+    def get_credential(self):
+        return object()
+
+
+class FakeFirebaseApp:
+    project_id = 'test-project'
+    options = {'storageBucket': 'test-bucket'}
+    credential = FakeCredential()
+
+
+class FakeClient:
+    """Stands in for the google.cloud Firestore and Storage clients, remembering its process"""
+
+    def __init__(self, project=None, credentials=None):
+        self.pid = os.getpid()
+
+    def bucket(self, name):
+        return self
+
+
+@pytest.fixture(params=['memory', 'firestore'])
+def backend(request, monkeypatch):
+    if request.param == 'firestore':
+        from app.backends import firestore_backend
+        monkeypatch.setattr(firestore_backend, 'get_firebase_app', lambda **options: FakeFirebaseApp())
+        monkeypatch.setattr(firestore_backend.firestore, 'Client', FakeClient)
+        monkeypatch.setattr(firestore_backend.storage, 'Client', FakeClient)
+    backends.configure(request.param, instrument=False)
+    yield request.param
+    backends.configure('memory', instrument=False)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_forked_worker_creates_its_own_client(backend):
+    parent_client = backends.get_db()
+    parent_bucket = backends.get_bucket()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Child (like a gunicorn worker forked after --preload): report and exit at once
+        try:
+            client, bucket = backends.get_db(), backends.get_bucket()
+            own = (client is not parent_client and client is backends.get_db()
+                   and bucket is not parent_bucket and bucket is backends.get_bucket())
+            if backend == 'firestore':
+                own = own and client.pid == bucket.pid == os.getpid()
+            os.write(write_end, b'1' if own else b'0')
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    answer = os.read(read_end, 1)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+
+    assert answer == b'1'
+    # The parent keeps its clients
+    assert backends.get_db() is parent_client
+    assert backends.get_bucket() is parent_bucket